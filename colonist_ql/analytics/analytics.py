@@ -1,5 +1,4 @@
 import numpy as np
-from collections import defaultdict, Counter
 from colonist_ql.model.structures import *
 
 
@@ -7,57 +6,168 @@ def dice_distribution(size):
     return np.random.randint(1, 7, size) + np.random.randint(1, 7, size)
 
 
-def resources_from_settlements(settlements, rolls, include_blocked=False, density=False):
-    rolls_dict = defaultdict(Counter)
-    for s in settlements:
-        for c in s.triple:
-            if not include_blocked or not c.is_blocked:
-                h = Hexes().get(c)
-                rolls_dict[h.value][h.resource] += 1 + s.is_city
-    recourse_obtained = Counter()
-    for roll in rolls:
-        for res, i in rolls_dict[roll].items():
-            recourse_obtained[res] += i
-    resources, counts = recourse_obtained.keys(), recourse_obtained.values()
-    if density:
-        counts = [c / len(rolls) for c in counts]
-    return resources, counts
-
-
-def resources_max_expected(inland_scaling=1, coast_scaling=1):
-    rolls = dice_distribution(10000)
-    settlements = [Settlement(t, dummy=True) for t in cc.triples_from_centre(3)]
-    if inland_scaling == coast_scaling == 1:
-        return resources_from_settlements(settlements, rolls, False, True)
-    else:
-        rolls_dict = defaultdict(Counter)
-        coastal_ring = cc.ring_from_centre(3)
+ROLLS = np.arange(2, 13)
+ROLL_PROBABILITIES = np.array([facts.DICE_PIPS[r] for r in ROLLS]) / 36
+RESOURCE_ORDER = list(facts.RESOURCES)
+RESOURCE_INDEX = {r.value: i for i, r in enumerate(RESOURCE_ORDER)}
+
+
+def hex_yields(include_blocked=False, topology=None, game=None):
+    """
+    Calculates the resources each hex yields per roll.
+    :param include_blocked: If to count blocked hexes.
+    :param topology: The BoardTopology of the board, defaults to the standard board.
+    :param game: The GameState, defaults to Board().
+    :return: An array of shape (hexes, rolls, resources).
+    """
+    topology = cc.board_topology() if topology is None else topology
+    hexes = board.default_game(game).hexes
+    yields = np.zeros((topology.n_hexes, len(ROLLS), len(RESOURCE_ORDER)))
+    for i, c in enumerate(topology.hexes):
+        if not hexes.has(c):
+            continue
+        h = hexes.get(c)
+        if isinstance(h.value, int) and h.resource.value in RESOURCE_INDEX and (include_blocked or not h.blocked):
+            yields[i, h.value - 2, RESOURCE_INDEX[h.resource.value]] = 1
+    return yields
+
+
+def vertex_yields(include_blocked=False, topology=None, game=None):
+    """
+    Calculates the resources a settlement on each vertex yields per roll.
+    :param include_blocked: If to count blocked hexes.
+    :param topology: The BoardTopology of the board, defaults to the standard board.
+    :param game: The GameState, defaults to Board().
+    :return: An array of shape (vertices, rolls, resources).
+    """
+    topology = cc.board_topology() if topology is None else topology
+    return hex_yields(include_blocked, topology, game)[topology.vertex_hexes].sum(axis=1)
+
+
+def settlement_weights(settlement_sets, topology=None):
+    """
+    Converts collections of settlements into vertex weights, a city counting twice.
+    :param settlement_sets: An iterable of iterables of settlements.
+    :param topology: The BoardTopology of the board, defaults to the standard board.
+    :return: An array of shape (sets, vertices).
+    """
+    topology = cc.board_topology() if topology is None else topology
+    settlement_sets = [list(settlements) for settlements in settlement_sets]
+    weights = np.zeros((len(settlement_sets), topology.n_vertices))
+    for i, settlements in enumerate(settlement_sets):
         for s in settlements:
-            is_coastal = any(c in coastal_ring for c in s.triple)
-            scaling = coast_scaling if is_coastal else inland_scaling
-            for c in s.triple:
-                h = Hexes().get(c)
-                rolls_dict[h.value][h.resource] += 1 * scaling
-        recourse_obtained = Counter()
-        for roll in rolls:
-            for res, i in rolls_dict[roll].items():
-                recourse_obtained[res] += i
-        resources, counts = recourse_obtained.keys(), recourse_obtained.values()
-        counts = [c / len(rolls) for c in counts]
-        return resources, counts
-
-
-def i2c3():
+            weights[i, topology.vertex_id(s.triple)] += 1 + s.is_city
+    return weights
+
+
+def yield_table(weights, include_blocked=False, topology=None, game=None):
+    """
+    Calculates the resources yielded on each roll for many sets of settlements at once.
+    :param weights: An array of shape (sets, vertices) of how much each vertex yields, see settlement_weights.
+    :param include_blocked: If to count blocked hexes.
+    :param topology: The BoardTopology of the board, defaults to the standard board.
+    :param game: The GameState, defaults to Board().
+    :return: An array of shape (sets, rolls, resources).
+    """
+    return np.einsum("sv,vrk->srk", np.atleast_2d(weights), vertex_yields(include_blocked, topology, game))
+
+
+def expected_yields(table):
+    """
+    Calculates the exact expected resources per roll.
+    :param table: An array of shape (sets, rolls, resources), see yield_table.
+    :return: An array of shape (sets, resources).
+    """
+    return np.einsum("r,srk->sk", ROLL_PROBABILITIES, table)
+
+
+def yield_variances(table):
+    """
+    Calculates the exact variance of the resources per roll.
+    :param table: An array of shape (sets, rolls, resources), see yield_table.
+    :return: An array of shape (sets, resources).
+    """
+    return np.einsum("r,srk->sk", ROLL_PROBABILITIES, table ** 2) - expected_yields(table) ** 2
+
+
+def yield_distributions(table, n_rolls=1):
+    """
+    Calculates the exact distribution of each resource obtained over a number of rolls.
+    :param table: An array of shape (sets, rolls, resources) of integer yields, see yield_table.
+    :param n_rolls: The number of rolls to obtain the distribution over.
+    :return: An array of shape (sets, resources, max yield + 1) where [s, k, n] is the probability of n resources.
+    """
+    table = np.rint(table).astype(np.int64)
+    assert n_rolls > 0, "The distribution needs at least one roll."
+    n_sets, _, n_resources = table.shape
+    size = n_rolls * int(table.max(initial=0)) + 1
+
+    single = np.zeros((n_sets, n_resources, size))
+    s_index, r_index, k_index = np.indices(table.shape)
+    np.add.at(single, (s_index, k_index, table), ROLL_PROBABILITIES[r_index])
+    if n_rolls == 1:
+        return single
+    distribution = np.fft.irfft(np.fft.rfft(single, 2 * size) ** n_rolls, 2 * size)[..., :size]
+    return np.clip(distribution, 0, None)
+
+
+def resources_from_settlements(settlements, rolls, include_blocked=False, density=False, game=None):
+    """
+    Calculates the resources obtained by settlements over a sequence of rolls.
+    :param settlements: An iterable of settlements.
+    :param rolls: An iterable of rolls.
+    :param include_blocked: If to count blocked hexes.
+    :param density: If True gives the per roll average otherwise the total.
+    :param game: The GameState, defaults to Board().
+    :return: resources and their counts.
+    """
+    rolls = np.asarray(rolls)
+    table = yield_table(settlement_weights([settlements]), include_blocked, game=game)[0]
+    counts = np.bincount(rolls - 2, minlength=len(ROLLS)) @ table
+    if density:
+        counts = counts / len(rolls)
+    return RESOURCE_ORDER, list(counts)
+
+
+def resources_expected(settlements, include_blocked=False, game=None):
+    """
+    Calculates the exact expected resources per roll from settlements.
+    :param settlements: An iterable of settlements.
+    :param include_blocked: If to count blocked hexes.
+    :param game: The GameState, defaults to Board().
+    :return: resources and their expected count per roll.
+    """
+    table = yield_table(settlement_weights([settlements]), include_blocked, game=game)
+    return RESOURCE_ORDER, list(expected_yields(table)[0])
+
+
+def resources_max_expected(inland_scaling=1, coast_scaling=1, game=None):
+    """
+    Calculates the exact expected resources per roll if a settlement was built on every triple.
+    :param inland_scaling: The weight of settlements not touching the sea.
+    :param coast_scaling: The weight of settlements touching the sea.
+    :param game: The GameState, defaults to Board().
+    :return: resources and their expected count per roll.
+    """
+    topology = cc.board_topology()
+    is_coastal = ~topology.land_hexes[topology.vertex_hexes].all(axis=1)
+    weights = np.where(is_coastal, coast_scaling, inland_scaling)
+    return RESOURCE_ORDER, list(expected_yields(yield_table(weights, topology=topology, game=game))[0])
+
+
+def i2c3(game=None):
     """
     Calculates max expect resources with inland settlement being calculated at 1/2 and coastal settlements at 1/3.
+    :param game: The GameState, defaults to Board().
     :return: resources and the there count per roll.
     """
-    return resources_max_expected(1 / 2, 1 / 3)
+    return resources_max_expected(1 / 2, 1 / 3, game)
 
 
-def i3c5():
+def i3c5(game=None):
     """
     Calculates max expect resources with inland settlement being calculated at 1/3 and coastal settlements at 1/3.
+    :param game: The GameState, defaults to Board().
     :return: resources and the there count per roll.
     """
-    return resources_max_expected(1 / 3, 1 / 5)
+    return resources_max_expected(1 / 3, 1 / 5, game)
@@ -1,5 +1,5 @@
 from colonist_ql.analytics.analytics import *
-from colonist_ql.model.board import Board
+from colonist_ql.model.board import Board, default_game
 from colonist_ql.model.structures import *
 import colonist_ql.facts as facts
 import colonist_ql.model.cube_coord as cc
@@ -43,28 +43,34 @@ def plot_resource_from_settlements(settlements, rolls, include_blocked=False, de
     plt.show()
 
 
-def plot_expected_resources_from_settlements(settlements, include_blocked=False):
+def plot_expected_resources_from_settlements(settlements, include_blocked=False, game=None):
     """
     PLot the expected resources per turn given a collection of settlements.
     :param settlements: The settlements that resources can be obtained.
     :param include_blocked: If to count block TILES.
+    :param game: The GameState, defaults to Board().
     """
-    plot_resource_from_settlements(settlements, dice_distribution(10000), include_blocked, True)
+    resources, counts = resources_expected(settlements, include_blocked, game)
+    plt.bar(resources, counts)
+    plt.show()
 
 
-def current_settlement_resources_expectation(include_blocked=False):
+def current_settlement_resources_expectation(include_blocked=False, game=None):
     """
     PLot the expected resources per turn given a the current board position.
     :param include_blocked: If to count block TILES.
+    :param game: The GameState, defaults to Board().
     """
-    plot_expected_resources_from_settlements(Settlements.get_all(), include_blocked)
+    game = default_game(game)
+    plot_expected_resources_from_settlements(game.settlements.get_all(), include_blocked, game)
 
 
-def plot_maximum_expected_resources():
+def plot_maximum_expected_resources(game=None):
     """
     PLot the expected resources per turn given if a settlement was built on every triple point.
+    :param game: The GameState, defaults to Board().
     """
-    resources, counts = resources_max_expected()
+    resources, counts = resources_max_expected(game=game)
     plt.bar(resources, counts)
     plt.show()
 
@@ -79,65 +85,71 @@ def plot_player_bank_rates(player):
     plt.show()
 
 
-def plot_expected_i2c3():
+def plot_expected_i2c3(game=None):
     """
     PLot expected resources for using i2c3 metric.
+    :param game: The GameState, defaults to Board().
     """
-    resources, counts = i2c3()
+    resources, counts = i2c3(game)
     plt.bar(resources, counts)
     plt.show()
 
 
-def plot_expected_i3c5():
+def plot_expected_i3c5(game=None):
     """
     PLot expected resources for using i3c5 metric.
+    :param game: The GameState, defaults to Board().
     """
-    resources, counts = i3c5()
+    resources, counts = i3c5(game)
     plt.bar(resources, counts)
     plt.show()
 
 
-def plot_triples_heatmap(n_colours=13):
+def plot_triples_heatmap(n_colours=13, game=None):
     """
     Plots the heatmap of all of the triples.
+    :param game: The GameState, defaults to Board().
     """
+    game = default_game(game)
     fig, ax = plt.subplots(1)
     fig.patch.set_facecolor(facts.RESOURCE_COLOURS[facts.TILES.SEA])
     ax.set_aspect("equal")
-    _triples_heatmap(n_colours, ax)
-    _draw_board(Hexes().get_all(), ax)
+    _triples_heatmap(n_colours, ax, game)
+    _draw_board(game.hexes.get_all(), ax, game)
 
     ax.axis("off")
     plt.show()
 
 
-def _triples_heatmap(n_colours, ax):
+def _triples_heatmap(n_colours, ax, game):
     colours = cm.get_cmap("PuRd", n_colours)
     for t in cc.triples_from_centre(3):
         s = 0
         for c in t:
-            h = Hexes().get(c)
+            h = game.get_hex(c)
             if isinstance(h.value, int):
                 s += facts.DICE_PIPS[h.value]
         x, y = cc.triple_planner_position(t)
         ax.scatter(x, y, c=[colours(s)], s=1.6 ** (13 * (s / n_colours)), zorder=10, alpha=0.8)
 
 
-def plot_triples_diversity_heatmap(n_colours=13):
+def plot_triples_diversity_heatmap(n_colours=13, game=None):
     """
     Plots the heatmap of all of the triples take diversity.
+    :param game: The GameState, defaults to Board().
     """
+    game = default_game(game)
     fig, ax = plt.subplots(1)
     fig.patch.set_facecolor(facts.RESOURCE_COLOURS[facts.TILES.SEA])
     ax.set_aspect("equal")
-    _triples_diversity_heatmap(n_colours, ax)
-    _draw_board(Hexes().get_all(), ax)
+    _triples_diversity_heatmap(n_colours, ax, game)
+    _draw_board(game.hexes.get_all(), ax, game)
 
     ax.axis("off")
     plt.show()
 
 
-def _triples_diversity_heatmap(n_colours, ax):
+def _triples_diversity_heatmap(n_colours, ax, game):
     colours = cm.get_cmap("PuRd", n_colours)
 
     resources_counters = Counter()
@@ -146,7 +158,7 @@ def _triples_diversity_heatmap(n_colours, ax):
     been_counted = set()
     for t in triples:
         for c in t:
-            h = Hexes().get(c)
+            h = game.get_hex(c)
             if isinstance(h.value, int):
                 pips = facts.DICE_PIPS[h.value]
                 if h not in been_counted:
@@ -245,23 +257,24 @@ def _draw_coords_cube_format_rows(hexes, ax):
         ax.text(x, y, i, color="black", ha="center", va="center", size=20)
 
 
-def plot_board(hexes):
+def plot_board(hexes, game=None):
     fig, ax = plt.subplots(1)
     fig.patch.set_facecolor(facts.RESOURCE_COLOURS[facts.TILES.SEA])
     ax.set_aspect("equal")
-    _draw_board(hexes, ax)
+    _draw_board(hexes, ax, default_game(game))
     ax.axis("off")
     plt.show()
 
 
-def _draw_board(hexes, ax):
+def _draw_board(hexes, ax, game):
     """
     Draws the board using hex and port information.
     :param hexes: A collection of Hex objects.
     :param ax: THe axis to plot in.
+    :param game: The GameState with the ports.
     """
     _draw_hexes(hexes, ax)
-    _draw_ports(ax)
+    _draw_ports(ax, game)
     ax.scatter(0, 0, alpha=0.0)
 
 
@@ -281,11 +294,12 @@ def _draw_hexes(hexes, ax):
         ax.text(x, y, label, color=label_colour, ha="center", va="center", size=size)
 
 
-def _draw_ports(ax):
+def _draw_ports(ax, game):
     """
     Draws in the ports on the map.
+    :param game: The GameState with the ports.
     """
-    for p in Ports().get_all():
+    for p in set(game.ports.get_all()):
         sx, sy = cc.planer_position(p.sea_coord)
         (px, py), (qx, qy) = (cc.triple_planner_position(t) for t in p.triples)
 
@@ -1,6 +1,6 @@
 import colonist_ql.patterns as patterns
 import colonist_ql.controller.feature_extration as fe
-from colonist_ql.model.board import Board
+from colonist_ql.model.board import default_game
 
 
 class ExtractorHandler(metaclass=patterns.Singleton):
@@ -34,9 +34,10 @@ class LogExtractor(Extractor):
 
 
 class InitialBoardExtractor(Extractor):
-    def __init__(self, game_image):
+    def __init__(self, game_image, game=None):
         self.game_image = game_image
+        self.game = default_game(game)
 
     def extract(self):
-        hexes = fe.initial_board_extraction(self.game_image)
-        Board().set_hexes(hexes)
+        hexes = fe.initial_board_extraction(self.game_image, self.game)
+        self.game.set_hexes(hexes)
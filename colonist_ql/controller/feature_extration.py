@@ -1,13 +1,12 @@
 import cv2
-import pytesseract
 import matplotlib.pyplot as plt
 from itertools import product
 from colonist_ql.model.structures import *
 import colonist_ql.facts as facts
 import colonist_ql.utils as utils
-from skimage import measure
-import os
-from collections import defaultdict, Counter
+import colonist_ql.controller.template_matching as tm
+from colonist_ql.controller.ocr import OCRExecutor, OCRCache
+from collections import defaultdict
 
 
 RESOURCE_COLOUR_RANGES = {
@@ -128,23 +127,27 @@ def erosion_consensus_text_extraction(image, tesseract_config, synonyms={}, igno
     return consensus_text_extraction(images, tesseract_config, synonyms, ignores)
 
 
-def consensus_text_extraction(images, tesseract_config, synonyms={}, ignores=[]):
+def consensus_text_extraction(images, tesseract_config, synonyms={}, ignores=[], executor=None, cache=None):
     """
     Extras the consensus text from a list of imges.
-    :param images: The list of images.
+    The images are read concurrently, stopping once the consensus can no longer change. Confident results are cached
+    by the perceptual hash of the first image, so reading the same token again skips tesseract.
+    :param images: The list of images, the first being the unaltered crop.
     :param tesseract_config: The config string for tesseract.
     :param synonyms: A dictionary for converting a guess to another result.
     :param ignores: A list of results to ignore.
+    :param executor: The OCRExecutor to read the images with, defaults to OCRExecutor().
+    :param cache: The OCRCache of results, defaults to OCRCache() persisted at facts.OCR_CACHE_PATH.
     :return: The guess for the image.
     """
-    guesses = Counter()
-    for i in images:
-        text = pytesseract.image_to_string(i, config=tesseract_config)
-        if text in synonyms:
-            text = synonyms[text]
-        if text not in ignores:
-            guesses[text] += 1
-    return max(guesses.keys(), key=lambda g: guesses[g])
+    executor = OCRExecutor() if executor is None else executor
+    cache = OCRCache() if cache is None else cache
+    key = cache.key(images[0], tesseract_config, synonyms, ignores)
+    text = cache.get(key)
+    if text is None:
+        text, confidence = executor.consensus(images, tesseract_config, synonyms, ignores, with_confidence=True)
+        cache.put(key, text, confidence)
+    return text
 
 
 def hex_value(image):
@@ -169,24 +172,18 @@ def hex_value(image):
         return None
 
 
-def match_images(image, candidate_directory, threshold=None):
+def match_images(image, candidate_directory, threshold=None, matcher="ssim", prefilter=None):
     """
     Determines which image is the best match from a collection of images.
+    The candidates are loaded once per directory and scored together against the image.
     :param image:
     :param candidate_directory: The directory which stores the candidate images
-    :return: The name of the candidate that best matches image.
+    :param threshold: If given, the score a candidate has to reach to be a match.
+    :param matcher: The name of the matcher in template_matching.MATCHERS used to score the candidates.
+    :param prefilter: If given, the number of candidates kept by colour histogram before scoring.
+    :return: The name of the candidate that best matches image, or None if no candidate reaches the threshold.
     """
-    h, w, *_ = image.shape
-    results = {}
-    for t in next(os.walk(candidate_directory))[2]:
-        test_image = cv2.imread(f"{candidate_directory}/{t}")
-        test_image = cv2.cvtColor(test_image, cv2.COLOR_BGRA2BGR)
-        test_image = cv2.resize(test_image, (w, h), interpolation=cv2.INTER_AREA)
-        results[t] = measure.compare_ssim(image, test_image, multichannel=True)
-    if threshold is not None and all(threshold > v for v in results.values()):
-        return None
-    else:
-        return max(results, key=lambda x: results[x])
+    return tm.match(image, tm.template_bank(candidate_directory), matcher, threshold, prefilter)
 
 
 def extract_port(image):
@@ -232,16 +229,19 @@ def extract_land_information(image):
         for k, contour in contours_dict.items() for c in contour
     }
 
-    x, y = list(zip(*classes.keys()))
-    cx, cy = np.mean(x), np.mean(y)
-    size = max([utils.distance((cx, cy), p) for p in classes.keys()]) / 3
-    return {Hex(cc.pixel_to_cube((x - cx, y - cy), size), (x, y), r, v) for (x, y), (r, v) in classes.items()}
+    points = np.asarray(list(classes.keys()))
+    centred = points - points.mean(axis=0)
+    size = np.linalg.norm(centred, axis=1).max() / 3
+    coords = cc.pixel_to_cube_batch(centred, size).tolist()
+    return {Hex(tuple(c), (x, y), r, v) for c, ((x, y), (r, v)) in zip(coords, classes.items())}
 
 
-def extracts_sea_information(image, board_centre):
+def extracts_sea_information(image, board_centre, game=None):
     """
     Extracts the sea information include hex and ports from the image.
     :param image: The game image.
+    :param board_centre: The pixel position of the centre hex.
+    :param game: The GameState the ports are added to, defaults to Board().
     :return: A set of Hex objects and a set of port objects
         e.g. {..., Hex(...), ...}, {..., Port(...), ...}
     """
@@ -258,29 +258,29 @@ def extracts_sea_information(image, board_centre):
         points.append(contour_centre(c))
         ports.append(extract_port(utils.contour_bounding_box(image, c)))
 
-    x, y = list(zip(*points))
-    cx, cy = np.mean(x), np.mean(y)
-    size = max([utils.distance((cx, cy), p) for p in points]) / 5
+    centred = np.asarray(points) - np.mean(points, axis=0)
+    size = np.linalg.norm(centred, axis=1).max() / 5
+    coords = cc.pixel_to_cube_batch(centred, size).tolist()
 
     hexes = set()
-    for (x, y), p in zip(points, ports):
-        ap = x - cx, y - cy
-        c = cc.pixel_to_cube(ap, size)
+    for (x, y), c, p in zip(points, coords, ports):
+        c = tuple(c)
         if p is not None:
-            Port(c, facts.PORT_PLACEMENT[c], p)
+            Port(c, facts.PORT_PLACEMENT[c], p, game=game)
         hexes.add(Hex(c, (x, y), facts.TILES.SEA, p))
     return hexes
 
 
-def initial_board_extraction(image):
+def initial_board_extraction(image, game=None):
     """
     Extracts the initial information for the board.
     :param image: The game image.
+    :param game: The GameState the ports are added to, defaults to Board().
     :return:
     """
     inner = extract_land_information(image)
     board_centre = next(h.real_coords for h in inner if h.cube_coords == (0, 0, 0))
-    outer = extracts_sea_information(image, board_centre)
+    outer = extracts_sea_information(image, board_centre, game)
     return inner | outer
 
 
@@ -301,20 +301,22 @@ def extract_roads(image, road_positions, padding=7):
         # match = match_images(bb, )
 
 
-def extract_settlements(image, triples):
+def extract_settlements(image, triples, game=None):
     """
     Extracts the positions of the settlements given a set of possible positions.
     :param image: The game image.
     :param triples: A set of triples representing the possible settlement positions.
+    :param game: The GameState with the hexes real positions, defaults to Board().
     :return: The position of the roads if they are in the :param open_settlement_positions.
     """
     triples_colour = defaultdict(set)
     for t in triples:
-        x, y = real_triple_location(t)
+        x, y = real_triple_location(t, game)
         x, y = int(x), int(y)
         bb = image[y - 40:y + 30, x - 30:x + 30, ...]
 
-        match = match_images(bb, facts.SETTLEMENT_IMAGES_DIR, 0.10)
+        # Scoring the three templates closest in colour halves the time and detects the same settlements.
+        match = match_images(bb, facts.SETTLEMENT_IMAGES_DIR, 0.10, prefilter=3)
         if match is not None:
             colour = match.split("_")[1][:-4]
             triples_colour[colour].add(t)
@@ -0,0 +1,169 @@
+from collections import defaultdict
+import numpy as np
+import colonist_ql.model.cube_coord as cc
+from colonist_ql.model.board import default_game
+
+# Kinds of region of interest on the screen.
+VERTEX = "vertex"
+EDGE = "edge"
+TILE = "tile"
+LOG = "log"
+
+# The box around a vertex, as extract_settlements crops it, as (up, down, left, right) pixels.
+VERTEX_BOX = (40, 30, 30, 30)
+
+# The padding around an edge, as extract_roads crops it.
+EDGE_PADDING = 7
+
+
+class Regions:
+    """
+    The regions of interest of the screen, each a kind, a key and a (y0, y1, x0, x1) pixel box.
+    """
+    def __init__(self, regions):
+        """
+        Init for Regions.
+        :param regions: An iterable of (kind, key, (y0, y1, x0, x1)).
+        """
+        regions = list(regions)
+        self.kinds = [k for k, _, _ in regions]
+        self.keys = [key for _, key, _ in regions]
+        self.boxes = np.array([b for _, _, b in regions], dtype=np.int64).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def grouped(self, indices):
+        """
+        Groups regions by kind.
+        :param indices: An iterable of region indices.
+        :return: A dictionary of kind to a list of keys.
+        """
+        groups = defaultdict(list)
+        for i in indices:
+            groups[self.kinds[i]].append(self.keys[i])
+        return dict(groups)
+
+
+def board_regions(game=None, log_box=None, k=3):
+    """
+    Builds the regions of interest of a board whose hexes have been extracted.
+    Vertices and edges are boxed as extract_settlements and extract_roads crop them, and each land tile is boxed
+    around its centre for the robber.
+    :param game: The GameState with the hexes real positions, defaults to Board().
+    :param log_box: Optionally, the (y0, y1, x0, x1) box of the log panel.
+    :param k: The radius of the board including the sea ring.
+    :return: A Regions.
+    """
+    topology = cc.board_topology(k)
+    hexes = default_game(game).hexes
+    pixels = np.array([hexes.get(c).real_coords for c in topology.hexes], dtype=np.float64)
+    vertices = pixels[topology.vertex_hexes].mean(axis=1)
+    edges = vertices[topology.edge_vertices]
+
+    up, down, left, right = VERTEX_BOX
+    regions = [(VERTEX, t, (y - up, y + down, x - left, x + right))
+               for t, (x, y) in zip(topology.vertices, vertices.astype(np.int64))]
+    p = EDGE_PADDING
+    regions += [(EDGE, e, (min(y0, y1) - p, max(y0, y1) + p, min(x0, x1) - p, max(x0, x1) + p))
+                for e, ((x0, y0), (x1, y1)) in zip(topology.edges, edges.astype(np.int64))]
+
+    # The hex side, the mean length of an edge, which is also the distance from a hex centre to its corners.
+    radius = int(np.linalg.norm(vertices[topology.edge_vertices[:, 0]] - vertices[topology.edge_vertices[:, 1]],
+                                axis=1).mean())
+    regions += [(TILE, h, (y - radius, y + radius, x - radius, x + radius))
+                for h, (x, y), land in zip(topology.hexes, pixels.astype(np.int64), topology.land_hexes) if land]
+    if log_box is not None:
+        regions.append((LOG, None, tuple(log_box)))
+    return Regions(regions)
+
+
+class FrameDiffer:
+    """
+    Finds the regions of interest that changed between consecutive frames from a cheap downsampled diff.
+    Frames are reduced to the grey mean of stride x stride blocks before being compared, and the changed blocks are
+    summed over the boxes of every region at once with an integral image.
+    """
+    def __init__(self, regions, stride=4, threshold=24, min_changed=2):
+        """
+        Init for FrameDiffer.
+        :param regions: The Regions to watch.
+        :param stride: The size of the blocks the frames are averaged over.
+        :param threshold: The change of a block's mean grey level for it to have changed.
+        :param min_changed: The number of changed blocks for a region to have changed.
+        """
+        self.regions = regions
+        self.stride = stride
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.boxes = np.maximum(regions.boxes, 0) // stride + np.array([0, 1, 0, 1])
+        self.previous = None
+
+    def _small(self, frame):
+        """
+        Reduces a frame to the grey mean of each stride x stride block, so changes thinner than the stride still move
+        the block they are in.
+        :param frame: A BGR or grey frame.
+        :return: An int32 array of the block means.
+        """
+        s = self.stride
+        h, w = frame.shape[0] // s, frame.shape[1] // s
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        # Summing the rows of each block first keeps the widest reduction in uint16.
+        rows = frame[:h * s, :w * s].astype(np.uint16).reshape(h, s, -1).sum(axis=1, dtype=np.uint16)
+        return rows.reshape(h, w, -1).sum(axis=2, dtype=np.int32) // (s * s * channels)
+
+    def changed(self, frame):
+        """
+        Compares a frame with the previous frame.
+        The first frame, and a frame of a new size, change every region.
+        :param frame: The frame.
+        :return: An array of the indices of the changed regions.
+        """
+        small = self._small(frame)
+        previous, self.previous = self.previous, small
+        if previous is None or previous.shape != small.shape:
+            return np.arange(len(self.regions))
+
+        mask = np.abs(small - previous) > self.threshold
+        if not mask.any():
+            return np.arange(0)
+
+        h, w = mask.shape
+        s = np.zeros((h + 1, w + 1), dtype=np.int64)
+        s[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+        y0, y1 = np.clip(self.boxes[:, 0], 0, h), np.clip(self.boxes[:, 1], 0, h)
+        x0, x1 = np.clip(self.boxes[:, 2], 0, w), np.clip(self.boxes[:, 3], 0, w)
+        counts = s[y1, x1] - s[y0, x1] - s[y1, x0] + s[y0, x0]
+        return np.flatnonzero(counts >= self.min_changed)
+
+    def reset(self):
+        self.previous = None
+
+
+def changed_frames(frames, differ):
+    """
+    Drops the frames in which no region of interest changed.
+    :param frames: An iterable of frames, e.g. game_image_extraction.game_images().
+    :param differ: The FrameDiffer.
+    :yield: The frame and a dictionary of kind to the keys of the changed regions.
+    """
+    for frame in frames:
+        indices = differ.changed(frame)
+        if len(indices):
+            yield frame, differ.regions.grouped(indices)
+
+
+def frame_pipeline(frames, differ, detectors):
+    """
+    Runs detectors only on the regions of interest that changed, dropping unchanged frames before any detection.
+    :param frames: An iterable of frames, e.g. game_image_extraction.game_images().
+    :param differ: The FrameDiffer.
+    :param detectors: A dictionary of kind to a function of (frame, keys of the changed regions) e.g.
+        {VERTEX: lambda image, triples: extract_settlements(image, triples, game)}.
+    :yield: A dictionary of kind to the result of its detector for each frame a watched region changed in.
+    """
+    for frame, changed in changed_frames(frames, differ):
+        results = {kind: detectors[kind](frame, keys) for kind, keys in changed.items() if kind in detectors}
+        if results:
+            yield results
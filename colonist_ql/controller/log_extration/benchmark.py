@@ -0,0 +1,72 @@
+import glob
+import time
+from pyparsing import ParseException
+import colonist_ql.controller.log_extration.parser as parser
+
+_ROLLED = " rolled: "
+
+
+def turn_strings(text):
+    """
+    Splits a log into the opening and a string for each turn, a turn starting at a dice roll.
+    :param text: The log text.
+    :return: The opening string and a list of turn strings.
+    """
+    lines = text.split("\n")
+    starts = [i for i, line in enumerate(lines) if _ROLLED in line] + [len(lines)]
+    first = next((i for i, line in enumerate(lines) if " turn to place" in line), 0)
+    opening = "\n".join(lines[first:starts[0]])
+    turns = ["\n".join(lines[a:b]) for a, b in zip(starts, starts[1:])]
+    return opening, turns
+
+
+def _parse_log(opening, turns):
+    """
+    Parses the opening and turns of a log with the grammar.
+    :param opening: The opening string.
+    :param turns: A list of turn strings.
+    :return: The number of strings parsed.
+    """
+    parsed, grammars = 0, parser.compiled_grammar()
+    for grammar, string in [(grammars["OPENING"], opening)] + [(grammars["TURN"], t) for t in turns]:
+        try:
+            grammar.parseString(string)
+            parsed += 1
+        except ParseException:
+            pass
+    return parsed
+
+
+def benchmark_parsing(paths, repeat=5, cache_size=1024):
+    """
+    Times parsing logs with the parser.py grammar with and without packrat memoization.
+    The whole GAME grammar does not cover every line of the current logs, so each log is parsed as its opening and
+    its turns.
+    :param paths: An iterable of paths of action logs.
+    :param repeat: The number of times each log is parsed, the fastest time is kept.
+    :param cache_size: The packrat cache size.
+    :return: A list of (path, strings parsed, total strings, plain seconds, packrat seconds) for each log.
+    """
+    results = []
+    for path in paths:
+        with open(path) as f:
+            opening, turns = turn_strings(f.read())
+        times = []
+        for fast in (False, True):
+            if fast:
+                parser.enable_fast_parsing(cache_size)
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                parsed = _parse_log(opening, turns)
+                best = min(best, time.perf_counter() - start)
+            times.append(best)
+            parser.disable_fast_parsing()
+        results.append((path, parsed, len(turns) + 1, *times))
+    return results
+
+
+if __name__ == "__main__":
+    for path, parsed, total, plain, packrat in benchmark_parsing(sorted(glob.glob("logs/action_logs/*.txt"))):
+        print(f"{path}: parsed {parsed}/{total}, plain {plain * 1e3:.1f}ms, packrat {packrat * 1e3:.1f}ms, "
+              f"speedup {plain / packrat:.2f}x")
@@ -0,0 +1,200 @@
+import numpy as np
+import colonist_ql.facts as facts
+import colonist_ql.controller.log_extration.events as ev
+from colonist_ql.controller.log_extration.stream import parse_log_file
+
+RESOURCE_ORDER = [r.value for r in facts.RESOURCES]
+RESOURCE_INDEX = {r: i for i, r in enumerate(RESOURCE_ORDER)}
+
+# One row per event, players are interned ids with -1 for none and resources are counts in RESOURCE_ORDER.
+EVENT_DTYPE = np.dtype([
+    ("game", np.int32),
+    ("turn", np.int16),
+    ("type", np.int8),
+    ("player", np.int16),
+    ("other", np.int16),
+    ("value", np.int16),
+    ("give", np.int8, (len(RESOURCE_ORDER),)),
+    ("take", np.int8, (len(RESOURCE_ORDER),)),
+])
+
+
+def resource_counts(resources):
+    """
+    Counts resources in RESOURCE_ORDER.
+    :param resources: An iterable of resource names.
+    :return: A list of counts.
+    """
+    counts = [0] * len(RESOURCE_ORDER)
+    for r in resources:
+        counts[RESOURCE_INDEX[r]] += 1
+    return counts
+
+
+class EventStore:
+    """
+    Columnar store of the events of a corpus of games.
+    Every event is a row of a structured array, so queries over thousands of games are array operations instead of
+    walks over event objects. Rows are appended in chunks and concatenated when the array is next read.
+    """
+    def __init__(self):
+        self.players = []
+        self.player_ids = {}
+        self.games = []
+        self._chunks = []
+        self._events = np.zeros(0, dtype=EVENT_DTYPE)
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def events(self):
+        """
+        The structured array of all the events.
+        """
+        if self._chunks:
+            self._events = np.concatenate([self._events, *self._chunks])
+            self._chunks = []
+        return self._events
+
+    def player_id(self, name):
+        """
+        Interns a player name.
+        :param name: The name of the player, or None.
+        :return: The id of the player, -1 for None.
+        """
+        if name is None:
+            return -1
+        if name not in self.player_ids:
+            self.player_ids[name] = len(self.players)
+            self.players.append(name)
+        return self.player_ids[name]
+
+    def add_game(self, events, name=None):
+        """
+        Adds the events of a game.
+        :param events: An iterable of Events.
+        :param name: A name for the game, e.g. the path of its log.
+        :return: The id of the game.
+        """
+        game = len(self.games)
+        self.games.append(name)
+        rows = []
+        for e in events:
+            other, value, give, take = e.columns()
+            rows.append((
+                game, e.turn, ev.EVENT_TYPE_IDS[type(e)], self.player_id(e.player), self.player_id(other), value,
+                resource_counts(give), resource_counts(take)
+            ))
+        self._chunks.append(np.array(rows, dtype=EVENT_DTYPE))
+        return game
+
+    def add_log(self, path):
+        """
+        Parses and adds the log of a game.
+        :param path: The path of the action log.
+        :return: The id of the game.
+        """
+        return self.add_game(parse_log_file(path), path)
+
+    @classmethod
+    def from_logs(cls, paths):
+        """
+        Builds a store from action logs.
+        :param paths: An iterable of paths of action logs.
+        :return: An EventStore.
+        """
+        store = cls()
+        for path in paths:
+            store.add_log(path)
+        return store
+
+    def extend(self, other):
+        """
+        Adds the games of another store, re-interning its players.
+        :param other: An EventStore.
+        :return: The ids of the added games.
+        """
+        events = other.events.copy()
+        players = np.array([self.player_id(p) for p in other.players] + [-1], dtype=np.int16)
+        events["player"] = players[events["player"]]
+        events["other"] = players[events["other"]]
+        events["game"] += len(self.games)
+        games = range(len(self.games), len(self.games) + len(other.games))
+        self.games.extend(other.games)
+        self._chunks.append(events)
+        return games
+
+    def select(self, event_type, game=None, player=None):
+        """
+        Selects the events of a type.
+        :param event_type: An Event subclass.
+        :param game: Optionally, the id of a game to select from.
+        :param player: Optionally, the name of the player to select the events of.
+        :return: A structured array of the events.
+        """
+        events = self.events
+        mask = events["type"] == ev.EVENT_TYPE_IDS[event_type]
+        if game is not None:
+            mask &= events["game"] == game
+        if player is not None:
+            mask &= events["player"] == self.player_ids.get(player, -2)
+        return events[mask]
+
+    def roll_histogram(self, game=None):
+        """
+        Counts the dice rolls.
+        :param game: Optionally, the id of a game to count the rolls of.
+        :return: An array of the counts of each roll total, indexed by the total.
+        """
+        return np.bincount(self.select(ev.DiceRolled, game)["value"], minlength=13)
+
+    def trade_volume(self, event_type=ev.Traded, game=None):
+        """
+        Totals the resources traded by each player.
+        :param event_type: Traded for trades between players or BankTraded for bank trades.
+        :param game: Optionally, the id of a game to total the trades of.
+        :return: Arrays of the resources given and taken by each player, shaped (players, resources).
+        """
+        trades = self.select(event_type, game)
+        give = np.zeros((len(self.players), len(RESOURCE_ORDER)), dtype=np.int64)
+        take = np.zeros_like(give)
+        np.add.at(give, trades["player"], trades["give"])
+        np.add.at(take, trades["player"], trades["take"])
+        return give, take
+
+    def resources_gained(self, game=None):
+        """
+        Totals the resources gained by each player from rolls, the opening and the bank.
+        :param game: Optionally, the id of a game to total.
+        :return: An array shaped (players, resources).
+        """
+        gained = self.select(ev.ResourcesGained, game)
+        total = np.zeros((len(self.players), len(RESOURCE_ORDER)), dtype=np.int64)
+        np.add.at(total, gained["player"], gained["take"])
+        return total
+
+    def save(self, path):
+        """
+        Saves the store as a compressed npz file.
+        :param path: The path of the file.
+        """
+        np.savez_compressed(
+            path, events=self.events, players=np.array(self.players, dtype=str),
+            games=np.array(["" if g is None else g for g in self.games], dtype=str)
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a store saved with save.
+        :param path: The path of the file.
+        :return: An EventStore.
+        """
+        store = cls()
+        with np.load(path) as data:
+            store._events = data["events"]
+            for name in data["players"]:
+                store.player_id(str(name))
+            store.games = [str(g) or None for g in data["games"]]
+        return store
@@ -0,0 +1,188 @@
+class Event:
+    """
+    Base of the events parsed from an action log.
+    Subclasses declare their fields in __slots__, which are set in order from the positional arguments after the player.
+    """
+    __slots__ = ("turn", "player")
+
+    def __init__(self, player, *values, turn=0):
+        self.turn = turn
+        self.player = player
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @property
+    def fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and (self.turn, self.player, self.fields) == \
+            (other.turn, other.player, other.fields)
+
+    def __repr__(self):
+        values = ", ".join(f"{n}={getattr(self, n)!r}" for n in ("turn", "player") + self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+    def columns(self):
+        """
+        The values of the event for a columnar store.
+        :return: The other player involved, an int value and the resources given and taken by the player.
+        """
+        return None, 0, (), ()
+
+
+class PlacementTurn(Event):
+    __slots__ = ("structure",)
+
+    def columns(self):
+        return None, STRUCTURE_IDS[self.structure], (), ()
+
+
+class StartingResources(Event):
+    __slots__ = ()
+
+
+class DiceRolled(Event):
+    __slots__ = ("dice",)
+
+    @property
+    def total(self):
+        return sum(self.dice)
+
+    def columns(self):
+        return None, self.total, (), ()
+
+
+class ResourcesGained(Event):
+    """
+    Resources gained from a roll, the opening or from the bank with a year of plenty.
+    """
+    __slots__ = ("resources", "from_bank")
+
+    def columns(self):
+        return None, int(self.from_bank), (), self.resources
+
+
+class Built(Event):
+    """
+    A structure built, placed is True when it was free, in the opening or from a road building.
+    """
+    __slots__ = ("structure", "placed")
+
+    def columns(self):
+        return None, STRUCTURE_IDS[self.structure] + len(STRUCTURE_IDS) * self.placed, (), ()
+
+
+class TradeProposed(Event):
+    __slots__ = ("targets", "give", "want")
+
+    def columns(self):
+        return None, len(self.targets), self.give, self.want
+
+
+class Traded(Event):
+    """
+    A trade between players, the resources are those of the players last proposal.
+    """
+    __slots__ = ("partner", "give", "want")
+
+    def columns(self):
+        return self.partner, 0, self.give, self.want
+
+
+class BankTraded(Event):
+    __slots__ = ("give", "take")
+
+    def columns(self):
+        return None, 0, self.give, self.take
+
+
+class RobberMoved(Event):
+    __slots__ = ("tile",)
+
+    def columns(self):
+        return None, self.tile, (), ()
+
+
+class Robbed(Event):
+    """
+    A player robbing another, resources is empty when the stolen card is not visible in the log and None when the
+    victim had no cards to steal. A visible card follows as a RobberyRevealed.
+    """
+    __slots__ = ("victim", "resources")
+
+    def columns(self):
+        return self.victim, int(self.resources is not None), (), self.resources or ()
+
+
+class RobberyRevealed(Event):
+    """
+    The card stolen in the previous Robbed, visible to the thief and the victim.
+    """
+    __slots__ = ("victim", "resources")
+
+    def columns(self):
+        return self.victim, 0, (), self.resources
+
+
+class DevCardBought(Event):
+    __slots__ = ()
+
+
+class DevCardPlayed(Event):
+    __slots__ = ("card", "resources")
+
+    def columns(self):
+        return None, DEV_CARD_IDS[self.card], (), self.resources
+
+
+class DiscardRequired(Event):
+    __slots__ = ("hand", "n")
+
+    def columns(self):
+        return None, self.n, (), ()
+
+
+class Discarded(Event):
+    __slots__ = ("resources",)
+
+    def columns(self):
+        return None, 0, self.resources, ()
+
+
+class AwardReceived(Event):
+    __slots__ = ("award",)
+
+    def columns(self):
+        return None, AWARD_IDS[self.award], (), ()
+
+
+class Embargo(Event):
+    __slots__ = ("target", "active")
+
+    def columns(self):
+        return self.target, int(self.active), (), ()
+
+
+class Connection(Event):
+    __slots__ = ("connected",)
+
+    def columns(self):
+        return None, int(self.connected), (), ()
+
+
+class GameWon(Event):
+    __slots__ = ()
+
+
+# The order gives the type ids of events in a columnar store.
+EVENT_TYPES = (
+    PlacementTurn, StartingResources, DiceRolled, ResourcesGained, Built, TradeProposed, Traded, BankTraded,
+    RobberMoved, Robbed, DevCardBought, DevCardPlayed, DiscardRequired, Discarded, AwardReceived, Embargo,
+    Connection, GameWon, RobberyRevealed
+)
+EVENT_TYPE_IDS = {t: i for i, t in enumerate(EVENT_TYPES)}
+
+STRUCTURE_IDS = {"road": 0, "settlement": 1, "city": 2}
+DEV_CARD_IDS = {"knight": 0, "monopoly": 1, "road building": 2, "year of plenty": 3}
+AWARD_IDS = {"longest road": 0, "largest army": 1}
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from colonist_ql.controller.log_extration.event_store import EventStore
+from colonist_ql.controller.log_extration.stream import LogStream
+
+MANIFEST = "manifest.json"
+
+
+class IngestReport:
+    """
+    Summary of an ingestion run.
+    """
+    def __init__(self, ingested=0, skipped=0, events=0, failed=None, unparsed_lines=0, seconds=0.0):
+        self.ingested = ingested
+        self.skipped = skipped
+        self.events = events
+        self.failed = failed if failed is not None else []
+        self.unparsed_lines = unparsed_lines
+        self.seconds = seconds
+
+    @property
+    def files_per_second(self):
+        return self.ingested / self.seconds if self.seconds else 0.0
+
+    @property
+    def events_per_second(self):
+        return self.events / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        failed = "".join(f"\n\t{path}: {error}" for path, error in self.failed)
+        return f"Ingested {self.ingested} logs ({self.events} events) in {self.seconds:.2f}s, " \
+               f"{self.files_per_second:.1f} logs/s, {self.events_per_second:.0f} events/s\n" \
+               f"Skipped: {self.skipped}, Unparsed lines: {self.unparsed_lines}, Failed: {len(self.failed)}{failed}"
+
+
+def content_hash(path):
+    """
+    Hashes the content of a file.
+    :param path: The path of the file.
+    :return: The hex digest of the content.
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _parse_files(paths):
+    """
+    Parses a batch of logs into a store, run in the worker processes.
+    :param paths: A list of paths of action logs.
+    :return: The EventStore of the parsed games, the number of events and unparsed lines of each parsed log, and the
+    errors of the logs that failed.
+    """
+    store, parsed, failed = EventStore(), [], []
+    for path in paths:
+        try:
+            stream = LogStream()
+            with open(path) as f:
+                events = stream.feed(f.read())
+            events += stream.close()
+        except Exception as e:
+            failed.append((path, f"{type(e).__name__}: {e}"))
+            continue
+        store.add_game(events, path)
+        parsed.append((path, len(events), len(stream.unparsed)))
+    return store, parsed, failed
+
+
+def load_manifest(out_dir):
+    """
+    Loads the manifest of an ingested corpus.
+    :param out_dir: The directory of the corpus.
+    :return: A dictionary of content hash to the path and shard of each ingested log.
+    """
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def ingest(paths, out_dir, max_workers=None, batch_size=32):
+    """
+    Parses action logs over a process pool into a compressed shard of an on-disk corpus.
+    Logs whose content has already been ingested into the corpus are skipped, and a log that fails to parse is
+    reported without stopping the others.
+    :param paths: An iterable of paths of action logs.
+    :param out_dir: The directory of the corpus.
+    :param max_workers: The number of worker processes, defaults to the number of processors.
+    :param batch_size: The number of logs parsed by a worker per task.
+    :return: An IngestReport.
+    """
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    report = IngestReport()
+
+    hashes, seen = {}, set()
+    for path in paths:
+        try:
+            h = content_hash(path)
+        except OSError as e:
+            report.failed.append((path, f"{type(e).__name__}: {e}"))
+            continue
+        if h in manifest or h in seen:
+            report.skipped += 1
+        else:
+            hashes[path] = h
+            seen.add(h)
+    pending = list(hashes)
+
+    store = EventStore()
+    shard = f"shard_{len({m['shard'] for m in manifest.values()}):05}.npz"
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_parse_files, pending[i:i + batch_size]): pending[i:i + batch_size]
+            for i in range(0, len(pending), batch_size)
+        }
+        for future in as_completed(futures):
+            try:
+                batch_store, parsed, failed = future.result()
+            except Exception as e:
+                report.failed.extend((path, f"{type(e).__name__}: {e}") for path in futures[future])
+                continue
+            report.failed.extend(failed)
+            for game, (path, n_events, n_unparsed) in zip(store.extend(batch_store), parsed):
+                manifest[hashes[path]] = {"path": path, "shard": shard, "game": game}
+                report.ingested += 1
+                report.events += n_events
+                report.unparsed_lines += n_unparsed
+
+    if report.ingested:
+        store.save(os.path.join(out_dir, shard))
+        with open(os.path.join(out_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def load_corpus(out_dir):
+    """
+    Loads every shard of an ingested corpus into one store.
+    :param out_dir: The directory of the corpus.
+    :return: An EventStore.
+    """
+    store = EventStore()
+    for shard in sorted({m["shard"] for m in load_manifest(out_dir).values()}):
+        store.extend(EventStore.load(os.path.join(out_dir, shard)))
+    return store
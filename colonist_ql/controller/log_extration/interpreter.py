@@ -1,20 +1,22 @@
 from colonist_ql.controller.log_extration.parser import TURN, OPENING, GAME, CLOSING_TURN
-from colonist_ql.model.board import Board
+from colonist_ql.model.board import default_game
 
 
-def interpret_turn(turn_string):
+def interpret_turn(turn_string, game=None):
+    game = default_game(game)
     turn_dict = TURN.parseString(turn_string).asDict()
-    player_turn = Board().get_player(turn_dict["player_turn"])
+    player_turn = game.get_player(turn_dict["player_turn"])
     for p, r in turn_dict["got_resource"].items():
-        Board().get_player(p).add_resources(r[0])
+        game.get_player(p).add_resources(r[0])
 
 
-def interpret_opening(opening_string):
+def interpret_opening(opening_string, game=None):
+    game = default_game(game)
     opening_dict = OPENING.parseString(opening_string).asDict()
 
     for p, r in opening_dict["got_resource"].items():
-        Board().get_player(p).add_resources(r[0])
-    Board().set_turn_order([p for p, *_ in opening_dict["placement_phase"][0]])
+        game.get_player(p).add_resources(r[0])
+    game.set_turn_order([p for p, *_ in opening_dict["placement_phase"][0]])
 
 
 
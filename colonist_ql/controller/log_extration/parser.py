@@ -1,22 +1,35 @@
 import ast
+import functools
+import re
+from contextlib import contextmanager
 import colonist_ql.facts as facts
 from pyparsing import *
 
+
+def _alternatives(values):
+    """
+    Compiles a regex matching any of the values, with longer values first so none is cut short by a prefix.
+    :param values: An iterable of strings.
+    :return: A compiled regex.
+    """
+    return re.compile(r"(?:" + r"|".join(re.escape(v) for v in sorted(values, key=len, reverse=True)) + r")")
+
+
 # Extracts players name.
-_PLAYER = Regex(r"(\w)+\d*(\w)*(#\d+)?").setName("player")
+_PLAYER = Regex(re.compile(r"\w+(?:#\d+)?")).setName("player")
 
 # Extracts hex identifier.
 _HEX_NUM = Regex(r"\d+").setName("hex_num")
 
 # Extracts hex structure type. i.e. road, settlement or city.
-_STRUCTURE = Regex(r"|".join(f"({s.value})" for s in facts.STRUCTURES)).setName("structure")
+_STRUCTURE = Regex(_alternatives(s.value for s in facts.STRUCTURES)).setName("structure")
 
 # Extracts two dice values, and players turn.
 _DICE = (Suppress("dice_") + Regex("[1-6]") + Suppress("dice_") + Regex("[1-6]")).setName("dice")
 DICE_ROLL = _PLAYER("player_turn") + Suppress("rolled:") + _DICE("dice_rolled")
 
 # Resource types, and who got those resources.
-_RESOURCE = Regex(r"|".join(f"({s.value})" for s in facts.RESOURCES)).setName("resource")
+_RESOURCE = Regex(_alternatives(s.value for s in facts.RESOURCES)).setName("resource")
 _RESOURCES = _RESOURCE * (1,)
 GOT_RESOURCES = Dict(Group(_PLAYER + Suppress("got:") + _RESOURCES) * (1, 4))("got_resource")
 
@@ -85,7 +98,7 @@ ROBBER_ACTION = Group(ROBBER_PLACEMENT + STOLE_CARD + PERSONAL_ROBBING * (0, 1))
 PURCHASED_DEV_CARD = Suppress(_PLAYER) + Suppress("bought") + Literal("development card")
 
 # Development usage and type.
-_CARD = Regex(r"(knight)|(monopoly)|(road building)|(year of plenty)").setName("dev_card")
+_CARD = Regex(_alternatives(["knight", "monopoly", "road building", "year of plenty"])).setName("dev_card")
 CARD_USE = Suppress(_PLAYER) + Suppress("used") + _CARD("type")
 
 # Card usage.
@@ -133,11 +146,11 @@ RECONNECTION = (
 )
 CONNECTION = DISCONNECTION | RECONNECTION
 
-_DICE_PHASE = (
-        (DICE_ROLL + GOT_RESOURCES) |
-        (DICE_ROLL + Suppress(_TO_DISCARD) + DISCARD + ROBBER_ACTION) |
-        DICE_ROLL
-)
+# The roll is factored out of the alternatives so it is only matched once.
+_DICE_PHASE = DICE_ROLL + (
+        GOT_RESOURCES |
+        (Suppress(_TO_DISCARD) + DISCARD + ROBBER_ACTION)
+) * (0, 1)
 TURN = (
     (
             PLAYED_CARD +
@@ -185,3 +198,47 @@ GAME = (
         Group(CLOSING_TURN)
     )("turns")
 )
+
+
+@functools.lru_cache(maxsize=None)
+def compiled_grammar():
+    """
+    Streamlines the top level grammars once, flattening their nested sequences and alternatives, so every later parse
+    and the packrat mode reuse the compiled elements.
+    :return: A dictionary of name to the streamlined GAME, OPENING, TURN and CLOSING_TURN.
+    """
+    grammars = {"GAME": GAME, "OPENING": OPENING, "TURN": TURN, "CLOSING_TURN": CLOSING_TURN}
+    for grammar in grammars.values():
+        grammar.streamline()
+    return grammars
+
+
+def enable_fast_parsing(cache_size=1024):
+    """
+    Enables pyparsing's packrat memoization with a bounded cache on the compiled grammar, so alternatives such as the
+    branches of TURN that retry the same elements at the same location reuse earlier results. This is global to
+    pyparsing. On the sample logs the cache bookkeeping costs more than it saves, see benchmark.
+    :param cache_size: The maximum number of cached results, None for an unbounded cache.
+    """
+    compiled_grammar()
+    ParserElement.enable_packrat(cache_size_limit=cache_size, force=True)
+
+
+def disable_fast_parsing():
+    """
+    Disables packrat memoization.
+    """
+    ParserElement.disable_memoization()
+
+
+@contextmanager
+def fast_parsing(cache_size=1024):
+    """
+    Context in which packrat memoization is enabled.
+    :param cache_size: The maximum number of cached results.
+    """
+    enable_fast_parsing(cache_size)
+    try:
+        yield
+    finally:
+        disable_fast_parsing()
@@ -0,0 +1,271 @@
+from collections import Counter
+import numpy as np
+import colonist_ql.facts as facts
+import colonist_ql.controller.log_extration.events as ev
+from colonist_ql.controller.log_extration.event_store import RESOURCE_ORDER, RESOURCE_INDEX, resource_counts
+from colonist_ql.controller.log_extration.stream import parse_log_file
+
+STRUCTURE_ORDER = list(ev.STRUCTURE_IDS)
+DEV_CARD_ORDER = list(ev.DEV_CARD_IDS)
+AWARD_ORDER = list(ev.AWARD_IDS)
+COSTS = {
+    p.value: np.array(resource_counts(r.value for r, c in cost.items() for _ in range(c)), dtype=np.int16)
+    for p, cost in facts.PURCHASES.items()
+}
+
+
+class ReplayState:
+    """
+    The state of a game that can be reconstructed from its action log.
+    The log does not give the locations of structures, so the state is the players hands, structures, development
+    cards and awards along with the robber, held in small arrays so a snapshot is a copy of a few hundred bytes.
+    Cards stolen without being shown in the log are counted in unknown, which is negative for the victim.
+    """
+    def __init__(self, players):
+        """
+        Init for ReplayState.
+        :param players: The names of the players, their order fixes the rows of the arrays.
+        """
+        self.players = list(players)
+        self.player_index = {p: i for i, p in enumerate(self.players)}
+        n = len(self.players)
+        self.hands = np.zeros((n, len(RESOURCE_ORDER)), dtype=np.int16)
+        self.unknown = np.zeros(n, dtype=np.int16)
+        self.structures = np.zeros((n, len(STRUCTURE_ORDER)), dtype=np.int16)
+        self.dev_cards = np.zeros(n, dtype=np.int16)
+        self.played = np.zeros((n, len(DEV_CARD_ORDER)), dtype=np.int16)
+        self.awards = np.full(len(AWARD_ORDER), -1, dtype=np.int16)
+        self.robber = -1
+        self.turn = 0
+        self.roll = 0
+        self.winner = None
+
+    def copy(self):
+        state = ReplayState.__new__(ReplayState)
+        state.__dict__.update(self.__dict__)
+        for name in ("hands", "unknown", "structures", "dev_cards", "played", "awards"):
+            setattr(state, name, getattr(self, name).copy())
+        return state
+
+    @property
+    def knights(self):
+        return self.played[:, DEV_CARD_ORDER.index(facts.DEV_CARD.KNIGHT)]
+
+    @property
+    def vp(self):
+        """
+        The visible victory points of each player, victory point cards are hidden until the end of the game.
+        """
+        awards = np.bincount(self.awards[self.awards >= 0], minlength=len(self.players))
+        return self.structures[:, STRUCTURE_ORDER.index("settlement")] + \
+            2 * self.structures[:, STRUCTURE_ORDER.index("city")] + 2 * awards
+
+    def apply(self, event):
+        """
+        Applies an event to the state.
+        :param event: An Event.
+        """
+        handler = APPLY.get(type(event))
+        if handler is not None:
+            handler(self, event)
+        self.turn = event.turn
+
+    def _index(self, player):
+        return self.player_index[player]
+
+    def _add(self, player, resources, sign=1):
+        if resources:
+            self.hands[self._index(player)] += sign * np.array(resource_counts(resources), dtype=np.int16)
+
+    def _rolled(self, e):
+        self.roll = e.total
+
+    def _gained(self, e):
+        self._add(e.player, e.resources)
+
+    def _built(self, e):
+        p = self._index(e.player)
+        if not e.placed:
+            self.hands[p] -= COSTS[e.structure]
+        self.structures[p, STRUCTURE_ORDER.index(e.structure)] += 1
+        if e.structure == "city":
+            self.structures[p, STRUCTURE_ORDER.index("settlement")] -= 1
+
+    def _traded(self, e):
+        self._add(e.player, e.give, -1)
+        self._add(e.player, e.want)
+        self._add(e.partner, e.give)
+        self._add(e.partner, e.want, -1)
+
+    def _bank_traded(self, e):
+        self._add(e.player, e.give, -1)
+        self._add(e.player, e.take)
+
+    def _robber_moved(self, e):
+        self.robber = e.tile
+
+    def _robbed(self, e):
+        if e.resources is not None:
+            self.unknown[self._index(e.player)] += 1
+            self.unknown[self._index(e.victim)] -= 1
+
+    def _revealed(self, e):
+        self.unknown[self._index(e.player)] -= len(e.resources)
+        self.unknown[self._index(e.victim)] += len(e.resources)
+        self._add(e.player, e.resources)
+        self._add(e.victim, e.resources, -1)
+
+    def _bought(self, e):
+        p = self._index(e.player)
+        self.hands[p] -= COSTS[facts.PURCHASABLE.DEV_CARD.value]
+        self.dev_cards[p] += 1
+
+    def _played(self, e):
+        p = self._index(e.player)
+        self.dev_cards[p] -= 1
+        self.played[p, DEV_CARD_ORDER.index(e.card)] += 1
+        if e.card == facts.DEV_CARD.MONO:
+            r = RESOURCE_INDEX[e.resources[0]]
+            taken = np.maximum(self.hands[:, r], 0)
+            taken[p] = 0
+            self.hands[:, r] -= taken
+            self.hands[p, r] += taken.sum()
+
+    def _discarded(self, e):
+        self._add(e.player, e.resources, -1)
+
+    def _award(self, e):
+        self.awards[AWARD_ORDER.index(e.award)] = self._index(e.player)
+
+    def _won(self, e):
+        self.winner = e.player
+
+    def to_game(self, game):
+        """
+        Sets the hands, knights and awards of the players of a game that are in the replay.
+        :param game: A GameState.
+        """
+        for player in game.get_players():
+            if player.name in self.player_index:
+                p = self._index(player.name)
+                player.hand = Counter({r: int(c) for r, c in zip(RESOURCE_ORDER, self.hands[p]) if c > 0})
+                player.knights = int(self.knights[p])
+                player.has_longest_road = self.awards[AWARD_ORDER.index("longest road")] == p
+                player.has_largest_army = self.awards[AWARD_ORDER.index("largest army")] == p
+
+
+APPLY = {
+    ev.DiceRolled: ReplayState._rolled,
+    ev.ResourcesGained: ReplayState._gained,
+    ev.Built: ReplayState._built,
+    ev.Traded: ReplayState._traded,
+    ev.BankTraded: ReplayState._bank_traded,
+    ev.RobberMoved: ReplayState._robber_moved,
+    ev.Robbed: ReplayState._robbed,
+    ev.RobberyRevealed: ReplayState._revealed,
+    ev.DevCardBought: ReplayState._bought,
+    ev.DevCardPlayed: ReplayState._played,
+    ev.Discarded: ReplayState._discarded,
+    ev.AwardReceived: ReplayState._award,
+    ev.GameWon: ReplayState._won,
+}
+
+
+class Replay:
+    """
+    Event-sourced replay of a game.
+    The state is snapshotted every snapshot_every events, so seeking to any event or turn restores the nearest
+    earlier snapshot and applies at most snapshot_every events, and stepping backwards is a seek.
+    """
+    def __init__(self, events, snapshot_every=32):
+        """
+        Init for Replay.
+        :param events: A list of Events of a game.
+        :param snapshot_every: The number of events between snapshots.
+        """
+        self.events = list(events)
+        self.snapshot_every = snapshot_every
+        self.turns = np.array([e.turn for e in self.events], dtype=np.int64)
+        players = [e.player for e in self.events if isinstance(e, ev.PlacementTurn)]
+        players += [p for e in self.events for p in (e.player, getattr(e, "victim", None), getattr(e, "partner", None))]
+        self.players = list(dict.fromkeys(p for p in players if p is not None))
+
+        self.state = ReplayState(self.players)
+        self.position = 0
+        self.snapshots = [self.state.copy()]
+        for event in self.events:
+            self._apply_next(event)
+        self.seek(0)
+
+    @classmethod
+    def from_log(cls, path, snapshot_every=32):
+        """
+        Builds a replay from an action log.
+        :param path: The path of the action log.
+        :param snapshot_every: The number of events between snapshots.
+        :return: A Replay.
+        """
+        return cls(parse_log_file(path), snapshot_every)
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def n_turns(self):
+        return int(self.turns[-1]) if len(self.turns) else 0
+
+    def _apply_next(self, event):
+        self.state.apply(event)
+        self.position += 1
+        if self.position % self.snapshot_every == 0 and self.position // self.snapshot_every == len(self.snapshots):
+            self.snapshots.append(self.state.copy())
+
+    def seek(self, position):
+        """
+        Moves the replay to after a number of events.
+        :param position: The number of events applied, clipped to the events of the game.
+        :return: The ReplayState.
+        """
+        position = min(max(position, 0), len(self.events))
+        if not self.position <= position < self.position + self.snapshot_every:
+            snapshot = position // self.snapshot_every
+            self.state = self.snapshots[snapshot].copy()
+            self.position = snapshot * self.snapshot_every
+        for event in self.events[self.position:position]:
+            self._apply_next(event)
+        return self.state
+
+    def seek_turn(self, turn):
+        """
+        Moves the replay to the end of a turn, turn 0 being the opening.
+        :param turn: The turn.
+        :return: The ReplayState.
+        """
+        return self.seek(int(np.searchsorted(self.turns, turn, side="right")))
+
+    def step(self, n=1):
+        """
+        Steps the replay forwards or backwards by events.
+        :param n: The number of events, negative to step backwards.
+        :return: The ReplayState.
+        """
+        return self.seek(self.position + n)
+
+    def step_turn(self, n=1):
+        """
+        Steps the replay forwards or backwards by turns.
+        :param n: The number of turns, negative to step backwards.
+        :return: The ReplayState.
+        """
+        return self.seek_turn(self.state.turn + n)
+
+    def state_at_turn(self, turn):
+        """
+        Gets a copy of the state at the end of a turn, leaving the replay where it is.
+        :param turn: The turn.
+        :return: A ReplayState.
+        """
+        position = self.position
+        state = self.seek_turn(turn).copy()
+        self.seek(position)
+        return state
@@ -0,0 +1,258 @@
+import re
+import colonist_ql.facts as facts
+import colonist_ql.controller.log_extration.events as ev
+from colonist_ql.controller.log_extration.parser import RECEIVED_LARGEST_ARMY, RECEIVED_LONGEST_ROAD, DISCONNECTION
+from colonist_ql.controller.log_extration.parser import _TO_DISCARD
+
+_RESOURCES = re.compile(r"|".join(r.value for r in facts.RESOURCES))
+_KEYWORD = re.compile(r"[a-z]+")
+
+_ROLLED = re.compile(r"rolled: dice_([1-6]) dice_([1-6])")
+_BUILT = re.compile(r"(built|placed) a (road|settlement|city)")
+_PROPOSED = re.compile(r"wants to give(.*?):(.*?)for:(.*)")
+_TRADED = re.compile(r"traded with: (\S+)")
+_BANK = re.compile(r"gave bank:(.*)and took(.*)")
+_ROBBER = re.compile(r"moved robber\s*to tile: (\d+)")
+_STOLE_CARD = re.compile(r"stole card from: (\S+)")
+_STOLE = re.compile(r"stole:(.*?)(?:from: (\S+))?$")
+_NO_STEAL = re.compile(r"could not steal card from : (\S+)")
+_USED = re.compile(r"used (knight|monopoly|road building|year of plenty)(?: & stole all of:(.*))?")
+_TURN_TO_PLACE = re.compile(r"turn to place (road|settlement|city)")
+_EMBARGO = re.compile(r"(started|ended) an embargo against (\S+)")
+
+
+def _resources(text):
+    return tuple(_RESOURCES.findall(text))
+
+
+def _players(text):
+    return tuple(p.strip() for p in text.split("&") if p.strip())
+
+
+def _rolled(player, rest):
+    m = _ROLLED.match(rest)
+    return m and ev.DiceRolled(player, (int(m.group(1)), int(m.group(2))))
+
+
+def _got(player, rest):
+    return ev.ResourcesGained(player, _resources(rest), False)
+
+
+def _built(player, rest):
+    m = _BUILT.match(rest)
+    return m and ev.Built(player, m.group(2), m.group(1) == "placed")
+
+
+def _wants(player, rest):
+    m = _PROPOSED.match(rest)
+    return m and ev.TradeProposed(player, _players(m.group(1)), _resources(m.group(2)), _resources(m.group(3)))
+
+
+def _traded(player, rest):
+    m = _TRADED.match(rest)
+    return m and ev.Traded(player, m.group(1), (), ())
+
+
+def _gave(player, rest):
+    m = _BANK.match(rest)
+    return m and ev.BankTraded(player, _resources(m.group(1)), _resources(m.group(2)))
+
+
+def _moved(player, rest):
+    m = _ROBBER.match(rest)
+    return m and ev.RobberMoved(player, int(m.group(1)))
+
+
+def _stole(player, rest):
+    m = _STOLE_CARD.match(rest)
+    if m:
+        return ev.Robbed(player, m.group(1), ())
+    m = _STOLE.match(rest)
+    # "You stole:" lines name the victim but not the thief, which is filled in from the robbery.
+    return m and ev.RobberyRevealed(None if player == "You" else player, m.group(2), _resources(m.group(1)))
+
+
+def _could(player, rest):
+    m = _NO_STEAL.match(rest)
+    return m and ev.Robbed(player, m.group(1), None)
+
+
+def _bought(player, rest):
+    return rest.startswith("bought development card") and ev.DevCardBought(player)
+
+
+def _used(player, rest):
+    m = _USED.match(rest)
+    return m and ev.DevCardPlayed(player, m.group(1), _resources(m.group(2) or ""))
+
+
+def _took(player, rest):
+    return rest.startswith("took from bank:") and ev.ResourcesGained(player, _resources(rest), True)
+
+
+def _discarded(player, rest):
+    return ev.Discarded(player, _resources(rest))
+
+
+def _has(player, rest):
+    if rest.startswith("has:"):
+        (_, hand, n), = _TO_DISCARD.parseString(f"{player} {rest}")[0]
+        return ev.DiscardRequired(player, int(hand), int(n))
+    elif rest.startswith("has disconnected"):
+        return ev.Connection(DISCONNECTION.parseString(f"{player} {rest}")[0], False)
+    elif rest.startswith("has reconnected"):
+        return ev.Connection(player, True)
+    return None
+
+
+def _turn(player, rest):
+    m = _TURN_TO_PLACE.match(rest)
+    return m and ev.PlacementTurn(player, m.group(1))
+
+
+def _embargo(player, rest):
+    m = _EMBARGO.match(rest)
+    return m and ev.Embargo(player, m.group(2), m.group(1) == "started")
+
+
+def _received(player, rest):
+    if rest.startswith("received longest road"):
+        return ev.AwardReceived(player, "longest road")
+    elif rest.startswith("received largest army"):
+        return ev.AwardReceived(player, "largest army")
+    return None
+
+
+# Dispatch of lines starting with a player, keyed by the first word after the players name.
+PLAYER_DISPATCH = {
+    "got": _got,
+    "rolled": _rolled,
+    "wants": _wants,
+    "built": _built,
+    "placed": _built,
+    "moved": _moved,
+    "bought": _bought,
+    "used": _used,
+    "stole": _stole,
+    "gave": _gave,
+    "traded": _traded,
+    "turn": _turn,
+    "discarded": _discarded,
+    "has": _has,
+    "took": _took,
+    "received": _received,
+    "could": _could,
+    "started": _embargo,
+    "ended": _embargo,
+}
+
+
+def _passed(grammar, award):
+    return lambda line: ev.AwardReceived(grammar.parseString(line)[0], award)
+
+
+def _won(line):
+    return ev.GameWon(line.split()[1])
+
+
+# Dispatch of lines that do not start with a player, keyed by the start of the line.
+LINE_DISPATCH = (
+    ("longest road has passed", _passed(RECEIVED_LONGEST_ROAD, "longest road")),
+    ("largest army has passed", _passed(RECEIVED_LARGEST_ARMY, "largest army")),
+    ("trophy ", _won),
+    ("Giving out starting resources", lambda line: ev.StartingResources(None)),
+)
+
+# Lines that carry no information about the game.
+IGNORED_PREFIXES = ("Bot is", "Karma System", "Disable chat", "Type \"/help\"", "Thank you for playing")
+IGNORED_SUFFIXES = ("has left the game chat",)
+
+
+class LogStream:
+    """
+    Incremental parser for a colonist action log.
+    Text can be fed as it grows during a game; each complete line is classified by its first word and parsed on its
+    own, so appending a line costs O(line). Turns are counted from the dice rolls, the opening being turn 0.
+    """
+    def __init__(self):
+        self.turn = 0
+        self.line_number = 0
+        self.unparsed = []
+        self._partial = ""
+        self._proposals = {}
+        self._robbery = None
+
+    def feed(self, text):
+        """
+        Feeds text to the parser, a trailing incomplete line is kept until the rest of it is fed.
+        :param text: A chunk of the log.
+        :return: A list of the Events completed by the chunk.
+        """
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        return [e for e in (self.parse_line(line) for line in lines) if e is not None]
+
+    def close(self):
+        """
+        Parses any remaining incomplete line.
+        :return: A list of the remaining Events.
+        """
+        line, self._partial = self._partial, ""
+        event = self.parse_line(line)
+        return [] if event is None else [event]
+
+    def parse_line(self, line):
+        """
+        Parses a single line of the log.
+        :param line: The line.
+        :return: An Event, or None for blank, ignored or unrecognised lines.
+        """
+        self.line_number += 1
+        line = line.strip()
+        if not line or line.startswith(IGNORED_PREFIXES) or line.endswith(IGNORED_SUFFIXES):
+            return None
+
+        player, _, rest = line.partition(" ")
+        keyword = _KEYWORD.match(rest)
+        handler = keyword and PLAYER_DISPATCH.get(keyword.group())
+        event = handler(player, rest) if handler else None
+        if not event:
+            event = next((f(line) for prefix, f in LINE_DISPATCH if line.startswith(prefix)), None)
+        if not event:
+            self.unparsed.append((self.line_number, line))
+            return None
+
+        if isinstance(event, ev.DiceRolled):
+            self.turn += 1
+        elif isinstance(event, ev.TradeProposed):
+            self._proposals[event.player] = event
+        elif isinstance(event, ev.Traded) and event.player in self._proposals:
+            proposal = self._proposals[event.player]
+            event.give, event.want = proposal.give, proposal.want
+        elif isinstance(event, ev.Robbed):
+            self._robbery = event
+        elif isinstance(event, ev.RobberyRevealed) and self._robbery is not None:
+            event.player = event.player or self._robbery.player
+            event.victim = event.victim or self._robbery.victim
+        event.turn = self.turn
+        return event
+
+
+def parse_log(text):
+    """
+    Parses a whole action log.
+    :param text: The log text.
+    :return: A list of Events.
+    """
+    stream = LogStream()
+    return stream.feed(text) + stream.close()
+
+
+def parse_log_file(path):
+    """
+    Parses an action log file.
+    :param path: The path of the log.
+    :return: A list of Events.
+    """
+    with open(path) as f:
+        return parse_log(f.read())
@@ -0,0 +1,108 @@
+import glob
+import time
+import cv2
+import numpy as np
+import colonist_ql.facts as facts
+import colonist_ql.model.cube_coord as cc
+import colonist_ql.controller.template_matching as tm
+from colonist_ql.controller.feature_extration import RESOURCE_COLOUR_RANGES, find_contours, filter_contours_by_area, \
+    contour_centre
+
+# Name: (matcher, prefilter) of the configurations compared.
+CONFIGS = {
+    "ssim": ("ssim", None),
+    "ssim+prefilter": ("ssim", 3),
+    "ssim_downsampled": ("ssim_downsampled", None),
+    "ssim_downsampled+prefilter": ("ssim_downsampled", 3),
+    "ncc": ("ncc", None),
+    "ncc+prefilter": ("ncc", 3),
+}
+
+
+def triple_pixels(image):
+    """
+    Locates every triple of the board in a game image from the land hexes, without reading the hex values.
+    :param image: The game image.
+    :return: A dictionary of triple to pixel position.
+    """
+    points = np.asarray([
+        contour_centre(c)
+        for upper, lower in RESOURCE_COLOUR_RANGES.values()
+        for c in filter_contours_by_area(find_contours(cv2.inRange(image, lower, upper)))
+    ])
+    centred = points - points.mean(axis=0)
+    coords = cc.pixel_to_cube_batch(centred, np.linalg.norm(centred, axis=1).max() / 3)
+
+    # Least squares affine map from cube coords to pixels, so triples on the coast can be placed.
+    design = np.hstack([coords[:, :2], np.ones((len(coords), 1))])
+    affine, *_ = np.linalg.lstsq(design, points, rcond=None)
+
+    topology = cc.board_topology()
+    hexes = np.asarray(topology.hexes, dtype=np.float64)[topology.vertex_hexes]
+    pixels = (np.concatenate([hexes[..., :2], np.ones((*hexes.shape[:2], 1))], axis=-1) @ affine).mean(axis=1)
+    return dict(zip(topology.vertices, pixels))
+
+
+def settlement_crops(image, pixels):
+    """
+    Crops the image around triples as extract_settlements does, dropping crops cut by the image edge.
+    :param image: The game image.
+    :param pixels: A dictionary of triple to pixel position.
+    :return: A list of crops.
+    """
+    crops = []
+    for x, y in pixels.values():
+        x, y = int(x), int(y)
+        crop = image[max(y - 40, 0):y + 30, max(x - 30, 0):x + 30, ...]
+        if crop.shape[:2] == (70, 60):
+            crops.append(crop)
+    return crops
+
+
+def benchmark_matchers(frame_paths, configs=CONFIGS, directory=facts.SETTLEMENT_IMAGES_DIR, threshold=0.10):
+    """
+    Compares the latency and accuracy of the matchers on settlement detection over game images.
+    Accuracy is the agreement with full SSIM, the current matcher, on the crops it detects a settlement in. Agreement
+    is over every crop with the threshold applied to each matcher's scores, as a drop in replacement would be used.
+    :param frame_paths: An iterable of paths of game images.
+    :param configs: A dictionary of name to (matcher, prefilter).
+    :param directory: The directory of the templates.
+    :param threshold: The SSIM threshold for a settlement to be detected.
+    :return: A dictionary of name to (milliseconds per frame, accuracy, agreement).
+    """
+    bank = tm.template_bank(directory)
+    frames = [settlement_crops(image, triple_pixels(image)) for image in map(cv2.imread, frame_paths)]
+    reference = [[tm.match(c, bank, "ssim", threshold) for c in crops] for crops in frames]
+
+    results = {}
+    for name, (matcher, prefilter) in configs.items():
+        agreed, detected, matching, elapsed = 0, 0, 0, 0.0
+        for crops, labels in zip(frames, reference):
+            start = time.perf_counter()
+            scored = [_scores(c, bank, matcher, prefilter) for c in crops]
+            elapsed += time.perf_counter() - start
+            for label, (scores, names) in zip(labels, scored):
+                matching += label == tm.best_match(scores, names, threshold)
+                if label is not None:
+                    detected += 1
+                    agreed += label == tm.best_match(scores, names)
+        n_crops = sum(map(len, frames))
+        results[name] = (1e3 * elapsed / max(len(frames), 1), agreed / detected if detected else float("nan"),
+                         matching / n_crops if n_crops else float("nan"))
+    return results
+
+
+def _scores(image, bank, matcher, prefilter):
+    """
+    Scores a crop as template_matching.match does, without picking the match.
+    :return: The scores and the names of the scored templates.
+    """
+    indices = None if prefilter is None else tm.histogram_prefilter(image, bank, prefilter)
+    names = bank.names if indices is None else [bank.names[i] for i in indices]
+    return tm.MATCHERS[matcher](image, bank, indices), names
+
+
+if __name__ == "__main__":
+    paths = sorted(glob.glob("logs/game_images/*/*.png"))
+    for name, (ms, accuracy, agreement) in benchmark_matchers(paths).items():
+        print(f"{name:<28} {ms:8.1f} ms/frame  accuracy {accuracy:.3f}  agreement {agreement:.3f}")
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import re
+import shelve
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pytesseract
+import colonist_ql.patterns as patterns
+import colonist_ql.facts as facts
+
+# White rows between crops batched into one image.
+BATCH_GAP = 20
+
+# The grey level below which a pixel is ink, as hex_value and extract_port threshold their crops.
+INK_THRESHOLD = 200
+
+
+class OCRExecutor(metaclass=patterns.DefaultInstance):
+    """
+    Bounded pool running tesseract on crops concurrently.
+    Each tesseract call is a subprocess, so threads are enough to run them in parallel. OCRExecutor() is the shared
+    default pool, OCRExecutor.new() creates another.
+    """
+    def __init__(self, max_workers=4):
+        """
+        Init for OCRExecutor.
+        :param max_workers: The maximum number of concurrent tesseract processes.
+        """
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+
+    def image_to_strings(self, images, tesseract_config, batch_size=1):
+        """
+        Reads the text of images.
+        :param images: A list of images.
+        :param tesseract_config: The config string for tesseract.
+        :param batch_size: The number of images read per tesseract call, see image_batch_to_strings.
+        :return: A list of the text of each image.
+        """
+        if batch_size <= 1:
+            return list(self.pool.map(lambda i: pytesseract.image_to_string(i, config=tesseract_config), images))
+        batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+        return [t for texts in self.pool.map(lambda b: image_batch_to_strings(b, tesseract_config), batches)
+                for t in texts]
+
+    def consensus(self, images, tesseract_config, synonyms={}, ignores=[], with_confidence=False):
+        """
+        Reads the text of images concurrently and returns the most common guess.
+        Images are only submitted while their results could still be needed: no more are read than it would take to
+        decide the consensus if every outstanding read agreed with the current leader, and reading stops once no
+        remaining image can change the most common guess. Ties are broken by the first image a guess is read from, as
+        when the images are read in order.
+        :param images: The list of images.
+        :param tesseract_config: The config string for tesseract.
+        :param synonyms: A dictionary for converting a guess to another result.
+        :param ignores: A list of results to ignore.
+        :param with_confidence: If the share of the read guesses agreeing with the result is also returned.
+        :return: The guess for the images, and its confidence if with_confidence.
+        """
+        counts, first = {}, {}
+        pending, submitted = {}, 0
+        while True:
+            leader, runner_up = (sorted(counts.values(), reverse=True) + [0, 0])[:2]
+            outstanding = len(pending) + len(images) - submitted
+            if leader > runner_up + outstanding or outstanding == 0:
+                break
+            needed = (runner_up + outstanding - leader) // 2 + 1
+            while submitted < len(images) and len(pending) < min(needed, self.max_workers):
+                future = self.pool.submit(pytesseract.image_to_string, images[submitted], config=tesseract_config)
+                pending[future] = submitted
+                submitted += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                text = future.result()
+                text = synonyms.get(text, text)
+                if text not in ignores:
+                    counts[text] = counts.get(text, 0) + 1
+                    first[text] = min(first.get(text, i), i)
+        guess = max(counts, key=lambda g: (counts[g], -first[g]))
+        return (guess, counts[guess] / sum(counts.values())) if with_confidence else guess
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def image_batch_to_strings(images, tesseract_config):
+    """
+    Reads the text of several images with one tesseract call.
+    The images are stacked vertically with white gaps and read as a block of text, then each word is assigned to the
+    image its box lies in. The page segmentation mode is set to a single block, and the text of an image is its words
+    joined by spaces.
+    :param images: A list of images with the same number of channels.
+    :param tesseract_config: The config string for tesseract.
+    :return: A list of the text of each image.
+    """
+    width = max(i.shape[1] for i in images)
+    rows, bands, top = [], [], 0
+    for image in images:
+        pad = [(0, BATCH_GAP), (0, width - image.shape[1])] + [(0, 0)] * (image.ndim - 2)
+        rows.append(np.pad(image, pad, constant_values=255))
+        bands.append(top + image.shape[0])
+        top += image.shape[0] + BATCH_GAP
+    config = re.sub(r"--psm \d+", "", tesseract_config) + " --psm 6"
+    data = pytesseract.image_to_data(np.concatenate(rows), config=config, output_type=pytesseract.Output.DICT)
+
+    words = [[] for _ in images]
+    for text, y, h in zip(data["text"], data["top"], data["height"]):
+        if text.strip():
+            words[min(int(np.searchsorted(bands, y + h / 2)), len(images) - 1)].append(text.strip())
+    return [" ".join(w) for w in words]
+
+
+def perceptual_hash(image, size=16):
+    """
+    Hashes the thresholded ink of a crop, so crops of the same token hash the same despite small differences.
+    The ink mask is averaged down to size x size blocks and each block is a bit set when it is mostly ink, so stray
+    pixels do not change the hash.
+    :param image: A BGR or grey uint8 image.
+    :param size: The number of blocks across.
+    :return: A hex string of the hash.
+    """
+    grey = image.mean(axis=2) if image.ndim == 3 else image
+    ink = (grey < INK_THRESHOLD).astype(np.float64)
+    h, w = ink.shape
+    rows, cols = np.arange(h) * size // h, np.arange(w) * size // w
+    blocks = np.zeros((size, size))
+    counts = np.zeros((size, size))
+    np.add.at(blocks, (rows[:, np.newaxis], cols[np.newaxis, :]), ink)
+    np.add.at(counts, (rows[:, np.newaxis], cols[np.newaxis, :]), 1)
+    blocks = np.divide(blocks, counts, out=np.zeros_like(blocks), where=counts > 0)
+    return np.packbits(blocks >= 0.5).tobytes().hex()
+
+
+class OCRCache(metaclass=patterns.DefaultInstance):
+    """
+    Cache of OCR results keyed by the perceptual hash of the crop read.
+    An in-memory LRU sits in front of an optional shelve file, so results persist across runs. Only results whose
+    consensus confidence reaches min_confidence are served, so uncertain crops are always read again.
+    OCRCache() is the shared default cache persisted at facts.OCR_CACHE_PATH, OCRCache.new() creates another kept
+    only in memory unless given a path.
+    """
+    def __init__(self, path=None, max_size=1024, min_confidence=0.6):
+        """
+        Init for OCRCache.
+        :param path: The path of the shelve file persisting the cache, None to only keep it in memory.
+        :param max_size: The number of results kept in memory.
+        :param min_confidence: The confidence a result needs to be served from the cache.
+        """
+        self.max_size = max_size
+        self.min_confidence = min_confidence
+        self.memory = OrderedDict()
+        self.store = None
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.store = shelve.open(path)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def default_kwargs(cls):
+        # Only the shared default persists by default, two shelves opened on one file overwrite each other's index.
+        return {"path": facts.OCR_CACHE_PATH}
+
+    @staticmethod
+    def key(image, tesseract_config, synonyms={}, ignores=[]):
+        """
+        The key of a crop read with a configuration.
+        :param image: The crop.
+        :param tesseract_config: The config string for tesseract.
+        :param synonyms: The synonyms of the read.
+        :param ignores: The ignored results of the read.
+        :return: A string key.
+        """
+        config = hashlib.sha1(f"{tesseract_config}|{sorted(synonyms.items())}|{sorted(ignores)}".encode())
+        return f"{config.hexdigest()[:12]}:{perceptual_hash(image)}"
+
+    def get(self, key):
+        """
+        Gets a confident result.
+        :param key: The key of the crop.
+        :return: The text, or None if there is no confident result.
+        """
+        entry = self.memory.get(key)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                self._remember(key, entry)
+        elif entry is not None:
+            self.memory.move_to_end(key)
+
+        if entry is None or entry[1] < self.min_confidence:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, text, confidence):
+        """
+        Stores a result.
+        :param key: The key of the crop.
+        :param text: The text read.
+        :param confidence: The confidence of the consensus.
+        """
+        self._remember(key, (text, confidence))
+        if self.store is not None:
+            self.store[key] = (text, confidence)
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
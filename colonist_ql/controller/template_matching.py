@@ -0,0 +1,220 @@
+import functools
+import os
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# The window and constants of the SSIM, matching skimage's compare_ssim defaults for uint8 images.
+SSIM_WINDOW = 7
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# Bits kept per channel for colour histograms.
+HISTOGRAM_BITS = 2
+
+
+class TemplateBank:
+    """
+    The candidate images of a directory, decoded once and kept as stacks resized to the sizes they are compared at.
+    Resized stacks and the statistics the matchers derive from them are kept for the most recently used sizes.
+    """
+    def __init__(self, directory, max_entries=32):
+        """
+        Init for TemplateBank.
+        :param directory: The directory of the candidate images.
+        :param max_entries: The number of resized entries kept.
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.names = tuple(sorted(next(os.walk(directory))[2]))
+        self.images = [_read_bgr(os.path.join(directory, n)) for n in self.names]
+        self.histograms = np.stack([colour_histogram(t) for t in self.images])
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.names)
+
+    def cached(self, key, build):
+        """
+        Gets an entry from the LRU cache, building it when missing.
+        :param key: The key of the entry.
+        :param build: A function building the entry.
+        :return: The entry.
+        """
+        if key in self._cache:
+            self._cache.move_to_end(key)
+        else:
+            self._cache[key] = build()
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return self._cache[key]
+
+    def resized(self, h, w):
+        """
+        Gets the templates resized to a size.
+        :param h: The height.
+        :param w: The width.
+        :return: A (templates, h, w, channels) uint8 stack.
+        """
+        def build():
+            return np.stack([cv2.resize(t, (w, h), interpolation=cv2.INTER_AREA) for t in self.images])
+        return self.cached(("stack", h, w), build)
+
+    def ssim_stats(self, h, w):
+        """
+        Gets the templates resized to a size with their SSIM window statistics.
+        :param h: The height.
+        :param w: The width.
+        :return: A (templates, h, w, channels) float64 stack, its window means and window means of squares.
+        """
+        def build():
+            stack = self.resized(h, w).astype(np.float64)
+            return stack, _window_mean(stack), _window_mean(stack * stack)
+        return self.cached(("ssim", h, w), build)
+
+
+@functools.lru_cache(maxsize=None)
+def template_bank(directory):
+    """
+    Gets the template bank of a directory, loading it on first use.
+    :param directory: The directory of the candidate images.
+    :return: A TemplateBank.
+    """
+    return TemplateBank(directory)
+
+
+def _read_bgr(path):
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR) if image.ndim == 3 and image.shape[2] == 4 else image
+
+
+def _window_mean(images):
+    """
+    Means over every full SSIM window of a stack of images, using an integral image.
+    :param images: A (..., h, w, channels) array.
+    :return: A (..., h - SSIM_WINDOW + 1, w - SSIM_WINDOW + 1, channels) array.
+    """
+    k = SSIM_WINDOW
+    s = np.cumsum(np.cumsum(images, axis=-3), axis=-2)
+    s = np.pad(s, [(0, 0)] * (images.ndim - 3) + [(1, 0), (1, 0), (0, 0)])
+    return (s[..., k:, k:, :] - s[..., :-k, k:, :] - s[..., k:, :-k, :] + s[..., :-k, :-k, :]) / (k * k)
+
+
+def _indices(bank, indices):
+    return np.arange(len(bank)) if indices is None else np.asarray(indices)
+
+
+def ssim_scores(image, bank, indices=None):
+    """
+    Scores an image against the templates of a bank with one stacked SSIM.
+    The score of each template equals skimage's compare_ssim(image, template, multichannel=True).
+    :param image: A uint8 BGR image.
+    :param bank: A TemplateBank.
+    :param indices: Optionally, the indices of the templates to score.
+    :return: An array of the scores of the templates.
+    """
+    indices = _indices(bank, indices)
+    h, w, *_ = image.shape
+    templates, uy, uyy = (a[indices] for a in bank.ssim_stats(h, w))
+    x = image.astype(np.float64)
+    ux, uxx = _window_mean(x), _window_mean(x * x)
+    uxy = _window_mean(templates * x)
+
+    n = SSIM_WINDOW ** 2
+    cov_norm = n / (n - 1)
+    vx, vy, vxy = cov_norm * (uxx - ux * ux), cov_norm * (uyy - uy * uy), cov_norm * (uxy - ux * uy)
+    s = ((2 * ux * uy + SSIM_C1) * (2 * vxy + SSIM_C2)) / ((ux * ux + uy * uy + SSIM_C1) * (vx + vy + SSIM_C2))
+    return s.reshape(len(indices), -1).mean(axis=1)
+
+
+def downsampled_ssim_scores(image, bank, indices=None, factor=2):
+    """
+    Scores an image against the templates of a bank with the SSIM of the image downsampled by a factor.
+    :param image: A uint8 BGR image.
+    :param bank: A TemplateBank.
+    :param indices: Optionally, the indices of the templates to score.
+    :param factor: The downsampling factor, the downsampled image has to be at least SSIM_WINDOW pixels across.
+    :return: An array of the scores of the templates.
+    """
+    h, w, *_ = image.shape
+    small = cv2.resize(image, (max(w // factor, SSIM_WINDOW), max(h // factor, SSIM_WINDOW)),
+                       interpolation=cv2.INTER_AREA)
+    return ssim_scores(small, bank, indices)
+
+
+def ncc_scores(image, bank, indices=None, margin=4):
+    """
+    Scores an image against the templates of a bank with normalised cross-correlation.
+    Templates are resized to the image less a margin on each side, and the best score over those offsets is kept so
+    small misalignments of the crop are tolerated.
+    Each template is a separate cv2.matchTemplate call, so on settlement crops it is no faster than the stacked SSIM
+    and agrees with it less, see matching_benchmark.
+    :param image: A uint8 BGR image.
+    :param bank: A TemplateBank.
+    :param indices: Optionally, the indices of the templates to score.
+    :param margin: The number of pixels the templates can be offset by.
+    :return: An array of the scores of the templates.
+    """
+    h, w, *_ = image.shape
+    templates = bank.resized(h - 2 * margin, w - 2 * margin)
+    return np.array([cv2.matchTemplate(image, templates[i], cv2.TM_CCOEFF_NORMED).max()
+                     for i in _indices(bank, indices)])
+
+
+def colour_histogram(image):
+    """
+    Calculates the normalised colour histogram of an image, with HISTOGRAM_BITS bits per channel.
+    :param image: A uint8 BGR image.
+    :return: An array of the bin frequencies.
+    """
+    q = (image[..., :3] >> (8 - HISTOGRAM_BITS)).reshape(-1, 3).astype(np.int64)
+    bins = (q[:, 0] << (2 * HISTOGRAM_BITS)) | (q[:, 1] << HISTOGRAM_BITS) | q[:, 2]
+    return np.bincount(bins, minlength=1 << (3 * HISTOGRAM_BITS)) / len(bins)
+
+
+def histogram_prefilter(image, bank, keep=3):
+    """
+    Keeps the templates whose colour histograms are closest to the image, by histogram intersection.
+    :param image: A uint8 BGR image.
+    :param bank: A TemplateBank.
+    :param keep: The number of templates kept.
+    :return: An array of the indices of the kept templates.
+    """
+    similarity = np.minimum(bank.histograms, colour_histogram(image)).sum(axis=1)
+    return np.argsort(-similarity)[:keep]
+
+
+MATCHERS = {
+    "ssim": ssim_scores,
+    "ssim_downsampled": downsampled_ssim_scores,
+    "ncc": ncc_scores,
+}
+
+
+def match(image, bank, matcher="ssim", threshold=None, prefilter=None):
+    """
+    Finds the template of a bank best matching an image.
+    :param image: A uint8 BGR image.
+    :param bank: A TemplateBank.
+    :param matcher: The name of a matcher in MATCHERS, or a function scoring (image, bank, indices).
+    :param threshold: If given, the score a match has to reach.
+    :param prefilter: If given, the number of templates kept by colour histogram before scoring.
+    :return: The name of the best template, or None if none reaches the threshold.
+    """
+    score = MATCHERS[matcher] if isinstance(matcher, str) else matcher
+    indices = None if prefilter is None else histogram_prefilter(image, bank, prefilter)
+    scores = score(image, bank, indices)
+    names = bank.names if indices is None else [bank.names[i] for i in indices]
+    return best_match(scores, names, threshold)
+
+
+def best_match(scores, names, threshold=None):
+    """
+    Picks the best scoring template.
+    :param scores: An array of the scores of each template.
+    :param names: The names of the templates.
+    :param threshold: If given, the score a match has to reach.
+    :return: The name of the best template, or None if none reaches the threshold.
+    """
+    i = int(np.argmax(scores))
+    return None if threshold is not None and scores[i] < threshold else names[i]
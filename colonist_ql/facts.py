@@ -151,3 +151,8 @@ PORT_IMAGE_DIR = f"{GAME_IMAGE_DIR}/icons"
 SETTLEMENT_IMAGES_DIR = f"{GAME_IMAGE_DIR}/settlements"
 CITY_IMAGES_DIR = f"{GAME_IMAGE_DIR}/cities"
 ROAD_IMAGES_DIR = f"{GAME_IMAGE_DIR}/road"
+
+# The shelve file persisting OCR results between runs, overridden by the COLONIST_QL_OCR_CACHE environment variable.
+OCR_CACHE_PATH = os.environ.get(
+    "COLONIST_QL_OCR_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "colonist_ql", "ocr_cache")
+)
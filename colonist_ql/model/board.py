@@ -1,36 +1,61 @@
 import colonist_ql.patterns as patterns
+import colonist_ql.model.structures as structures
 
 
-class Board(metaclass=patterns.Singleton):
-    def __init__(self, settlement_limit=5, city_limit=5, road_limit=15):
-        self.player_dict = None
+class GameState:
+    """
+    The state of a single game, owning its hexes, ports, structures, players and turn order.
+    Any number of games can be held at once, Board() is the default game used when no game is given.
+    """
+    def __init__(self, settlement_limit=5, city_limit=5, road_limit=15,
+                 hexes=None, ports=None, settlements=None, roads=None):
+        self.player_dict = {}
         self.turn_order = None
-        self.hex_dict = None
+
+        self.hexes = structures.Hexes.new() if hexes is None else hexes
+        self.ports = structures.Ports.new() if ports is None else ports
+        self.settlements = structures.Settlements.new() if settlements is None else settlements
+        self.roads = structures.Roads.new() if roads is None else roads
 
         self.settlement_limit = settlement_limit
         self.city_limit = city_limit
         self.road_limit = road_limit
 
-    # def __init__(self, players, hexes):
-    #     self.player_dict = {p.name: p for p in players}
-        # self.hex_dict = {h.cube_coords: h for h in hexes}
+    def add_player(self, player):
+        self.player_dict[player.name] = player
 
     def get_player(self, player_name):
         return self.player_dict[player_name]
 
-    # def setup_game(self, players, hexes):
-    #     self.__init__(players, hexes)
+    def get_players(self):
+        return self.player_dict.values()
 
     def set_turn_order(self, turn_oder):
         self.turn_order = turn_oder
 
     def get_hex(self, coord):
-        return self.hex_dict[coord]
+        return self.hexes.get(coord)
 
     def set_hexes(self, hexes):
-        if self.hex_dict is None:
-            self.hex_dict = {h.cube_coords: h for h in hexes}
+        if len(self.hexes.get_all()) == 0:
+            self.hexes.add_all(hexes)
 
 
-# players = {"ZacTodd", "Tami#6966", "Oakes#7878", "bambee"}
-# Board([Player(p, "red", players - {p}) for p in players], None)
+class Board(GameState, metaclass=patterns.Singleton):
+    """
+    The default game, sharing its containers with the default Hexes(), Ports(), Settlements() and Roads().
+    """
+    def __init__(self, settlement_limit=5, city_limit=5, road_limit=15):
+        super().__init__(
+            settlement_limit, city_limit, road_limit,
+            structures.Hexes(), structures.Ports(), structures.Settlements(), structures.Roads()
+        )
+
+
+def default_game(game=None):
+    """
+    Gets the game to use.
+    :param game: A GameState, or None for the default game.
+    :return: The GameState.
+    """
+    return Board() if game is None else game
@@ -1,4 +1,5 @@
 from itertools import combinations
+import functools
 import numpy as np
 
 # The two 120 degree separated flows.
@@ -156,7 +157,7 @@ def triples_from_neighbours(a, b):
     :return: Two cube coords which form triples with a and b.
     """
     assert is_neighbour(a, b), f"Cubes {a} and {b} to be neighbours to have triples."
-    dx, dz, dy = add(b, a)
+    dx, dz, dy = add(b, scale(a, -1))
     if dx == 0:
         triples_diff = (dz, 0, dy), (dy, dz, 0)
     elif dz == 0:
@@ -286,7 +287,7 @@ def cube_round(c):
     :return: A rounded cube coord x, y, z.
     """
     x, z, y = c
-    rx, ry, rz = round(x), round(y), round(x)
+    rx, ry, rz = round(x), round(y), round(z)
     x_diff = abs(rx - x)
     z_diff = abs(rz - z)
     y_diff = abs(ry - y)
@@ -373,13 +374,78 @@ def cube_to_pixel(c, size):
     return axial_to_pixel(cube_to_axial(c), size)
 
 
+def cube_round_batch(cs):
+    """
+    Rounds an array of cube coords.
+    :param cs: An (N, 3) array of cube coords x, z, y.
+    :return: An (N, 3) int array of rounded cube coords x, z, y.
+    """
+    cs = np.asarray(cs, dtype=np.float64).reshape(-1, 3)
+    rounded = np.rint(cs)
+    x_diff, z_diff, y_diff = np.abs(rounded - cs).T
+    rx, rz, ry = rounded.T
+
+    fix_x = (x_diff > y_diff) & (x_diff > z_diff)
+    fix_y = ~fix_x & (y_diff > z_diff)
+    fix_z = ~fix_x & ~fix_y
+    rx = np.where(fix_x, -ry - rz, rx)
+    ry = np.where(fix_y, -rx - rz, ry)
+    rz = np.where(fix_z, -rx - ry, rz)
+    return np.stack((rx, rz, ry), axis=1).astype(np.int64)
+
+
+def axial_to_cube_batch(hs):
+    """
+    Converts an array of axial coords to cube coords.
+    :param hs: An (N, 2) array of axial coords q, r.
+    :return: An (N, 3) array of cube coords x, z, y.
+    """
+    q, r = np.asarray(hs).reshape(-1, 2).T
+    return np.stack((q, -q - r, r), axis=1)
+
+
+def pixel_to_axial_batch(ps, size):
+    """
+    Converts an array of pixel positions to axial coords.
+    :param ps: An (N, 2) array of points x, y.
+    :param size: The size of each hex.
+    :return: An (N, 2) int array of axial coords q, r.
+    """
+    x, y = np.asarray(ps, dtype=np.float64).reshape(-1, 2).T
+    q = (x * np.sqrt(3) / 3 - y / 3) / size
+    r = (2 * y / 3) / size
+    return cube_round_batch(axial_to_cube_batch(np.stack((q, r), axis=1)))[:, :2]
+
+
+def pixel_to_cube_batch(ps, size):
+    """
+    Converts an array of pixel positions to cube coords.
+    :param ps: An (N, 2) array of points x, y.
+    :param size: The size of each hex.
+    :return: An (N, 3) int array of cube coords x, z, y.
+    """
+    return axial_to_cube_batch(pixel_to_axial_batch(ps, size))
+
+
+def cube_to_pixel_batch(cs, size):
+    """
+    Converts an array of cube coords to pixel positions.
+    :param cs: An (N, 3) array of cube coords x, z, y.
+    :param size: The size of each hex.
+    :return: An (N, 2) array of points x, y.
+    """
+    q, r, _ = np.asarray(cs, dtype=np.float64).reshape(-1, 3).T
+    return np.stack((np.sqrt(3) * (size * q + r / 2), 3 * size * r / 2), axis=1)
+
+
 def all_edges(coords):
     """
     Finds all the triples from the given cube coords.
     :param coords: A set of cube coords.
     :return: A set of triples.
     """
-    return {frozenset({a, b}) for a in coords for b in coords - {a} if is_neighbour(a, b)}
+    coords = set(coords)
+    return {frozenset({a, n}) for a in coords for n in neighbours(a) if n in coords}
 
 
 def edges_from_centre(k, exclude_outer_ring=True):
@@ -389,10 +455,13 @@ def edges_from_centre(k, exclude_outer_ring=True):
     :param exclude_outer_ring: If to exclude the edge between the hexes on the outer ring from the centre.
     :return: A set of all the edges from the centre.
     """
-    edges = all_edges(neighbours_from_centre(k))
     if exclude_outer_ring:
-        edges -= edges_on_ring(ring_from_centre(k))
-    return edges
+        return set(board_topology(k).edges)
+    return all_edges(neighbours_from_centre(k))
+
+
+def _edges_from_centre(k):
+    return all_edges(neighbours_from_centre(k)) - edges_on_ring(ring_from_centre(k))
 
 
 def all_triples(coords):
@@ -401,7 +470,8 @@ def all_triples(coords):
     :param coords: A set of cube coords.
     :return: A set of triples.
     """
-    return {frozenset({a, b, c}) for a in coords for b in coords - {a} for c in coords - {a, b} if is_triple(a, b, c)}
+    coords = set(coords)
+    return {t for a in coords for t in triples(a) if t <= coords}
 
 
 def triples_from_centre(k):
@@ -410,4 +480,103 @@ def triples_from_centre(k):
     :param k: The distance from the center.
     :return: A set of all the triples from the centre.
     """
+    return set(board_topology(k).vertices)
+
+
+def _triples_from_centre(k):
     return all_triples(neighbours_from_centre(k))
+
+
+class BoardTopology:
+    """
+    Dense integer ids and adjacency arrays for the hexes, vertices (triples) and edges of a board.
+    Ids are assigned in a stable sorted order so arrays built from the same radius always line up.
+    Adjacency arrays with a variable number of neighbours are padded with -1.
+    """
+    def __init__(self, k=3):
+        """
+        Init for BoardTopology.
+        :param k: The radius of the board including the sea ring.
+        """
+        self.k = k
+        self.hexes = tuple(sorted(neighbours_from_centre(k)))
+        self.vertices = tuple(sorted(_triples_from_centre(k), key=sorted))
+        self.edges = tuple(sorted(_edges_from_centre(k), key=sorted))
+
+        self.hex_index = {h: i for i, h in enumerate(self.hexes)}
+        self.vertex_index = {t: i for i, t in enumerate(self.vertices)}
+        self.edge_index = {e: i for i, e in enumerate(self.edges)}
+
+        self.n_hexes, self.n_vertices, self.n_edges = len(self.hexes), len(self.vertices), len(self.edges)
+
+        self.vertex_hexes = np.array(
+            [[self.hex_index[c] for c in sorted(t)] for t in self.vertices], dtype=np.int64
+        ).reshape(-1, 3)
+        self.vertex_vertices = self._padded(
+            [self.vertex_index[n] for n in triple_neighbours(t) if n in self.vertex_index] for t in self.vertices
+        )
+        self.vertex_edges = self._padded(
+            [self.edge_index[frozenset(e)] for e in combinations(t, r=2) if frozenset(e) in self.edge_index]
+            for t in self.vertices
+        )
+        self.edge_vertices = np.array(
+            [[self.vertex_index[t] for t in edge_triples(e)] for e in self.edges], dtype=np.int64
+        ).reshape(-1, 2)
+        self.edge_edges = self._padded(
+            [self.edge_index[n] for n in edge_neighbours(e) if n in self.edge_index] for e in self.edges
+        )
+        self.hex_vertices = self._padded(
+            [self.vertex_index[t] for t in triples(h) if t in self.vertex_index] for h in self.hexes
+        )
+        self.land_hexes = np.array([distance_from_centre(h) < k for h in self.hexes])
+
+    @staticmethod
+    def _padded(rows):
+        """
+        Converts ragged rows of ids into an array padded with -1.
+        :param rows: An iterable of lists of ids.
+        :return: A 2d int array.
+        """
+        rows = [sorted(r) for r in rows]
+        width = max((len(r) for r in rows), default=0)
+        padded = np.full((len(rows), width), -1, dtype=np.int64)
+        for i, r in enumerate(rows):
+            padded[i, :len(r)] = r
+        return padded
+
+    def hex_id(self, c):
+        return self.hex_index[c]
+
+    def vertex_id(self, t):
+        return self.vertex_index[t]
+
+    def edge_id(self, edge):
+        return self.edge_index[frozenset(edge)]
+
+    def vertex_neighbours(self, v):
+        """
+        Gets the ids of the vertices neighbouring a vertex.
+        :param v: A vertex id.
+        :return: An array of vertex ids.
+        """
+        n = self.vertex_vertices[v]
+        return n[n >= 0]
+
+    def edge_neighbour_ids(self, e):
+        """
+        Gets the ids of the edges neighbouring an edge.
+        :param e: An edge id.
+        :return: An array of edge ids.
+        """
+        n = self.edge_edges[e]
+        return n[n >= 0]
+
+
+@functools.lru_cache(maxsize=None)
+def board_topology(k=3):
+    """
+    Gets the topology of a board, built once per radius.
+    :param k: The radius of the board including the sea ring.
+    :return: A BoardTopology.
+    """
+    return BoardTopology(k)
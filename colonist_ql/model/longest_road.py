@@ -0,0 +1,156 @@
+import functools
+import colonist_ql.model.cube_coord as cc
+
+
+class LongestRoad:
+    """
+    Longest road engine for a single player's roads.
+    Roads are held as a bitmask over the edge ids of a BoardTopology, and the road network is split into components
+    that are connected through vertices not occupied by an opponent. Only the component touched by a change is
+    recalculated.
+    """
+    def __init__(self, edges=(), blocked_triples=(), topology=None):
+        """
+        Init for LongestRoad.
+        :param edges: The edges of the roads owned by the player.
+        :param blocked_triples: The triples occupied by opponent settlements or cities.
+        :param topology: The BoardTopology of the board, defaults to the standard board.
+        """
+        self.topology = cc.board_topology() if topology is None else topology
+        self._links, self._edge_vertices, self._vertex_edges = _incidence(self.topology)
+
+        self.owned = 0
+        self.blocked = 0
+        for t in blocked_triples:
+            self.blocked |= 1 << self.topology.vertex_id(t)
+        for e in edges:
+            self.owned |= 1 << self.topology.edge_id(e)
+        self._components = {c: self._longest_in(c) for c in self._split(self.owned)}
+
+    @property
+    def length(self):
+        """
+        The length of the longest road.
+        """
+        return max(self._components.values(), default=0)
+
+    def add_road(self, edge):
+        """
+        Adds a road and updates the longest road.
+        :param edge: The edge of the road.
+        :return: The length of the longest road.
+        """
+        e = self.topology.edge_id(edge)
+        if not self.owned >> e & 1:
+            self.owned |= 1 << e
+            component = self._component(e)
+            self._components = {c: n for c, n in self._components.items() if not c & component}
+            self._components[component] = self._longest_in(component)
+        return self.length
+
+    def block(self, t):
+        """
+        Marks a triple as occupied by an opponent, breaking any road through it.
+        :param t: The triple of the opponents settlement.
+        :return: The length of the longest road.
+        """
+        v = self.topology.vertex_id(t)
+        if not self.blocked >> v & 1:
+            self.blocked |= 1 << v
+            for c in [c for c in self._components if c & self._vertex_edges[v]]:
+                del self._components[c]
+                for sub in self._split(c):
+                    self._components[sub] = self._longest_in(sub)
+        return self.length
+
+    def _is_blocked(self, v):
+        return self.blocked >> v & 1
+
+    def _component(self, e):
+        """
+        Gets the owned edges connected to an edge.
+        :param e: An edge id.
+        :return: A bitmask of edge ids.
+        """
+        component = 1 << e
+        stack = [e]
+        while stack:
+            for v in self._edge_vertices[stack.pop()]:
+                if self._is_blocked(v):
+                    continue
+                for bit, f, _ in self._links[v]:
+                    if self.owned & bit and not component & bit:
+                        component |= bit
+                        stack.append(f)
+        return component
+
+    def _split(self, edges):
+        """
+        Splits a bitmask of owned edges into its connected components.
+        :param edges: A bitmask of edge ids.
+        :yield: A bitmask of edge ids for each component.
+        """
+        while edges:
+            component = self._component((edges & -edges).bit_length() - 1)
+            edges &= ~component
+            yield component
+
+    def _longest_in(self, component):
+        """
+        Calculates the longest trail within a component.
+        The endpoints of a longest trail are either blocked or have an odd number of road in the component, so only
+        those vertices are tried as starting points when there are any.
+        :param component: A bitmask of edge ids.
+        :return: An int of the longest trail length.
+        """
+        vertices = {v for e in _bits(component) for v in self._edge_vertices[e]}
+        starts = [
+            v for v in vertices
+            if self._is_blocked(v) or bin(self._vertex_edges[v] & component).count("1") % 2
+        ]
+        memo = {}
+        return max(self._trail(v, component, 0, memo) for v in starts or vertices)
+
+    def _trail(self, v, component, used, memo):
+        """
+        Calculates the longest extension of a trail from a vertex.
+        :param v: The vertex id the trail is at.
+        :param component: A bitmask of the edges that can be used.
+        :param used: A bitmask of the edges already in the trail.
+        :param memo: A dictionary of previously calculated extensions.
+        :return: An int of the longest extension.
+        """
+        key = v, used
+        if key not in memo:
+            best = 0
+            for bit, _, w in self._links[v]:
+                if component & bit and not used & bit:
+                    extension = 1 if self._is_blocked(w) else 1 + self._trail(w, component, used | bit, memo)
+                    best = max(best, extension)
+            memo[key] = best
+        return memo[key]
+
+
+@functools.lru_cache(maxsize=None)
+def _incidence(topology):
+    """
+    Builds the incidence lists of a topology in plain python ints for the search.
+    :param topology: A BoardTopology.
+    :return: Per vertex (edge bit, edge id, other vertex id) links, per edge vertex ids and per vertex edge bitmasks.
+    """
+    edge_vertices = [tuple(int(v) for v in vs) for vs in topology.edge_vertices]
+    links = [[] for _ in range(topology.n_vertices)]
+    vertex_edges = [0] * topology.n_vertices
+    for e, (a, b) in enumerate(edge_vertices):
+        links[a].append((1 << e, e, b))
+        links[b].append((1 << e, e, a))
+        vertex_edges[a] |= 1 << e
+        vertex_edges[b] |= 1 << e
+    return links, edge_vertices, vertex_edges
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
@@ -0,0 +1,298 @@
+import functools
+import colonist_ql.model.cube_coord as cc
+
+# The bits of a mask looked up at once when spreading it through a table.
+CHUNK = 8
+CHUNK_MASK = (1 << CHUNK) - 1
+
+
+class BoardMasks:
+    """
+    Bitmask tables of a board, over the vertex and edge ids of its BoardTopology.
+    Spreading a mask through a table, e.g. from roads to the vertices they touch, is a lookup per byte of the mask
+    rather than per set bit.
+    """
+    def __init__(self, topology):
+        """
+        Init for BoardMasks.
+        :param topology: The BoardTopology of the board.
+        """
+        self.topology = topology
+        self.all_vertices = (1 << topology.n_vertices) - 1
+        self.all_edges = (1 << topology.n_edges) - 1
+        self.edge_vertices = [(1 << int(a)) | (1 << int(b)) for a, b in topology.edge_vertices]
+        self.vertex_edges = [sum(1 << int(e) for e in es if e >= 0) for es in topology.vertex_edges]
+        self.vertex_vertices = [sum(1 << int(n) for n in topology.vertex_neighbours(v))
+                                for v in range(topology.n_vertices)]
+        # The vertices a settlement rules out by the distance rule, its own and its neighbours.
+        self.vertex_closed = [(1 << v) | n for v, n in enumerate(self.vertex_vertices)]
+
+        self._edge_vertices = _chunked(self.edge_vertices)
+        self._vertex_edges = _chunked(self.vertex_edges)
+        self._vertex_closed = _chunked(self.vertex_closed)
+
+    def ends(self, edges):
+        """
+        The vertices at either end of edges.
+        :param edges: A bitmask of edge ids.
+        :return: A bitmask of vertex ids.
+        """
+        return _spread(edges, self._edge_vertices)
+
+    def incident_edges(self, vertices):
+        """
+        The edges touching vertices.
+        :param vertices: A bitmask of vertex ids.
+        :return: A bitmask of edge ids.
+        """
+        return _spread(vertices, self._vertex_edges)
+
+    def closed(self, vertices):
+        """
+        The vertices ruled out for settling by the distance rule around settled vertices.
+        :param vertices: A bitmask of settled vertex ids.
+        :return: A bitmask of vertex ids.
+        """
+        return _spread(vertices, self._vertex_closed)
+
+    def vertex_mask(self, triples):
+        """
+        Converts triples to a bitmask, ignoring triples off the board.
+        :param triples: An iterable of triples.
+        :return: A bitmask of vertex ids.
+        """
+        index = self.topology.vertex_index
+        return sum(1 << index[t] for t in set(triples) if t in index)
+
+    def edge_mask(self, edges):
+        """
+        Converts edges to a bitmask, ignoring edges off the board.
+        :param edges: An iterable of edges.
+        :return: A bitmask of edge ids.
+        """
+        index = self.topology.edge_index
+        return sum(1 << index[e] for e in {frozenset(e) for e in edges} if e in index)
+
+    def triples(self, vertices):
+        """
+        Converts a bitmask of vertex ids to triples.
+        :param vertices: A bitmask of vertex ids.
+        :return: A set of triples.
+        """
+        return {self.topology.vertices[v] for v in bits(vertices)}
+
+    def edges(self, edges):
+        """
+        Converts a bitmask of edge ids to edges.
+        :param edges: A bitmask of edge ids.
+        :return: A set of edges.
+        """
+        return {self.topology.edges[e] for e in bits(edges)}
+
+
+@functools.lru_cache(maxsize=None)
+def board_masks(k=3):
+    """
+    Gets the bitmask tables of a board, built once per radius.
+    :param k: The radius of the board including the sea ring.
+    :return: A BoardMasks.
+    """
+    return BoardMasks(cc.board_topology(k))
+
+
+def setup_settlement_moves(settled, masks):
+    """
+    The vertices a settlement can be placed on in the placement phase.
+    :param settled: A bitmask of the vertices with a settlement or city.
+    :param masks: The BoardMasks.
+    :return: A bitmask of vertex ids.
+    """
+    return masks.all_vertices & ~masks.closed(settled)
+
+
+def setup_road_moves(v, roads, masks):
+    """
+    The edges the road of the placement phase can be placed on, next to the settlement just placed.
+    :param v: The vertex id of the settlement.
+    :param roads: A bitmask of the edges with a road.
+    :param masks: The BoardMasks.
+    :return: A bitmask of edge ids.
+    """
+    return masks.vertex_edges[v] & ~roads
+
+
+def settlement_moves(own_roads, settled, masks):
+    """
+    The vertices a player can build a settlement on, at the end of their roads and clear by the distance rule.
+    :param own_roads: A bitmask of the player's roads.
+    :param settled: A bitmask of the vertices with a settlement or city.
+    :param masks: The BoardMasks.
+    :return: A bitmask of vertex ids.
+    """
+    return masks.ends(own_roads) & ~masks.closed(settled)
+
+
+def road_moves(own_roads, own_settled, settled, roads, masks):
+    """
+    The edges a player can build a road on, next to their buildings or to their roads where not cut by an opponent.
+    :param own_roads: A bitmask of the player's roads.
+    :param own_settled: A bitmask of the vertices with the player's settlements or cities.
+    :param settled: A bitmask of the vertices with a settlement or city.
+    :param roads: A bitmask of the edges with a road.
+    :param masks: The BoardMasks.
+    :return: A bitmask of edge ids.
+    """
+    ends = (masks.ends(own_roads) & ~(settled & ~own_settled)) | own_settled
+    return masks.incident_edges(ends) & ~roads
+
+
+class MoveGenerator:
+    """
+    The placements of a game held as bitmasks, updated as pieces are placed, from which the legal settlement, city
+    and road placements of each player are a few bitwise operations.
+    """
+    def __init__(self, n_players, masks=None):
+        """
+        Init for MoveGenerator.
+        :param n_players: The number of players, indexed from 0.
+        :param masks: The BoardMasks of the board, defaults to the standard board.
+        """
+        self.masks = board_masks() if masks is None else masks
+        self.settled = 0
+        self.closed = 0
+        self.roads = 0
+        self.player_settled = [0] * n_players
+        self.player_settlements = [0] * n_players
+        self.player_roads = [0] * n_players
+        self.player_ends = [0] * n_players
+
+    def copy(self):
+        """
+        Copies the generator so either can be updated independently.
+        :return: A MoveGenerator.
+        """
+        other = MoveGenerator(0, self.masks)
+        other.settled, other.closed, other.roads = self.settled, self.closed, self.roads
+        other.player_settled = list(self.player_settled)
+        other.player_settlements = list(self.player_settlements)
+        other.player_roads = list(self.player_roads)
+        other.player_ends = list(self.player_ends)
+        return other
+
+    def place_settlement(self, p, v):
+        """
+        Places a settlement.
+        :param p: The player.
+        :param v: The vertex id.
+        """
+        bit = 1 << v
+        self.settled |= bit
+        self.closed |= self.masks.vertex_closed[v]
+        self.player_settled[p] |= bit
+        self.player_settlements[p] |= bit
+
+    def place_city(self, p, v):
+        """
+        Upgrades a settlement to a city.
+        :param p: The player.
+        :param v: The vertex id.
+        """
+        self.player_settlements[p] &= ~(1 << v)
+
+    def place_road(self, p, e):
+        """
+        Places a road.
+        :param p: The player.
+        :param e: The edge id.
+        """
+        bit = 1 << e
+        self.roads |= bit
+        self.player_roads[p] |= bit
+        self.player_ends[p] |= self.masks.edge_vertices[e]
+
+    def setup_settlement_moves(self):
+        """
+        The vertices a settlement can be placed on in the placement phase.
+        :return: A bitmask of vertex ids.
+        """
+        return self.masks.all_vertices & ~self.closed
+
+    def setup_road_moves(self, v):
+        """
+        The edges the road of the placement phase can be placed on.
+        :param v: The vertex id of the settlement just placed.
+        :return: A bitmask of edge ids.
+        """
+        return self.masks.vertex_edges[v] & ~self.roads
+
+    def settlement_moves(self, p):
+        """
+        The vertices a player can build a settlement on.
+        :param p: The player.
+        :return: A bitmask of vertex ids.
+        """
+        return self.player_ends[p] & ~self.closed
+
+    def city_moves(self, p):
+        """
+        The settlements a player can upgrade to a city.
+        :param p: The player.
+        :return: A bitmask of vertex ids.
+        """
+        return self.player_settlements[p]
+
+    def road_moves(self, p):
+        """
+        The edges a player can build a road on.
+        :param p: The player.
+        :return: A bitmask of edge ids.
+        """
+        own = self.player_settled[p]
+        ends = (self.player_ends[p] & ~(self.settled & ~own)) | own
+        return self.masks.incident_edges(ends) & ~self.roads
+
+
+def bits(mask):
+    """
+    Iterates over the set bits of a mask.
+    :param mask: A bitmask.
+    :yield: The index of each set bit, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _chunked(table):
+    """
+    Builds the lookup of the union of a table's masks for every byte of ids.
+    :param table: A list of bitmasks, one per id.
+    :return: A list per byte of the ids of a list of 256 unions.
+    """
+    chunks = []
+    for start in range(0, len(table), CHUNK):
+        rows = table[start:start + CHUNK]
+        unions = [0] * (1 << CHUNK)
+        for byte in range(1, 1 << CHUNK):
+            low = byte & -byte
+            i = low.bit_length() - 1
+            unions[byte] = unions[byte ^ low] | (rows[i] if i < len(rows) else 0)
+        chunks.append(unions)
+    return chunks
+
+
+def _spread(mask, chunks):
+    """
+    Unions the table masks of the ids set in a mask.
+    :param mask: A bitmask of ids.
+    :param chunks: The lookup built by _chunked.
+    :return: The union bitmask.
+    """
+    union = 0
+    for unions in chunks:
+        if not mask:
+            break
+        union |= unions[mask & CHUNK_MASK]
+        mask >>= CHUNK
+    return union
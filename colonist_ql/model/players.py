@@ -1,13 +1,16 @@
 import colonist_ql.facts as facts
 import colonist_ql.model.structures as structures
-from colonist_ql.model.board import Board
+import colonist_ql.model.move_generation as move_generation
+import colonist_ql.model.board as board
+from colonist_ql.model.longest_road import LongestRoad
 from collections import Counter
 
 
 class Player:
     def __init__(self, name, colour, opponents, settlements=None, roads=None, dev_cards=None, hand=None, knights=0,
-                 has_longest_road=False, has_largest_army=False):
+                 has_longest_road=False, has_largest_army=False, game=None):
         self.name = name
+        self.game = board.default_game(game)
         self.colour = colour
         self.opponents = opponents
 
@@ -15,7 +18,11 @@ class Player:
         self.num_cities, self.num_settlements = self._update_settlement_count()
 
         self.roads = roads if roads is not None else []
-        self.road_length = self._calculate_road_length()
+        self._masks = move_generation.board_masks()
+        self._road_mask = self._masks.edge_mask(r.edge for r in self.roads)
+        self._settled_mask = self._masks.vertex_mask(s.triple for s in self.settlements)
+        self._longest_road = LongestRoad((r.edge for r in self.roads), self._opponent_triples())
+        self.road_length = self._longest_road.length
 
         self.hand = hand if hand is not None else Counter()
 
@@ -29,6 +36,7 @@ class Player:
         self.has_largest_army = has_largest_army
 
         self.vp = self.calculate_vp()
+        self.game.add_player(self)
 
     @staticmethod
     def _init_ports(settlements):
@@ -64,14 +72,11 @@ class Player:
             if self.bank_rates[i] > r:
                 self.bank_rates = r
 
-    def _calculate_road_length(self):
-        if len(self.roads) == 0:
-            return 0
-        else:
-            return structures.longest_road(self.roads)
+    def _opponent_triples(self):
+        return {s.triple for o in self.opponents for s in o.settlements}
 
     def _can_purchase(self, price):
-        return all(self.hand[r] > c for r, c in price.items())
+        return all(self.hand[r] >= c for r, c in price.items())
 
     def settlement_vp(self):
         return sum(1 + s.is_city for s in self.settlements)
@@ -86,9 +91,19 @@ class Player:
         return self.settlement_vp() + cards_vp + threshold_vp
 
     def _update_longest_road(self):
-        if not self.has_largest_army:
-            self.has_longest_road = len(self.roads) >= 3 and \
-                                    all(o.road_length < self.road_length for o in self.opponents)
+        """
+        Gives the longest road to the player, among this player and their opponents, with the unique longest road of
+        at least five, the holder keeping it on a tie.
+        """
+        players = [self, *self.opponents]
+        best = max(p.road_length for p in players)
+        holder = next((p for p in players if p.has_longest_road), None)
+        if holder is not None and holder.road_length == best and best >= 5:
+            return
+        leaders = [p for p in players if p.road_length == best]
+        for p in players:
+            p.has_longest_road = best >= 5 and len(leaders) == 1 and p is leaders[0]
+            p.vp = p.calculate_vp()
 
     def _update_has_largest_army(self):
         if not self.has_largest_army:
@@ -107,21 +122,24 @@ class Player:
             if rate <= c:
                 options.extend([({r: rate}, {i: 1}) for i in facts.RESOURCES - {r}])
         for i, req in facts.PURCHASES.items():
-            if all(self.hand[r] > c for r, c in req.items()):
+            if self._can_purchase(req):
                 options.append((req, i))
         return options
 
     def add_settlement(self, settlement):
         self.settlements.append(settlement)
+        self._settled_mask |= self._masks.vertex_mask([settlement.triple])
+        for o in self.opponents:
+            o.block_road(settlement.triple)
         self._update_vp()
-        self._update_settlement_count()
+        self.num_cities, self.num_settlements = self._update_settlement_count()
 
     def upgrade_settlement(self, settlement):
         for s in self.settlements:
             if s == settlement:
                 settlement.upgrade()
         self._update_vp()
-        self._update_settlement_count()
+        self.num_cities, self.num_settlements = self._update_settlement_count()
 
     def add_road(self, road):
         """
@@ -129,22 +147,40 @@ class Player:
         :param road: THe road to be added.
         """
         self.roads.append(road)
-        self._calculate_road_length()
-        self._calculate_road_length()
+        self._road_mask |= self._masks.edge_mask([road.edge])
+        self.road_length = self._longest_road.add_road(road.edge)
+        self._update_longest_road()
+
+    def block_road(self, t):
+        """
+        Breaks the players roads at a triple where an opponent has built.
+        :param t: The triple of the opponents settlement.
+        """
+        self.road_length = self._longest_road.block(t)
+        self._update_longest_road()
+
+    def _settlement_moves(self):
+        settled = self._masks.vertex_mask(self.game.settlements.structures_dict)
+        return move_generation.settlement_moves(self._road_mask, settled, self._masks)
+
+    def _road_moves(self):
+        settled = self._masks.vertex_mask(self.game.settlements.structures_dict)
+        roads = self._masks.edge_mask(self.game.roads.structures_dict)
+        return move_generation.road_moves(self._road_mask, self._settled_mask, settled, roads, self._masks)
 
     def potential_settlements_locations(self):
         """
         Determines potential settlement locations.
         :return: A set of triples representing the settlement locations.
         """
-        return structures.potential_settlement_triples(self.roads)
+        return self._masks.triples(self._settlement_moves())
 
     def potential_road_locations(self):
         """
-        Determines potential edge locations.
+        Determines potential edge locations, next to the players buildings or roads not cut by an opponent.
         :return: A set of edges representing the road locations.
         """
-        return structures.potential_road_edges(self.roads)
+        return self._masks.edges(self._road_moves())
 
     def potential_city_locations(self):
         """
@@ -158,17 +194,17 @@ class Player:
         Determines if a settlement can be placed.
         :return: True if a settlement can be place otherwise False.
         """
-        return self.num_settlements < Board().settlement_limit and \
-               self._can_purchase(facts.PURCHASES[facts.STRUCTURES.SETTLEMENT]) and \
-               len(self.potential_settlements_locations()) > 0
+        return self.num_settlements < self.game.settlement_limit and \
+               self._can_purchase(facts.PURCHASES[facts.PURCHASABLE.SETTLEMENT]) and \
+               self._settlement_moves() != 0
 
     def can_place_city(self):
         """
         Determines if a city can be placed.
         :return: True if a city can be place otherwise False.
         """
-        return self.num_cities < Board().settlement_limit and \
-               self._can_purchase(facts.PURCHASES[facts.STRUCTURES.CITY]) and \
+        return self.num_cities < self.game.city_limit and \
+               self._can_purchase(facts.PURCHASES[facts.PURCHASABLE.CITY]) and \
                len(self.potential_city_locations()) > 0
 
     def can_place_road(self):
@@ -176,9 +212,9 @@ class Player:
         Determines if a road can be placed.
         :return: True if a road can be place otherwise False.
         """
-        return len(self.roads) < Board().road_limit and \
-               self._can_purchase(facts.PURCHASES[facts.STRUCTURES.ROAD]) and \
-               len(self.potential_road_locations()) > 0
+        return len(self.roads) < self.game.road_limit and \
+               self._can_purchase(facts.PURCHASES[facts.PURCHASABLE.ROAD]) and \
+               self._road_moves() != 0
 
     def draw_cards(self, cards):
         for c in cards:
@@ -1,6 +1,9 @@
 from abc import abstractmethod
 from colonist_ql.model import cube_coord as cc
+from colonist_ql.model.longest_road import LongestRoad
+import colonist_ql.model.move_generation as move_generation
 import colonist_ql.patterns as patterns
+import colonist_ql.model.board as board
 import colonist_ql.facts as facts
 import numpy as np
 import random
@@ -18,37 +21,39 @@ class Hex:
 
 
 class Road:
-    def __init__(self, edge, dummy=False):
+    def __init__(self, edge, dummy=False, game=None):
         self.edge = edge
         self.planner_coords = cc.edge_planer_position(edge)
+        self.game = board.default_game(game)
 
         if not dummy:
-            Roads().add(self)
+            self.game.roads.add(self)
 
     def __str__(self):
-        t1, t2 = cc.triples_from_neighbours(*self.edge)
-        return f"Road between {string_triple(t1)} and {string_triple(t2)}."
+        t1, t2 = cc.edge_triples(self.edge)
+        return f"Road between {string_triple(t1, game=self.game)} and {string_triple(t2, game=self.game)}."
 
 
 class Settlement:
-    def __init__(self, t, is_city=False, port=None, dummy=False):
+    def __init__(self, t, is_city=False, port=None, dummy=False, game=None):
         """
         Init for Settlement.
         :param t: triple.
         :param is_city: If the settlement is a city
         :param port: The port that the settlement has, else None.
         :param dummy: If the settlement is being added to settlement.
+        :param game: The GameState the settlement is in, defaults to Board().
         """
         self.triple = t
         self.is_city = is_city
+        self.game = board.default_game(game)
         self.port = self._port(t) if port is None else port
 
         if not dummy:
-            Settlements().add(self)
+            self.game.settlements.add(self)
 
-    @staticmethod
-    def _port(t):
-        p = Ports()
+    def _port(self, t):
+        p = self.game.ports
         return p.get(t) if p.has(t) else None
 
     def upgrade(self):
@@ -59,20 +64,21 @@ class Settlement:
 
     def __str__(self):
         type_str = (facts.STRUCTURES.CITY if self.is_city else facts.STRUCTURES.SETTLEMENT).value
-        return f"{type_str} on {string_triple(self.triple)}"
+        return f"{type_str} on {string_triple(self.triple, game=self.game)}"
 
 
 class Port:
-    def __init__(self, sea_coord, land_cord, text, dummy=False):
+    def __init__(self, sea_coord, land_cord, text, dummy=False, game=None):
         self.sea_coord = sea_coord
         self.land_coord = land_cord
         self.edge = (sea_coord, land_cord)
         self.triples = tuple(frozenset({sea_coord, land_cord, t}) for t in cc.triples_from_neighbours(*self.edge))
         self.transfer_rates = self._transfer_rates(text)
         self.text = text
+        self.game = board.default_game(game)
 
         if not dummy:
-            Ports().add(self)
+            self.game.ports.add(self)
 
     @staticmethod
     def _transfer_rates(text):
@@ -89,11 +95,11 @@ class Port:
 
     def __str__(self):
         port_text = " ".join(self.text.split("\n"))
-        t1, t2 = self.triples
-        return f"Port trading {port_text} on {string_triple(t1)} and {string_triple(t2)}."
+        t1, t2 = (string_triple(t, game=self.game) for t in self.triples)
+        return f"Port trading {port_text} on {t1} and {t2}."
 
 
-class Structures(metaclass=patterns.PolymorphicSingleton):
+class Structures(metaclass=patterns.PolymorphicDefaultInstance):
     def __init__(self):
         self.structures_dict = {}
 
@@ -169,30 +175,36 @@ class Roads(Structures):
         self.structures_dict[road.edge] = road
 
 
-def potential_road_edges(owned_roads, placed_roads=None):
+def potential_road_edges(owned_roads, placed_roads=None, game=None):
     """
     Gets all the possible placement options for additional roads.
     :param owned_roads: The roads that are owned by the player.
-    :param placed_roads: roads that have ready been place, by default gets roads in the Roads singleton
+    :param placed_roads: roads that have ready been place, by default gets roads in the game.
+    :param game: The GameState, defaults to Board().
     :return: A set of placement edges.
     """
     if placed_roads is None:
-        placed_roads = Roads().get_all()
-    restricted_edges = {r.edge for r in placed_roads}
-    return {potential for r in owned_roads for potential in cc.edge_neighbours(r.edges)} - restricted_edges
+        placed_roads = board.default_game(game).roads.get_all()
+    masks = move_generation.board_masks()
+    owned = masks.edge_mask(r.edge for r in owned_roads)
+    edges = masks.incident_edges(masks.ends(owned)) & ~masks.edge_mask(r.edge for r in placed_roads)
+    return masks.edges(edges)
 
 
-def potential_settlement_triples(owned_roads, placed_settlements=None):
+def potential_settlement_triples(owned_roads, placed_settlements=None, game=None):
     """
     Gets all the possible placement options for additional settlements.
     :param owned_roads: The roads that are owned by the player.
     :param placed_settlements: The houses settlements in the game.
+    :param game: The GameState, defaults to Board().
     :return: A set of placement triples.
     """
     if placed_settlements is None:
-        placed_settlements = Settlements().get_all()
-    restricted = _restricted_settlement_placements(placed_settlements)
-    return {potential for r in owned_roads for potential in cc.triples_from_neighbours(*r.edge)} - restricted
+        placed_settlements = board.default_game(game).settlements.get_all()
+    masks = move_generation.board_masks()
+    owned = masks.edge_mask(r.edge for r in owned_roads)
+    settled = masks.vertex_mask(s.triple for s in placed_settlements)
+    return masks.triples(move_generation.settlement_moves(owned, settled, masks))
 
 
 def potential_settlement_upgrades(owned_settlements):
@@ -204,89 +216,73 @@ def potential_settlement_upgrades(owned_settlements):
     return {s for s in owned_settlements if not s.is_city}
 
 
-def _restricted_settlement_placements(placed_settlements):
-    return {t for s in placed_settlements for t in {s.triple} | cc.triple_neighbours(s.triple)}
-
-
-def placement_phase_settlement_triples(placed_settlements=None):
+def placement_phase_settlement_triples(placed_settlements=None, game=None):
     """
     Gets all the possible placement options for settlements in the placement phase.
     :param placed_settlements: The houses settlements in the game.
+    :param game: The GameState, defaults to Board().
     :return: A set of placement triples.
     """
     if placed_settlements is None:
-        placed_settlements = Settlements().get_all()
-    return cc.triples_from_centre(3) - _restricted_settlement_placements(placed_settlements)
+        placed_settlements = board.default_game(game).settlements.get_all()
+    masks = move_generation.board_masks()
+    settled = masks.vertex_mask(s.triple for s in placed_settlements)
+    return masks.triples(move_generation.setup_settlement_moves(settled, masks))
 
 
-def real_triples_locations(triples):
+def real_triples_locations(triples, game=None):
     """
     Determines the real location of triples.
     :param triples: The triples to determine the real location of.
+    :param game: The GameState, defaults to Board().
     :return: A list of real coords for the triples
     """
-    return [real_triple_location(t) for t in triples]
+    return [real_triple_location(t, game) for t in triples]
 
 
-def real_triple_location(t):
+def real_triple_location(t, game=None):
     """
     Determines the real location of a triple.
     :param t: The triple to be located.
+    :param game: The GameState, defaults to Board().
     :return: The real coord of the triple location
     """
-    x, y = zip(*[Hexes().get(c).real_coords for c in t])
+    hexes = board.default_game(game).hexes
+    x, y = zip(*[hexes.get(c).real_coords for c in t])
     return np.mean(x), np.mean(y)
 
 
-def real_edges_locations(edges):
+def real_edges_locations(edges, game=None):
     """
     Determines the real location of edges.
     :param edges: The edges to determine the real location of.
+    :param game: The GameState, defaults to Board().
     :return: A list of real coords for the edges
     """
-    return [real_edge_location(e) for e in edges]
+    return [real_edge_location(e, game) for e in edges]
 
 
-def real_edge_location(edge):
+def real_edge_location(edge, game=None):
     """
     Determines the real location of a edge.
     :param edge: The edge to be located.
+    :param game: The GameState, defaults to Board().
     :return: The real coord of the edge location
     """
     t0, t1 = cc.edge_triples(edge)
-    x0, y0 = real_triple_location(t0)
-    x1, y1 = real_triple_location(t1)
+    x0, y0 = real_triple_location(t0, game)
+    x1, y1 = real_triple_location(t1, game)
     return tuple(sorted([x0, x1])), tuple(sorted([y0, y1]))
 
 
-def longest_road(owned_roads):
+def longest_road(owned_roads, blocked_triples=()):
     """
     Calculates the length of the longest road.
     :param owned_roads: The roads that are owned by the player.
+    :param blocked_triples: The triples occupied by opponent settlements, which break a road.
     :return: An int representing the length of the road.
     """
-    road_dict = {r.edge: r for r in owned_roads}
-    graph = {e: [n for n in cc.edge_neighbours(e) if n in road_dict] for e, r in road_dict.items()}
-    return len(max(_dfs(graph)))
-
-
-def _dfs(graph, vertex=None, seen=None, path=None):
-    if seen is None:
-        seen = []
-    paths = []
-    if vertex is None:
-        for i in graph:
-            paths.extend(_dfs(graph, i, seen[:], [i]))
-    else:
-        if path is None:
-            path = [vertex]
-        seen.append(vertex)
-        for t in graph[vertex]:
-            if t not in seen:
-                t_path = path + [t]
-                paths.append(tuple(t_path))
-                paths.extend(_dfs(graph, t, seen[:], t_path))
-    return paths
+    return LongestRoad((r.edge for r in owned_roads), blocked_triples).length
 
 
 def string_hex(h):
@@ -304,20 +300,22 @@ def string_hex(h):
         return "P"
 
 
-def string_triple(t, coord_format="readable"):
+def string_triple(t, coord_format="readable", game=None):
     """
     Converts a triple to a string.
     :param t: The triple to be converted.
     :param coord_format: The format in which the triple will be displayed.
+    :param game: The GameState, defaults to Board().
     :return: A string representing the triple.
     """
     assert coord_format in ["readable", "cube", "axial"], \
         f"The coord_format {coord_format} is not valid, uses either readable, cube or axial."
     if coord_format == "readable":
-        if any(not Hexes().has(c) for c in t):
+        hexes = board.default_game(game).hexes
+        if any(not hexes.has(c) for c in t):
             return string_triple(t, "cube")
         else:
-            return " ".join(string_hex(Hexes().get(c)) for c in cc.planer_order(t))
+            return " ".join(string_hex(hexes.get(c)) for c in cc.planer_order(t))
     elif coord_format == "axial":
         return " ".join(cc.cube_to_axial(c) for c in cc.planer_order(t))
     else:
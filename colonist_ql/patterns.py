@@ -20,3 +20,31 @@ class PolymorphicSingleton(ABCMeta, Singleton):
     def __init__(cls, name, bases, attrs, **kwargs):
         super().__init__(name, bases, attrs, **kwargs)
 
+
+class DefaultInstance(type):
+    """
+    Calling the class gives a shared default instance, as with Singleton, while new creates independent instances.
+    A class can give its default instance arguments the other instances do not get with a default_kwargs classmethod.
+    """
+    def __init__(cls, name, bases, attrs, **kwargs):
+        super().__init__(name, bases, attrs)
+        cls._instance = None
+
+    def __call__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = cls.new(*args, **{**cls.default_kwargs(), **kwargs})
+        elif args or kwargs:
+            raise TypeError(f"The default {cls.__name__} already exists, use {cls.__name__}.new(...) to create "
+                            f"another with arguments.")
+        return cls._instance
+
+    def new(cls, *args, **kwargs):
+        return super().__call__(*args, **kwargs)
+
+    def default_kwargs(cls):
+        return {}
+
+
+class PolymorphicDefaultInstance(ABCMeta, DefaultInstance):
+    def __init__(cls, name, bases, attrs, **kwargs):
+        super().__init__(name, bases, attrs, **kwargs)
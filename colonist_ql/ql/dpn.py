@@ -1,13 +1,14 @@
 import os
 import tensorflow.compat.v1 as tf
 import numpy as np
+from colonist_ql.ql.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
 
 tf.disable_eager_execution()
 
 
 class DeepQNetwork(object):
     def __init__(self, lr, n_actions, name, input_dims,
-                 fc1_dims=256, fc2_dims=256, chkpt_dir='tmp/dqn'):
+                 fc1_dims=256, fc2_dims=256, chkpt_dir='tmp/dqn', target_network=False, gamma=0.99, tau=None):
         self.lr = lr
         self.n_actions = n_actions
         self.name = name
@@ -15,25 +16,97 @@ class DeepQNetwork(object):
         self.fc2_dims = fc2_dims
         self.chkpt_dir = chkpt_dir
         self.input_dims = input_dims
+        self.target_network = target_network
+        self.gamma = gamma
+        self.tau = tau
         self.sess = tf.Session()
         self.build_network()
+        if self.target_network:
+            self.build_train_step()
         self.sess.run(tf.global_variables_initializer())
+        if self.target_network:
+            self.sync_target()
         self.saver = tf.train.Saver()
         self.checkpoint_file = os.path.join(chkpt_dir, 'deepqnet.ckpt')
-        self.params = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=self.name)
+        self.params = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=f'{self.name}/')
 
     def build_network(self):
         with tf.variable_scope(self.name):
             self.input = tf.placeholder(tf.float32, shape=[None, *self.input_dims], name='inputs')
             self.q_target = tf.placeholder(tf.float32, shape=[None, self.n_actions], name='q_value')
+            self.is_weights = tf.placeholder_with_default(
+                tf.ones([tf.shape(self.input)[0]]), shape=[None], name='is_weights'
+            )
 
-            flat = tf.layers.flatten(self.input)
-            dense1 = tf.layers.dense(flat, units=self.fc1_dims, activation=tf.nn.relu, )
-            dense2 = tf.layers.dense(dense1, units=self.fc2_dims, activation=tf.nn.relu, )
-            self.q_values = tf.layers.dense(dense2, units=self.n_actions, )
-            self.loss = tf.reduce_mean(tf.square(self.q_values - self.q_target))
+            self.q_values = self._q_network(self.input)
+            self.loss = tf.reduce_mean(self.is_weights[:, tf.newaxis] * tf.square(self.q_values - self.q_target))
             self.train_op = tf.train.AdamOptimizer(self.lr).minimize(self.loss)
 
+    def _q_network(self, inputs):
+        flat = tf.layers.flatten(inputs)
+        dense1 = tf.layers.dense(flat, units=self.fc1_dims, activation=tf.nn.relu, )
+        dense2 = tf.layers.dense(dense1, units=self.fc2_dims, activation=tf.nn.relu, )
+        return tf.layers.dense(dense2, units=self.n_actions, )
+
+    def build_train_step(self):
+        """
+        Builds a target network and a train step that computes the Q targets in the graph, so a learning step is a
+        single session call. With tau the target network is Polyak-averaged after every step, otherwise it is only
+        updated by sync_target.
+        """
+        with tf.variable_scope(f'{self.name}_target'):
+            self.next_input = tf.placeholder(tf.float32, shape=[None, *self.input_dims], name='next_inputs')
+            q_next = self._q_network(self.next_input)
+
+        with tf.variable_scope(f'{self.name}_step'):
+            self.actions = tf.placeholder(tf.int32, shape=[None], name='actions')
+            self.rewards = tf.placeholder(tf.float32, shape=[None], name='rewards')
+            self.terminals = tf.placeholder(tf.float32, shape=[None], name='terminals')
+
+            q_action = tf.reduce_sum(self.q_values * tf.one_hot(self.actions, self.n_actions), axis=1)
+            bootstrap = tf.reduce_max(q_next, axis=1) * (1 - self.terminals)
+            target = tf.stop_gradient(self.rewards + self.gamma * bootstrap)
+            self.td_errors = target - q_action
+            self.step_loss = tf.reduce_mean(self.is_weights * tf.square(self.td_errors))
+
+            online = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=f'{self.name}/')
+            targets = tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope=f'{self.name}_target/')
+            minimize = tf.train.AdamOptimizer(self.lr).minimize(self.step_loss, var_list=online)
+            self.sync_op = tf.group(*[t.assign(o) for t, o in zip(targets, online)])
+            if self.tau is None:
+                self.step_op = minimize
+            else:
+                with tf.control_dependencies([minimize]):
+                    self.step_op = tf.group(
+                        *[t.assign(self.tau * o + (1 - self.tau) * t) for t, o in zip(targets, online)]
+                    )
+
+    def train_step(self, states, actions, rewards, next_states, terminals, weights=None):
+        """
+        Runs one learning step against the target network.
+        :param states: A batch of states.
+        :param actions: The action indices taken.
+        :param rewards: The rewards received.
+        :param next_states: The states after the actions.
+        :param terminals: If the next states end the game.
+        :param weights: Optional importance-sampling weights.
+        :return: The TD errors of the batch.
+        """
+        feed_dict = {
+            self.input: states,
+            self.actions: actions,
+            self.rewards: rewards,
+            self.next_input: next_states,
+            self.terminals: terminals
+        }
+        if weights is not None:
+            feed_dict[self.is_weights] = weights
+        _, td_errors = self.sess.run([self.step_op, self.td_errors], feed_dict=feed_dict)
+        return td_errors
+
+    def sync_target(self):
+        self.sess.run(self.sync_op)
+
     def load_checkpoint(self):
         print("...Loading checkpoint...")
         self.saver.restore(self.sess, self.checkpoint_file)
@@ -46,70 +119,104 @@ class DeepQNetwork(object):
 class Agent(object):
     def __init__(self, alpha, gamma, mem_size, n_actions, epsilon, batch_size,
                  n_games, input_dims=(210, 160, 4), epsilon_dec=0.996,
-                 epsilon_end=0.01, q_eval_dir='tmp/q_eval'):
+                 epsilon_end=0.01, q_eval_dir='tmp/q_eval', memory_dtype=np.float32, memory_file=None,
+                 prioritized=False, priority_alpha=0.6, priority_beta=0.4, priority_beta_inc=1e-4,
+                 target_update=None, tau=None):
         self.action_space = [i for i in range(n_actions)]
         self.n_actions = n_actions
         self.n_games = n_games
         self.gamma = gamma
         self.mem_size = mem_size
-        self.mem_cntr = 0
         self.epsilon = epsilon
         self.epsilon_dec = epsilon_dec
         self.epsilon_min = epsilon_end
         self.batch_size = batch_size
-        self.q_eval = DeepQNetwork(alpha, n_actions, input_dims=input_dims, name='q_eval', chkpt_dir=q_eval_dir)
-        self.state_memory = np.zeros((self.mem_size, *input_dims))
-        self.new_state_memory = np.zeros((self.mem_size, *input_dims))
-        self.action_memory = np.zeros((self.mem_size, self.n_actions), dtype=np.int8)
-        self.reward_memory = np.zeros(self.mem_size)
-        self.terminal_memory = np.zeros(self.mem_size, dtype=np.int8)
+        self.target_update = target_update
+        self.fused = target_update is not None or tau is not None
+        self.learn_step = 0
+        self.q_eval = DeepQNetwork(
+            alpha, n_actions, input_dims=input_dims, name='q_eval', chkpt_dir=q_eval_dir,
+            target_network=self.fused, gamma=gamma, tau=tau
+        )
+        self.prioritized = prioritized
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(
+                mem_size, input_dims, memory_dtype, memory_file, priority_alpha, priority_beta, priority_beta_inc
+            )
+        else:
+            self.memory = ReplayBuffer(mem_size, input_dims, memory_dtype, memory_file)
+
+    @property
+    def mem_cntr(self):
+        return self.memory.mem_cntr
 
     def store_transition(self, state, action, reward, state_, terminal):
-        index = self.mem_cntr % self.mem_size
-        self.state_memory[index] = state
-        actions = np.zeros(self.n_actions)
-        actions[action] = 1.0
-        self.action_memory[index] = actions
-        self.reward_memory[index] = reward
-        self.new_state_memory[index] = state_
-        self.terminal_memory[index] = 1 - terminal
-        self.mem_cntr += 1
-
-    def choose_action(self, state):
-        state = state[np.newaxis, :]
-        rand = np.random.random()
-        if rand < self.epsilon:
-            return np.random.choice(self.action_space)
-        else:
-            return np.argmax(self.q_eval.sess.run(self.q_eval.q_values, feed_dict={self.q_eval.input: state}))
+        self.memory.store_transition(state, action, reward, state_, terminal)
+
+    def choose_action(self, state, legal_mask=None):
+        legal_mask = None if legal_mask is None else np.asarray(legal_mask)[np.newaxis, :]
+        return self.choose_actions(np.asarray(state)[np.newaxis, :], legal_mask)[0]
+
+    def choose_actions(self, states, legal_mask=None):
+        """
+        Chooses epsilon-greedy actions for a batch of environments with one forward pass.
+        An environment with no legal action raises a ValueError rather than being given an illegal one.
+        :param states: An array of states, one per environment.
+        :param legal_mask: An optional (environments, actions) boolean array of the legal actions.
+        :return: An array of action indices, one per environment.
+        """
+        states = np.asarray(states)
+        n = len(states)
+        legal_mask = np.ones((n, self.n_actions), dtype=np.bool_) if legal_mask is None else \
+            np.asarray(legal_mask, dtype=np.bool_)
+        stuck = np.flatnonzero(~legal_mask.any(axis=1))
+        if len(stuck):
+            raise ValueError(f"The environments {stuck.tolist()} have no legal action.")
+
+        # A random legal action is the legal action with the highest random score.
+        actions = np.argmax(np.where(legal_mask, np.random.random((n, self.n_actions)), -1), axis=1)
+        greedy = np.random.random(n) >= self.epsilon
+        if greedy.any():
+            q_values = self.q_eval.sess.run(self.q_eval.q_values, feed_dict={self.q_eval.input: states[greedy]})
+            actions[greedy] = np.argmax(np.where(legal_mask[greedy], q_values, -np.inf), axis=1)
+        return actions
 
     def learn(self):
         if self.mem_cntr > self.batch_size:
-            max_mem = self.mem_cntr if self.mem_cntr < self.mem_size else self.mem_size
-            batch = np.random.choice(max_mem, self.batch_size)
-
-            state_batch = self.state_memory[batch]
-            action_batch = self.action_memory[batch]
-            action_values = np.array(self.action_space, dtype=np.int8)
-            action_indices = np.dot(action_batch, action_values)
-            reward_batch = self.reward_memory[batch]
-            new_state_batch = self.new_state_memory[batch]
-            terminal_batch = self.terminal_memory[batch]
-
-            q_eval = self.q_eval.sess.run(self.q_eval.q_values, feed_dict={self.q_eval.input: state_batch})
-            q_next = self.q_eval.sess.run(self.q_eval.q_values, feed_dict={self.q_eval.input: new_state_batch})
-            q_target = q_eval.copy()
-            batch_index = np.arange(self.batch_size, dtype=np.int32)
-
-            q_target[batch_index, action_indices] = reward_batch + self.gamma * np.max(q_next, axis=1) * terminal_batch
-
-            self.q_eval.sess.run(
-                self.q_eval.train_op,
-                feed_dict={self.q_eval.input: state_batch, self.q_eval.q_target: q_target}
-            )
+            state_batch, action_indices, reward_batch, new_state_batch, terminal_batch, batch, *weights = \
+                self.memory.sample(self.batch_size)
+            weights = weights[0] if self.prioritized else None
+
+            if self.fused:
+                td_errors = self.q_eval.train_step(
+                    state_batch, action_indices, reward_batch, new_state_batch, terminal_batch, weights
+                )
+                self.learn_step += 1
+                if self.target_update is not None and self.learn_step % self.target_update == 0:
+                    self.q_eval.sync_target()
+            else:
+                td_errors = self._learn_unfused(state_batch, action_indices, reward_batch, new_state_batch,
+                                                terminal_batch, weights)
+            if self.prioritized:
+                self.memory.update_priorities(batch, td_errors)
 
             self.epsilon = self.epsilon * self.epsilon_dec if self.epsilon > self.epsilon_min else self.epsilon_min
 
+    def _learn_unfused(self, state_batch, action_indices, reward_batch, new_state_batch, terminal_batch, weights):
+        q_eval = self.q_eval.sess.run(self.q_eval.q_values, feed_dict={self.q_eval.input: state_batch})
+        q_next = self.q_eval.sess.run(self.q_eval.q_values, feed_dict={self.q_eval.input: new_state_batch})
+        q_target = q_eval.copy()
+        batch_index = np.arange(len(action_indices), dtype=np.int32)
+
+        q_target[batch_index, action_indices] = \
+            reward_batch + self.gamma * np.max(q_next, axis=1) * (1 - terminal_batch)
+
+        feed_dict = {self.q_eval.input: state_batch, self.q_eval.q_target: q_target}
+        if weights is not None:
+            feed_dict[self.q_eval.is_weights] = weights
+        self.q_eval.sess.run(self.q_eval.train_op, feed_dict=feed_dict)
+        return q_target[batch_index, action_indices] - q_eval[batch_index, action_indices]
+
     def save_models(self):
         self.q_eval.save_checkpoint()
 
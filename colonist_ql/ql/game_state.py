@@ -1,2 +1,182 @@
+import numpy as np
+import colonist_ql.facts as facts
+import colonist_ql.model.cube_coord as cc
+
+RESOURCE_ORDER = list(facts.RESOURCES)
+RESOURCE_INDEX = {r.value: i for i, r in enumerate(RESOURCE_ORDER)}
+DEV_CARD_ORDER = [facts.DEV_CARD.VP, facts.DEV_CARD.KNIGHT, facts.DEV_CARD.MONO, facts.DEV_CARD.YOP, facts.DEV_CARD.RB]
+
+
 def get_actions(game_state):
     NotImplementedError()
+
+
+class StateEncoder:
+    """
+    Fixed size feature vector of a game for the Q-learning agent.
+    Every feature group is a reshaped view into one flat vector, so events update the vector in place and the
+    layout is stable for a given number of players and board radius.
+    """
+    def __init__(self, player_names, topology=None, dtype=np.float32):
+        """
+        Init for StateEncoder.
+        :param player_names: The names of the players, their order fixes the player slots in the layout.
+        :param topology: The BoardTopology of the board, defaults to the standard board.
+        :param dtype: The dtype of the feature vector.
+        """
+        self.topology = cc.board_topology() if topology is None else topology
+        self.players = {name: i for i, name in enumerate(player_names)}
+        self.land_hexes = [h for h, is_land in zip(self.topology.hexes, self.topology.land_hexes) if is_land]
+        self.land_index = {h: i for i, h in enumerate(self.land_hexes)}
+
+        n_players, n_resources, n_hexes = len(self.players), len(RESOURCE_ORDER), len(self.land_hexes)
+        shapes = {
+            "hex_resources": (n_hexes, n_resources),
+            "hex_pips": (n_hexes,),
+            "robber": (n_hexes,),
+            "settlements": (self.topology.n_vertices, n_players),
+            "cities": (self.topology.n_vertices, n_players),
+            "roads": (self.topology.n_edges, n_players),
+            "hands": (n_players, n_resources),
+            "dev_cards": (n_players, len(DEV_CARD_ORDER)),
+            "knights": (n_players,),
+            "bank_rates": (n_players, n_resources),
+            "vp": (n_players,),
+            "longest_road": (n_players,),
+            "largest_army": (n_players,),
+        }
+        self.layout = {}
+        size = 0
+        for name, shape in shapes.items():
+            n = int(np.prod(shape))
+            self.layout[name] = slice(size, size + n)
+            size += n
+
+        self.vector = np.zeros(size, dtype=dtype)
+        self.views = {name: self.vector[sl].reshape(shapes[name]) for name, sl in self.layout.items()}
+        self.views["bank_rates"][:] = 1 / 4
+
+    @property
+    def shape(self):
+        return self.vector.shape
+
+    def __getitem__(self, name):
+        return self.views[name]
+
+    def encode(self, game):
+        """
+        Rebuilds the whole feature vector from a game.
+        :param game: A GameState.
+        :return: The feature vector.
+        """
+        self.vector[:] = 0
+        self.views["bank_rates"][:] = 1 / 4
+        for h in game.hexes.get_all():
+            if h.cube_coords in self.land_index:
+                self.on_hex(h)
+        for p in game.get_players():
+            if p.name not in self.players:
+                continue
+            for s in p.settlements:
+                self.on_settlement(p.name, s.triple, s.is_city)
+            for r in p.roads:
+                self.on_road(p.name, r.edge)
+            self.on_resources(p.name, p.hand.elements())
+            for card in p.dev_cards:
+                self.on_dev_card(p.name, card)
+            self.on_knights(p.name, p.knights)
+            self.on_bank_rates(p.name, p.bank_rates)
+            self.on_vp(p.name, p.vp, p.has_longest_road, p.has_largest_army)
+        return self.vector
+
+    def on_hex(self, h):
+        """
+        Sets the resource, pips and robber of a land hex.
+        :param h: A Hex.
+        """
+        i = self.land_index[h.cube_coords]
+        self.views["hex_resources"][i] = 0
+        resource = getattr(h.resource, "value", h.resource)
+        if resource in RESOURCE_INDEX:
+            self.views["hex_resources"][i, RESOURCE_INDEX[resource]] = 1
+        self.views["hex_pips"][i] = facts.DICE_PIPS[h.value] / 5 if isinstance(h.value, int) else 0
+        if h.blocked:
+            self.on_robber(h.cube_coords)
+
+    def on_robber(self, coord):
+        """
+        Moves the robber.
+        :param coord: The cube coord of the hex the robber is moved to.
+        """
+        self.views["robber"][:] = 0
+        self.views["robber"][self.land_index[coord]] = 1
+
+    def on_settlement(self, player, t, is_city=False):
+        """
+        Places a settlement or upgrades it to a city.
+        :param player: The name of the player.
+        :param t: The triple of the settlement.
+        :param is_city: If the settlement is a city.
+        """
+        v, p = self.topology.vertex_id(t), self.players[player]
+        self.views["settlements"][v, p] = not is_city
+        self.views["cities"][v, p] = is_city
+
+    def on_road(self, player, edge):
+        """
+        Places a road.
+        :param player: The name of the player.
+        :param edge: The edge of the road.
+        """
+        self.views["roads"][self.topology.edge_id(edge), self.players[player]] = 1
+
+    def on_resources(self, player, resources, sign=1):
+        """
+        Adds resources to or removes resources from a players hand.
+        :param player: The name of the player.
+        :param resources: An iterable of resources.
+        :param sign: 1 to add the resources, -1 to remove them.
+        """
+        hand = self.views["hands"][self.players[player]]
+        for r in resources:
+            hand[RESOURCE_INDEX[getattr(r, "value", r)]] += sign
+
+    def on_dev_card(self, player, card, sign=1):
+        """
+        Adds a development card to or removes one from a player.
+        :param player: The name of the player.
+        :param card: The development card.
+        :param sign: 1 to add the card, -1 to remove it.
+        """
+        self.views["dev_cards"][self.players[player], DEV_CARD_ORDER.index(card)] += sign
+
+    def on_knights(self, player, knights):
+        """
+        Sets the number of knights a player has played.
+        :param player: The name of the player.
+        :param knights: The number of knights.
+        """
+        self.views["knights"][self.players[player]] = knights
+
+    def on_bank_rates(self, player, rates):
+        """
+        Sets the bank rates of a player, encoded as the inverse of the rate.
+        :param player: The name of the player.
+        :param rates: A dictionary of resources to rate.
+        """
+        row = self.views["bank_rates"][self.players[player]]
+        for r, rate in rates.items():
+            row[RESOURCE_INDEX[getattr(r, "value", r)]] = 1 / rate
+
+    def on_vp(self, player, vp, has_longest_road=False, has_largest_army=False):
+        """
+        Sets the victory points of a player.
+        :param player: The name of the player.
+        :param vp: The victory points.
+        :param has_longest_road: If the player has the longest road.
+        :param has_largest_army: If the player has the largest army.
+        """
+        p = self.players[player]
+        self.views["vp"][p] = vp
+        self.views["longest_road"][p] = has_longest_road
+        self.views["largest_army"][p] = has_largest_army
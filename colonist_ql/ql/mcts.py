@@ -0,0 +1,325 @@
+import math
+import time
+import multiprocessing as mp
+import numpy as np
+import colonist_ql.facts as facts
+from colonist_ql.ql.simulator import END_TURN, FREE_ROAD, SETUP_ROAD, SETUP_SETTLEMENT, WINNING_VP, random_policy
+from colonist_ql.ql.self_play import q_values
+
+# The dice totals and their probabilities.
+ROLLS = np.array(sorted(facts.DICE_PIPS))
+ROLL_PROBABILITIES = np.array([facts.DICE_PIPS[r] for r in ROLLS]) / 36
+
+# Seconds before a decision's deadline that the searches stop, leaving time for the workers' results to arrive.
+RESULT_MARGIN = 0.01
+
+
+def heuristic_values(sim):
+    """
+    Values a position for every player, by the winner if the game is over otherwise by victory points.
+    :param sim: The CatanSimulator.
+    :return: An array of the value of each player in [0, 1].
+    """
+    if sim.winner >= 0:
+        values = np.zeros(sim.n_players)
+        values[sim.winner] = 1
+        return values
+    return np.minimum(sim.vp / WINNING_VP, 1)
+
+
+class QValueEvaluator:
+    """
+    Values the leaves of a search with a Q network, each player's value being its best action value from its own
+    view of the position.
+    """
+    def __init__(self, weights):
+        """
+        Init for QValueEvaluator.
+        :param weights: The kernel and bias of each dense layer, e.g. self_play.policy_weights(agent).
+        """
+        self.weights = weights
+
+    def __call__(self, sim):
+        if sim.done:
+            return heuristic_values(sim)
+        sim.observation()
+        q = q_values(self.weights, sim.encoder.vector[sim.rotations])
+        values = q.max(axis=1)
+        values[sim.player] = q[sim.player, sim.legal_actions()].max()
+        return values
+
+
+class Node:
+    """
+    A node of the search tree, holding the visits and summed value of the move into it for the player that made it.
+    The children of a decision node are keyed by action and those of a chance node by dice total.
+    """
+    def __init__(self, player, chance=False):
+        self.player = player
+        self.chance = chance
+        self.visits = 0
+        self.value = 0.0
+        self.children = {}
+
+    def child(self, key, player, chance=False):
+        node = self.children.get(key)
+        if node is None:
+            node = self.children[key] = Node(player, chance)
+        return node
+
+
+def position_key(sim):
+    """
+    Identifies the position of a game closely enough to tell if a kept tree is rooted at it.
+    The number of steps taken tells apart positions within a turn, and the board, pieces and hands tell apart games.
+    :param sim: The CatanSimulator.
+    :return: A tuple of the steps, turn, player, phase, free roads, placed pieces, hands and board.
+    """
+    return sim.steps, sim.turn, sim.player, sim.phase, sim.free_roads, sim.moves.settled, sim.moves.roads, \
+        sim.hands.tobytes(), sim.hex_resource.tobytes()
+
+
+def _is_roll(sim, action):
+    return action == END_TURN and sim.phase not in (FREE_ROAD, SETUP_SETTLEMENT, SETUP_ROAD)
+
+
+class MCTS:
+    """
+    Open loop Monte Carlo tree search over the CatanSimulator.
+    Each iteration replays the tree's actions on a copy of the root position, so the hidden randomness of dev card
+    draws, discards and steals is resampled every iteration, and only the actions legal in that replay are selected.
+    Ending a turn leads to a chance node sampling the dice.
+    """
+    def __init__(self, exploration=1.0, rollout_policy=random_policy, rollout_depth=40, evaluate=heuristic_values,
+                 seed=None):
+        """
+        Init for MCTS.
+        :param exploration: The UCT exploration constant.
+        :param rollout_policy: A function of (sim, rng) choosing the actions of a rollout.
+        :param rollout_depth: The number of rollout steps before the leaf is evaluated, 0 evaluates the leaf itself.
+        :param evaluate: A function of a CatanSimulator to the value of each player, e.g. a QValueEvaluator.
+        :param seed: The seed of the search.
+        """
+        self.exploration = exploration
+        self.rollout_policy = rollout_policy
+        self.rollout_depth = rollout_depth
+        self.evaluate = evaluate
+        self.rng = np.random.default_rng(seed)
+        self.root = None
+        self.root_key = None
+
+    def search(self, sim, budget=0.2, max_iterations=None):
+        """
+        Searches from a position, reusing the tree kept since the position was last searched if it still matches.
+        :param sim: The CatanSimulator at the position, left unchanged.
+        :param budget: The seconds to search for.
+        :param max_iterations: Optionally, the most iterations to run.
+        :return: A dictionary of each root action searched to its visits and summed value.
+        """
+        deadline = time.perf_counter() + budget
+        key = position_key(sim)
+        if self.root is None or self.root_key != key:
+            self.root, self.root_key = Node(sim.player), key
+        iterations = 0
+        while time.perf_counter() < deadline and (max_iterations is None or iterations < max_iterations):
+            self._iterate(sim)
+            iterations += 1
+        legal = set(sim.legal_actions())
+        return {a: (n.visits, n.value) for a, n in self.root.children.items() if a in legal}
+
+    def _iterate(self, root_sim):
+        sim = root_sim.copy()
+        sim.rng = np.random.default_rng(self.rng.integers(1 << 63))
+        node, path = self.root, [self.root]
+        expanded = False
+        while not sim.done and not expanded:
+            legal = sim.legal_actions()
+            untried = [a for a in legal if a not in node.children]
+            if untried:
+                action = untried[self.rng.integers(len(untried))]
+                expanded = True
+            else:
+                action = self._select(node, legal)
+            node, roll = self._step(sim, node, action)
+            path.append(node)
+            if roll is not None:
+                node = node.child(roll, node.player)
+                path.append(node)
+
+        for _ in range(self.rollout_depth):
+            if sim.done:
+                break
+            sim.step(self.rollout_policy(sim, self.rng))
+        values = self.evaluate(sim)
+
+        self.root.visits += 1
+        for n in path[1:]:
+            n.visits += 1
+            n.value += values[n.player]
+
+    def _select(self, node, legal):
+        log_visits = math.log(max(node.visits, 1))
+        best, best_score = None, -math.inf
+        for a in legal:
+            child = node.children[a]
+            score = child.value / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best, best_score = a, score
+        return best
+
+    def _step(self, sim, node, action):
+        """
+        Steps the simulation and descends to the child of an action, sampling the dice if the action rolls them.
+        :return: The child and the dice total rolled, or None.
+        """
+        p = sim.player
+        if _is_roll(sim, action):
+            roll = int(self.rng.choice(ROLLS, p=ROLL_PROBABILITIES))
+            sim.step(action, roll)
+            return node.child(action, p, chance=True), roll
+        sim.step(action)
+        return node.child(action, p), None
+
+    def advance(self, action, roll=None, key=None):
+        """
+        Moves the root to the child of an action taken in the game, keeping its subtree for the next search.
+        :param action: The action taken.
+        :param roll: The dice total if the action rolled the dice, the sim's roll after the step.
+        :param key: The position_key of the game after the action.
+        """
+        node = None if self.root is None else self.root.children.get(action)
+        if node is not None and node.chance:
+            node = node.children.get(roll)
+        self.root = node
+        self.root_key = key if node is not None else None
+
+
+def _worker(connection, search_kwargs):
+    """
+    Runs searches of one MCTS for the MCTSAgent, keeping its tree between moves.
+    :param connection: The pipe to the agent.
+    :param search_kwargs: Keyword arguments of the MCTS.
+    """
+    tree = MCTS(**search_kwargs)
+    connection.send(("ready",))
+    while True:
+        command, *args = connection.recv()
+        if command == "search":
+            request, sim, deadline = args
+            connection.send((request, tree.search(sim, max(deadline - time.time(), 0))))
+        elif command == "advance":
+            tree.advance(*args)
+        else:
+            break
+
+
+class MCTSAgent:
+    """
+    Chooses actions by Monte Carlo tree search within a time budget, with root parallelism across worker processes.
+    Each worker searches its own tree from the same position and the root statistics are summed, the statistics of a
+    worker that misses the deadline being left out. Reporting every action taken in the game with observe keeps the
+    trees between decisions.
+    """
+    def __init__(self, budget=0.2, n_workers=1, exploration=1.0, rollout_policy=random_policy, rollout_depth=40,
+                 evaluate=heuristic_values, seed=None):
+        """
+        Init for MCTSAgent.
+        :param budget: The seconds each decision takes at most.
+        :param n_workers: The number of searches run in parallel, one in this process and the rest in workers.
+        :param exploration: The UCT exploration constant.
+        :param rollout_policy: A picklable function of (sim, rng) choosing the actions of a rollout.
+        :param rollout_depth: The number of rollout steps before a leaf is evaluated.
+        :param evaluate: A picklable function of a CatanSimulator to the value of each player.
+        :param seed: The seed of the searches, worker i using seed + i.
+        """
+        self.budget = budget
+        self.n_workers = n_workers
+        seed = int(np.random.default_rng(seed).integers(1 << 31)) if seed is None else seed
+        kwargs = {"exploration": exploration, "rollout_policy": rollout_policy, "rollout_depth": rollout_depth,
+                  "evaluate": evaluate}
+        self.tree = MCTS(seed=seed, **kwargs)
+        self.connections, self.processes = [], []
+        self.requests = 0
+        context = mp.get_context("spawn")
+        for i in range(1, n_workers):
+            connection, child = context.Pipe()
+            process = context.Process(target=_worker, args=(child, dict(kwargs, seed=seed + i)), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+        # Workers are waited for here so their start up is not taken from the first decision's budget.
+        for connection in self.connections:
+            connection.recv()
+
+    def search(self, sim):
+        """
+        Searches a position in every worker.
+        :param sim: The CatanSimulator of the position.
+        :return: A dictionary of each root action searched to its visits and summed value, summed over the workers
+            that answered by the deadline.
+        """
+        deadline = time.time() + self.budget
+        self.requests += 1
+        for connection in self.connections:
+            connection.send(("search", self.requests, sim, deadline - RESULT_MARGIN))
+        stats = self.tree.search(sim, max(deadline - RESULT_MARGIN - time.time(), 0))
+        for connection in self.connections:
+            for a, (visits, value) in self._result(connection, deadline).items():
+                v, w = stats.get(a, (0, 0.0))
+                stats[a] = v + visits, w + value
+        return stats
+
+    def _result(self, connection, deadline):
+        """
+        Waits until the deadline for a worker's statistics of the current search, discarding late answers to earlier
+        searches.
+        :return: The statistics, or an empty dictionary if they did not arrive in time.
+        """
+        while connection.poll(max(deadline - time.time(), 0)):
+            request, stats = connection.recv()
+            if request == self.requests:
+                return stats
+        return {}
+
+    def choose_action(self, sim):
+        """
+        Chooses the action of the current player, the most visited over every worker's search.
+        :param sim: The CatanSimulator of the position.
+        :return: An action id.
+        """
+        legal = sim.legal_actions()
+        if len(legal) == 1:
+            return legal[0]
+        stats = self.search(sim)
+        return max(legal, key=lambda a: stats.get(a, (0, 0.0)))
+
+    def observe(self, sim, action, roll=None):
+        """
+        Reports an action taken in the game by any player, moving every tree to the position after it.
+        :param sim: The CatanSimulator after the action was taken.
+        :param action: The action.
+        :param roll: The dice total if the action ended the turn, defaults to the sim's roll.
+        """
+        roll = sim.roll if roll is None else roll
+        key = position_key(sim)
+        for connection in self.connections:
+            connection.send(("advance", action, roll, key))
+        self.tree.advance(action, roll, key)
+
+    def close(self):
+        """
+        Stops the workers.
+        """
+        for connection in self.connections:
+            connection.send(("stop",))
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        self.connections, self.processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
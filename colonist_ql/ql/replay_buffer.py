@@ -0,0 +1,301 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Replay memory storing each observation once.
+    Transitions hold indices into a single observation ring, and a transition whose state is the next state of the
+    previous transition in the same stream reuses that observation instead of storing it again. Consecutive
+    transitions therefore cost one observation each; transitions that do not follow on cost two, and an older
+    transition whose observation has been overwritten is no longer sampled.
+    """
+    def __init__(self, mem_size, input_dims, dtype=np.float32, memmap_file=None):
+        """
+        Init for ReplayBuffer.
+        :param mem_size: The number of transitions to store.
+        :param input_dims: The shape of an observation.
+        :param dtype: The dtype observations are stored in, e.g. np.uint8 or np.float16.
+        :param memmap_file: If given, the file used to back the observations with a np.memmap.
+        """
+        self.mem_size = mem_size
+        self.input_dims = tuple(input_dims)
+        self.dtype = np.dtype(dtype)
+        self.mem_cntr = 0
+
+        self.obs_size = mem_size + 1
+        self.obs_cntr = 0
+        if memmap_file is None:
+            self.observations = np.zeros((self.obs_size, *self.input_dims), dtype=self.dtype)
+        else:
+            self.observations = np.memmap(
+                memmap_file, dtype=self.dtype, mode="w+", shape=(self.obs_size, *self.input_dims)
+            )
+
+        self.state_index = np.zeros(mem_size, dtype=np.int64)
+        self.next_index = np.zeros(mem_size, dtype=np.int64)
+        self.action_memory = np.zeros(mem_size, dtype=np.int32)
+        self.reward_memory = np.zeros(mem_size, dtype=np.float32)
+        self.terminal_memory = np.zeros(mem_size, dtype=np.bool_)
+        self.valid = np.zeros(mem_size, dtype=np.bool_)
+
+        # The transitions using each observation as their state and next state.
+        self._state_of = np.full(self.obs_size, -1, dtype=np.int64)
+        self._next_of = np.full(self.obs_size, -1, dtype=np.int64)
+        self._last_next = {}
+
+    def __len__(self):
+        return min(self.mem_cntr, self.mem_size)
+
+    def _invalidate(self, index):
+        self.valid[index] = False
+
+    def _write_observation(self, observation):
+        """
+        Writes an observation into the ring, invalidating the transitions using the slot it replaces.
+        :param observation: The observation.
+        :return: The index of the observation.
+        """
+        j = self.obs_cntr % self.obs_size
+        for owners in (self._state_of, self._next_of):
+            if owners[j] >= 0:
+                self._invalidate(owners[j])
+                owners[j] = -1
+        self.observations[j] = observation
+        self.obs_cntr += 1
+        return j
+
+    def store_transition(self, state, action, reward, state_, terminal, stream=0):
+        """
+        Stores a transition.
+        :param state: The observation before the action.
+        :param action: The index of the action.
+        :param reward: The reward.
+        :param state_: The observation after the action.
+        :param terminal: If state_ ends the game.
+        :param stream: An id for the environment producing the transition, so interleaved games can share a buffer.
+        :return: The index of the transition.
+        """
+        index = self.mem_cntr % self.mem_size
+        if self.mem_cntr >= self.mem_size:
+            self._invalidate(index)
+            if self._state_of[self.state_index[index]] == index:
+                self._state_of[self.state_index[index]] = -1
+            if self._next_of[self.next_index[index]] == index:
+                self._next_of[self.next_index[index]] = -1
+
+        state = np.asarray(state).astype(self.dtype, copy=False)
+        last = self._last_next.get(stream)
+        if last is not None and self._next_of[last] >= 0 and np.array_equal(self.observations[last], state):
+            s = last
+        else:
+            s = self._write_observation(state)
+        s_ = self._write_observation(np.asarray(state_).astype(self.dtype, copy=False))
+
+        self.state_index[index], self.next_index[index] = s, s_
+        self._state_of[s], self._next_of[s_] = index, index
+        self.action_memory[index] = action
+        self.reward_memory[index] = reward
+        self.terminal_memory[index] = terminal
+        self.valid[index] = True
+
+        if terminal:
+            self._last_next.pop(stream, None)
+        else:
+            self._last_next[stream] = s_
+        self.mem_cntr += 1
+        return index
+
+    def sample_indices(self, batch_size):
+        """
+        Uniformly samples the indices of stored transitions.
+        :param batch_size: The number of transitions.
+        :return: An array of transition indices.
+        """
+        batch = np.random.randint(len(self), size=batch_size)
+        invalid = ~self.valid[batch]
+        while invalid.any():
+            batch[invalid] = np.random.randint(len(self), size=invalid.sum())
+            invalid = ~self.valid[batch]
+        return batch
+
+    def get(self, batch):
+        """
+        Gets the transitions at the indices.
+        :param batch: An array of transition indices.
+        :return: states, actions, rewards, next states and terminals.
+        """
+        return (
+            self.observations[self.state_index[batch]],
+            self.action_memory[batch],
+            self.reward_memory[batch],
+            self.observations[self.next_index[batch]],
+            self.terminal_memory[batch]
+        )
+
+    def sample(self, batch_size):
+        """
+        Uniformly samples transitions.
+        :param batch_size: The number of transitions.
+        :return: states, actions, rewards, next states, terminals and the transition indices.
+        """
+        batch = self.sample_indices(batch_size)
+        return (*self.get(batch), batch)
+
+    def flush(self):
+        """
+        Flushes the observations to the backing file when memory-mapped.
+        """
+        if isinstance(self.observations, np.memmap):
+            self.observations.flush()
+
+
+class SumTree:
+    """
+    Binary tree where each node holds the sum of its children, stored in a flat array with the root at 1.
+    Updates and prefix-sum searches are O(log n) and are vectorized over batches of leaves, with a scalar path for
+    setting a single leaf.
+    """
+    def __init__(self, capacity):
+        """
+        Init for SumTree.
+        :param capacity: The number of leaves.
+        """
+        self.capacity = capacity
+        self.depth = int(np.ceil(np.log2(max(capacity, 2))))
+        self.n_leaves = 2 ** self.depth
+        self.tree = np.zeros(2 * self.n_leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[np.asarray(indices) + self.n_leaves]
+
+    def update(self, indices, values):
+        """
+        Sets the value of leaves and updates their ancestors.
+        :param indices: An array of leaf indices.
+        :param values: An array of values.
+        """
+        nodes = np.asarray(indices, dtype=np.int64) + self.n_leaves
+        self.tree[nodes] = values
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def set(self, index, value):
+        """
+        Sets the value of a single leaf and updates its ancestors, without the array overhead of update.
+        :param index: The leaf index.
+        :param value: The value.
+        """
+        tree = self.tree
+        node = int(index) + self.n_leaves
+        tree[node] = value
+        while node > 1:
+            node //= 2
+            tree[node] = tree.item(2 * node) + tree.item(2 * node + 1)
+
+    def find(self, values):
+        """
+        Finds the leaves whose cumulative sum range contains each value.
+        :param values: An array of values in [0, total).
+        :return: An array of leaf indices.
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values = np.where(go_right, values - self.tree[left], values)
+            nodes = np.where(go_right, left + 1, left)
+        return np.minimum(nodes - self.n_leaves, self.capacity - 1)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Replay memory sampling transitions in proportion to their priority, the TD error of their last update.
+    """
+    def __init__(self, mem_size, input_dims, dtype=np.float32, memmap_file=None,
+                 alpha=0.6, beta=0.4, beta_inc=1e-4, epsilon=1e-5):
+        """
+        Init for PrioritizedReplayBuffer.
+        :param mem_size: The number of transitions to store.
+        :param input_dims: The shape of an observation.
+        :param dtype: The dtype observations are stored in.
+        :param memmap_file: If given, the file used to back the observations with a np.memmap.
+        :param alpha: How strongly priorities skew sampling, 0 is uniform.
+        :param beta: The initial importance-sampling correction, annealed towards 1.
+        :param beta_inc: The increase of beta on each sample.
+        :param epsilon: Added to TD errors so no transition has zero priority.
+        """
+        super().__init__(mem_size, input_dims, dtype, memmap_file)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_inc = beta_inc
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.priorities = SumTree(mem_size)
+        self._storing = -1
+
+    def _invalidate(self, index):
+        super()._invalidate(index)
+        # The slot being stored into is given its new priority by store_transition, in one update of the leaf.
+        if index != self._storing:
+            self.priorities.set(index, 0.0)
+
+    def store_transition(self, state, action, reward, state_, terminal, stream=0):
+        self._storing = self.mem_cntr % self.mem_size
+        try:
+            index = super().store_transition(state, action, reward, state_, terminal, stream)
+        finally:
+            self._storing = -1
+        self.priorities.set(index, self.max_priority)
+        return index
+
+    def sample_indices(self, batch_size):
+        """
+        Samples the indices of stored transitions by priority, one from each of batch_size equal segments.
+        :param batch_size: The number of transitions.
+        :return: An array of transition indices.
+        """
+        segment = self.priorities.total / batch_size
+        batch = self.priorities.find((np.arange(batch_size) + np.random.random(batch_size)) * segment)
+        invalid = ~self.valid[batch]
+        while invalid.any():
+            batch[invalid] = self.priorities.find(np.random.random(invalid.sum()) * self.priorities.total)
+            invalid = ~self.valid[batch]
+        return batch
+
+    def importance_weights(self, batch):
+        """
+        Calculates the normalised importance-sampling weights of sampled transitions.
+        :param batch: An array of transition indices.
+        :return: An array of weights.
+        """
+        probabilities = self.priorities.get(batch) / self.priorities.total
+        weights = (len(self) * probabilities) ** -self.beta
+        return (weights / weights.max()).astype(np.float32)
+
+    def sample(self, batch_size):
+        """
+        Samples transitions by priority.
+        :param batch_size: The number of transitions.
+        :return: states, actions, rewards, next states, terminals, the transition indices and importance weights.
+        """
+        batch = self.sample_indices(batch_size)
+        weights = self.importance_weights(batch)
+        self.beta = min(1.0, self.beta + self.beta_inc)
+        return (*self.get(batch), batch, weights)
+
+    def update_priorities(self, batch, td_errors):
+        """
+        Updates the priorities of transitions from their TD errors.
+        :param batch: An array of transition indices.
+        :param td_errors: An array of TD errors.
+        """
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        priorities = np.where(self.valid[batch], priorities, 0.0)
+        self.priorities.update(batch, priorities)
+        self.max_priority = max(self.max_priority, priorities.max(initial=0))
@@ -0,0 +1,298 @@
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from colonist_ql.ql.simulator import CatanSimulator, N_ACTIONS
+
+# Columns of the control array, a row per actor. The last row holds the learner's STOP flag and weights VERSION.
+HEAD, TAIL, STEPS, GAMES, TRANSITIONS, BLOCKED = range(6)
+STOP, VERSION = range(2)
+N_COLUMNS = 6
+
+# Seconds an actor sleeps while its ring is full.
+BACKOFF = 1e-3
+
+
+def transition_dtype(obs_size):
+    """
+    The record of a transition in an actor's ring.
+    :param obs_size: The size of an observation.
+    :return: A numpy dtype.
+    """
+    return np.dtype([
+        ("state", np.float32, (obs_size,)),
+        ("action", np.int32),
+        ("reward", np.float32),
+        ("next_state", np.float32, (obs_size,)),
+        ("terminal", np.bool_),
+        ("stream", np.int32),
+    ])
+
+
+def policy_weights(agent):
+    """
+    Gets the weights of an agent's Q network.
+    :param agent: A dpn.Agent.
+    :return: A list of arrays, the kernel and bias of each dense layer.
+    """
+    return agent.q_eval.sess.run(agent.q_eval.params)
+
+
+def q_values(weights, states):
+    """
+    Runs the Q network of DeepQNetwork in numpy, so actors need no session of their own.
+    :param weights: A list of the kernel and bias of each dense layer.
+    :param states: A batch of states.
+    :return: The Q values of the batch.
+    """
+    x = states
+    for i in range(0, len(weights) - 2, 2):
+        x = np.maximum(x @ weights[i] + weights[i + 1], 0)
+    return x @ weights[-2] + weights[-1]
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+class _Weights:
+    """
+    The policy weights and epsilon in one shared float32 vector, versioned by a seqlock in the control array.
+    """
+    def __init__(self, shm, shapes, control):
+        self.shm = shm
+        self.shapes = shapes
+        self.sizes = [int(np.prod(s)) for s in shapes]
+        self.vector = np.ndarray(sum(self.sizes) + 1, dtype=np.float32, buffer=shm.buf)
+        self.control = control
+
+    def write(self, weights, epsilon):
+        self.control[-1, VERSION] += 1
+        self.vector[:-1] = np.concatenate([np.ravel(w) for w in weights])
+        self.vector[-1] = epsilon
+        self.control[-1, VERSION] += 1
+
+    def read(self, version):
+        """
+        Reads the weights if they have changed.
+        :param version: The version last read.
+        :return: The version, weights and epsilon, or None if unchanged or being written.
+        """
+        current = int(self.control[-1, VERSION])
+        if current == version or current % 2:
+            return None
+        vector = self.vector.copy()
+        if int(self.control[-1, VERSION]) != current:
+            return None
+        weights = np.split(vector[:-1], np.cumsum(self.sizes)[:-1])
+        return current, [w.reshape(s) for w, s in zip(weights, self.shapes)], float(vector[-1])
+
+
+def _actor(index, config):
+    """
+    Runs self-play games, pushing every player's transitions into the actor's ring.
+    Each player's transition is completed when the player next acts, or when the game ends or is truncated.
+    :param index: The index of the actor.
+    :param config: The shared memory names, shapes and settings of the orchestrator.
+    """
+    n_actors, capacity, obs_size = config["n_actors"], config["capacity"], config["obs_size"]
+    control_shm, control = _attach(config["control"], (n_actors + 1, N_COLUMNS), np.int64)
+    ring_shm, ring = _attach(config["rings"][index], (capacity,), transition_dtype(obs_size))
+    weights = _Weights(shared_memory.SharedMemory(name=config["weights"]), config["shapes"], control)
+    counters = control[index]
+
+    def push(state, action, reward, next_state, terminal, stream):
+        while counters[HEAD] - counters[TAIL] >= capacity:
+            if control[-1, STOP]:
+                return
+            counters[BLOCKED] += 1
+            time.sleep(BACKOFF)
+        ring[counters[HEAD] % capacity] = (state, action, reward, next_state, terminal, stream)
+        counters[HEAD] += 1
+        counters[TRANSITIONS] += 1
+
+    rng = np.random.default_rng(config["seed"] + index)
+    sim = CatanSimulator(seed=config["seed"] + index, **config["sim_kwargs"])
+    version, params, epsilon = -1, None, 1.0
+    while not control[-1, STOP]:
+        obs = sim.reset()
+        pending = {}
+        while not sim.done and not control[-1, STOP]:
+            if counters[STEPS] % config["refresh_every"] == 0 or params is None:
+                update = weights.read(version)
+                if update is not None:
+                    version, params, epsilon = update
+
+            p = sim.player
+            if p in pending:
+                push(*pending.pop(p), obs, False, index * sim.n_players + p)
+            legal = sim.legal_actions()
+            if params is None or rng.random() < epsilon:
+                action = legal[rng.integers(len(legal))]
+            else:
+                action = legal[int(np.argmax(q_values(params, obs[np.newaxis])[0, legal]))]
+            next_obs, reward, done, _ = sim.step(action)
+            pending[p] = (obs, action, reward)
+            obs = next_obs
+            counters[STEPS] += 1
+
+        if sim.done:
+            # Each player's last transition ends in the final position from their own view. A game truncated at
+            # max_turns did not end, so its transitions are still bootstrapped from that position.
+            sim.observation()
+            ended = sim.winner >= 0
+            for p, (state, action, reward) in pending.items():
+                if ended and p != sim.winner:
+                    reward += config["loss_reward"]
+                push(state, action, reward, sim.encoder.vector[sim.rotations[p]], ended, index * sim.n_players + p)
+            counters[GAMES] += 1
+
+
+class SelfPlayOrchestrator:
+    """
+    Self-play with actor processes feeding one learner.
+    Each actor plays simulated games with a copy of the policy weights, refreshed from shared memory, and pushes its
+    transitions into its own shared memory ring. The learner drains the rings into the agent's replay buffer and
+    learns. A full ring blocks its actor, so actors cannot run ahead of the learner by more than a ring.
+    """
+    def __init__(self, agent, n_actors=None, capacity=4096, refresh_every=256, loss_reward=-1.0, seed=0,
+                 **sim_kwargs):
+        """
+        Init for SelfPlayOrchestrator.
+        :param agent: The dpn.Agent learning, with input dims of the simulator's observation and N_ACTIONS actions.
+        :param n_actors: The number of actor processes, defaults to the number of cores less one for the learner.
+        :param capacity: The number of transitions each actor's ring holds.
+        :param refresh_every: The number of steps between an actor checking for new weights.
+        :param loss_reward: The reward added to the last transition of the players that lost a game.
+        :param seed: The seed of the actors, actor i using seed + i.
+        :param sim_kwargs: Keyword arguments of the actors' CatanSimulator.
+        """
+        self.agent = agent
+        self.n_actors = n_actors if n_actors is not None else max(mp.cpu_count() - 1, 1)
+        self.capacity = capacity
+        self.obs_size = len(CatanSimulator(**sim_kwargs).observation())
+        assert agent.n_actions == N_ACTIONS, f"The agent needs {N_ACTIONS} actions."
+        assert tuple(agent.q_eval.input_dims) == (self.obs_size,), f"The agent needs input dims ({self.obs_size},)."
+        self.dtype = transition_dtype(self.obs_size)
+        self.shapes = [w.shape for w in policy_weights(agent)]
+
+        self._shms = []
+        self.control = self._create((self.n_actors + 1, N_COLUMNS), np.int64)
+        self.rings = [self._create((capacity,), self.dtype) for _ in range(self.n_actors)]
+        weights_shm = self._allocate((sum(int(np.prod(s)) for s in self.shapes) + 1) * 4)
+        self.weights = _Weights(weights_shm, self.shapes, self.control)
+        self.config = {
+            "n_actors": self.n_actors, "capacity": capacity, "obs_size": self.obs_size, "shapes": self.shapes,
+            "control": self._shms[0].name, "rings": [s.name for s in self._shms[1:-1]], "weights": weights_shm.name,
+            "refresh_every": refresh_every, "loss_reward": loss_reward, "seed": seed, "sim_kwargs": sim_kwargs,
+        }
+        self.processes = []
+        self.started = None
+
+    def _allocate(self, size):
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self._shms.append(shm)
+        return shm
+
+    def _create(self, shape, dtype):
+        shm = self._allocate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        array[...] = 0
+        return array
+
+    def start(self):
+        """
+        Publishes the agent's weights and starts the actors.
+        """
+        self.publish()
+        context = mp.get_context("spawn")
+        self.processes = [context.Process(target=_actor, args=(i, self.config), daemon=True)
+                          for i in range(self.n_actors)]
+        for p in self.processes:
+            p.start()
+        self.started = time.perf_counter()
+
+    def publish(self):
+        """
+        Publishes the agent's current weights and epsilon to the actors.
+        """
+        self.weights.write(policy_weights(self.agent), self.agent.epsilon)
+
+    def drain(self, max_transitions=None):
+        """
+        Moves the transitions waiting in the rings into the agent's replay buffer.
+        :param max_transitions: If given, the number of transitions taken from each ring.
+        :return: The number of transitions moved.
+        """
+        moved = 0
+        for counters, ring in zip(self.control, self.rings):
+            head, tail = int(counters[HEAD]), int(counters[TAIL])
+            if max_transitions is not None:
+                head = min(head, tail + max_transitions)
+            for i in range(tail, head):
+                t = ring[i % self.capacity]
+                self.agent.memory.store_transition(
+                    t["state"], t["action"], t["reward"], t["next_state"], t["terminal"], stream=int(t["stream"])
+                )
+            counters[TAIL] = head
+            moved += head - tail
+        return moved
+
+    def run(self, n_learn_steps, publish_every=100):
+        """
+        Learns from the actors' transitions, draining the rings before each learning step.
+        :param n_learn_steps: The number of learning steps.
+        :param publish_every: The number of learning steps between publishing weights.
+        """
+        if not self.processes:
+            self.start()
+        for step in range(1, n_learn_steps + 1):
+            while self.drain() == 0 and self.agent.mem_cntr <= self.agent.batch_size:
+                time.sleep(BACKOFF)
+            self.agent.learn()
+            if step % publish_every == 0:
+                self.publish()
+
+    def counters(self):
+        """
+        Gets the throughput counters of each actor.
+        :return: A list of dictionaries of the steps, games, transitions, steps per second, transitions waiting and
+            seconds blocked by a full ring of each actor.
+        """
+        if self.control is None:
+            return self.final_counters
+        elapsed = time.perf_counter() - self.started if self.started is not None else float("nan")
+        return [
+            {
+                "steps": int(c[STEPS]), "games": int(c[GAMES]), "transitions": int(c[TRANSITIONS]),
+                "steps/s": float(c[STEPS] / elapsed), "waiting": int(c[HEAD] - c[TAIL]),
+                "blocked": float(c[BLOCKED] * BACKOFF),
+            }
+            for c in self.control[:-1]
+        ]
+
+    def stop(self, timeout=5):
+        """
+        Stops the actors and frees the shared memory.
+        :param timeout: The seconds to wait for each actor to exit.
+        """
+        self.control[-1, STOP] = 1
+        for p in self.processes:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
+        self.final_counters = self.counters()
+        self.control, self.rings, self.weights = None, None, None
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+        self._shms = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,33 @@
+import time
+import numpy as np
+from colonist_ql.ql.simulator import CatanSimulator, random_policy
+
+
+def benchmark_simulator(n_turns=20000, n_players=4, seed=0, max_turns=400, policy=random_policy):
+    """
+    Times self-play games of the simulator.
+    :param n_turns: The number of turns to simulate, whole games are played until it is reached.
+    :param n_players: The number of players.
+    :param seed: The seed of the games and policy.
+    :param max_turns: The number of turns after which a game is truncated.
+    :param policy: A function of (sim, rng) choosing an action.
+    :return: A dictionary of the games, turns and steps played and the turns and steps per second.
+    """
+    sim = CatanSimulator(n_players, seed, max_turns=max_turns)
+    rng = np.random.default_rng(seed)
+    games, turns, steps = 0, 0, 0
+    start = time.perf_counter()
+    while turns < n_turns:
+        sim.reset()
+        while not sim.done:
+            sim.step(policy(sim, rng))
+            steps += 1
+        games += 1
+        turns += sim.turn
+    elapsed = time.perf_counter() - start
+    return {"games": games, "turns": turns, "steps": steps, "turns/s": turns / elapsed, "steps/s": steps / elapsed}
+
+
+if __name__ == "__main__":
+    for k, v in benchmark_simulator().items():
+        print(f"{k:<8} {v:,.0f}")
@@ -0,0 +1,591 @@
+import copy
+import numpy as np
+import colonist_ql.facts as facts
+import colonist_ql.model.cube_coord as cc
+from colonist_ql.model.longest_road import LongestRoad
+from colonist_ql.model.move_generation import MoveGenerator, board_masks, bits
+from colonist_ql.ql.game_state import StateEncoder, RESOURCE_ORDER, DEV_CARD_ORDER
+
+TOPOLOGY = cc.board_topology()
+N_RESOURCES = len(RESOURCE_ORDER)
+N_VERTICES, N_EDGES = TOPOLOGY.n_vertices, TOPOLOGY.n_edges
+LAND_HEXES = np.flatnonzero(TOPOLOGY.land_hexes)
+N_LAND = len(LAND_HEXES)
+MASKS = board_masks()
+
+# Phases of a turn.
+SETUP_SETTLEMENT, SETUP_ROAD, MAIN, MOVE_ROBBER, FREE_ROAD = range(5)
+
+# The flat action space, each range offset by the id of its vertex, edge, land hex or resources.
+END_TURN = 0
+ROAD = 1
+SETTLEMENT = ROAD + N_EDGES
+CITY = SETTLEMENT + N_VERTICES
+BUY_DEV_CARD = CITY + N_VERTICES
+ROBBER = BUY_DEV_CARD + 1
+KNIGHT = ROBBER + N_LAND
+ROAD_BUILDING = KNIGHT + 1
+YEAR_OF_PLENTY = ROAD_BUILDING + 1
+YEAR_OF_PLENTY_PAIRS = [(a, b) for a in range(N_RESOURCES) for b in range(a, N_RESOURCES)]
+MONOPOLY = YEAR_OF_PLENTY + len(YEAR_OF_PLENTY_PAIRS)
+BANK_TRADE = MONOPOLY + N_RESOURCES
+N_ACTIONS = BANK_TRADE + N_RESOURCES * N_RESOURCES
+
+COSTS = {p: np.array([c.get(r, 0) for r in RESOURCE_ORDER]) for p, c in facts.PURCHASES.items()}
+PIECES = {s: facts.BUILD_LIMITS[s] for s in facts.STRUCTURES}
+BANK_SIZE = 19
+WINNING_VP = 10
+
+# Indices of the development cards in DEV_CARD_ORDER.
+VP, KNIGHT_CARD, MONO, YOP, RB = range(len(DEV_CARD_ORDER))
+
+# The player axis of each player feature of the StateEncoder layout.
+PLAYER_AXES = {
+    "settlements": 1, "cities": 1, "roads": 1, "hands": 0, "dev_cards": 0, "knights": 0, "bank_rates": 0, "vp": 0,
+    "longest_road": 0, "largest_army": 0,
+}
+
+
+def _rotations(encoder, n_players):
+    """
+    Builds the gathers rotating the player slots of an encoder's vector so each player is the first.
+    :param encoder: A StateEncoder.
+    :param n_players: The number of players.
+    :return: A (players, features) array of indices into the vector.
+    """
+    ids = np.arange(len(encoder.vector))
+    rotations = np.tile(ids, (n_players, 1))
+    for name, axis in PLAYER_AXES.items():
+        sl = encoder.layout[name]
+        view = ids[sl].reshape(encoder[name].shape)
+        for p in range(n_players):
+            rotations[p, sl] = np.roll(view, -p, axis=axis).ravel()
+    return rotations
+
+
+def deal_board(rng):
+    """
+    Deals the resources, dice values, robber and ports of a random board, as random_hexes does.
+    :param rng: A numpy random generator.
+    :return: The resource index of each hex id (-1 for the desert and sea), the dice value of each hex id (0 for none),
+        the hex id of the desert and a dictionary of port vertex id to the bank rates it gives.
+    """
+    resources = list(rng.permutation(len(facts.HEX_RESOURCES)))
+    values = list(reversed(facts.DICE_VALUES))
+    hex_resource = np.full(TOPOLOGY.n_hexes, -1, dtype=np.int64)
+    hex_number = np.zeros(TOPOLOGY.n_hexes, dtype=np.int64)
+    robber = -1
+    for c, i in zip(cc.spiral_order(cc.neighbours_from_centre(2)), resources):
+        h, tile = TOPOLOGY.hex_id(c), facts.HEX_RESOURCES[i]
+        if tile == facts.TILES.DESERT:
+            robber = h
+        else:
+            hex_resource[h] = RESOURCE_ORDER.index(facts.RESOURCES(tile.value))
+            hex_number[h] = values.pop()
+
+    # Four 3:1 ports and one 2:1 port of each resource.
+    kinds = list(rng.permutation([-1] * 4 + list(range(N_RESOURCES))))
+    port_rates = {}
+    for (sea, land), kind in zip(facts.PORT_FRAMES_0.items(), kinds):
+        for t in cc.triples_from_neighbours(sea, land):
+            v = TOPOLOGY.vertex_id(frozenset({sea, land, t}))
+            port_rates[v] = np.full(N_RESOURCES, 3) if kind < 0 else np.where(np.arange(N_RESOURCES) == kind, 2, 4)
+    return hex_resource, hex_number, robber, port_rates
+
+
+def random_policy(sim, rng):
+    """
+    Picks a uniformly random legal action.
+    :param sim: The CatanSimulator.
+    :param rng: A numpy random generator.
+    :return: An action id.
+    """
+    actions = sim.legal_actions()
+    return actions[rng.integers(len(actions))]
+
+
+def win_reward(sim, player, vp_before):
+    """
+    Rewards winning the game.
+    :param sim: The CatanSimulator after the step.
+    :param player: The player that acted.
+    :param vp_before: The victory points of the player before the step.
+    :return: 1 if the player won on the step otherwise 0.
+    """
+    return float(sim.winner == player)
+
+
+def vp_reward(sim, player, vp_before, scale=0.1):
+    """
+    Shapes the reward with the victory points gained on a step.
+    :param sim: The CatanSimulator after the step.
+    :param player: The player that acted.
+    :param vp_before: The victory points of the player before the step.
+    :param scale: The reward per victory point.
+    :return: The scaled victory point change.
+    """
+    return scale * (int(sim.vp[player]) - vp_before)
+
+
+class CatanSimulator:
+    """
+    Headless, seedable game of Catan between players acting through a flat discrete action space.
+    The state is held as small arrays and integer bitmasks over the vertex and edge ids of the board topology rather
+    than the model singletons. The dice income of every building is kept in a (roll, player, resource) table so
+    rolling is a lookup.
+    Players trade with the bank and ports only, discards on a seven are random, and the victim of the robber is a
+    random player next to the robbed hex.
+    """
+    def __init__(self, n_players=4, seed=None, rewards=(win_reward,), max_turns=1000):
+        """
+        Init for CatanSimulator.
+        :param n_players: The number of players.
+        :param seed: The seed of the random generator.
+        :param rewards: Reward hooks of (sim, player, vp_before) summed into the reward of each step.
+        :param max_turns: The number of turns after which the game is truncated.
+        """
+        assert 2 <= n_players <= 4, "Catan is played by two to four players."
+        self.n_players = n_players
+        self.rewards = rewards
+        self.max_turns = max_turns
+        self.player_ids = np.arange(n_players)
+        self.encoder = StateEncoder(range(n_players))
+        self.rotations = _rotations(self.encoder, n_players)
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self, seed=None):
+        """
+        Starts a new game on a random board.
+        :param seed: If given, reseeds the random generator.
+        :return: The observation of the first player.
+        """
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        n = self.n_players
+        self.hex_resource, self.hex_number, self.robber, self.port_rates = deal_board(self.rng)
+
+        self.vertex_owner = np.full(N_VERTICES, -1, dtype=np.int8)
+        self.vertex_level = np.zeros(N_VERTICES, dtype=np.int8)
+        self.edge_owner = np.full(N_EDGES, -1, dtype=np.int8)
+        self.moves = MoveGenerator(n, MASKS)
+
+        self.hands = np.zeros((n, N_RESOURCES), dtype=np.int64)
+        self.bank = np.full(N_RESOURCES, BANK_SIZE, dtype=np.int64)
+        self.rates = np.full((n, N_RESOURCES), 4, dtype=np.int64)
+        self.income = np.zeros((13, n, N_RESOURCES), dtype=np.int64)
+        self.hex_weight = np.zeros((TOPOLOGY.n_hexes, n), dtype=np.int64)
+        self.pieces = np.array([[PIECES[s] for s in facts.STRUCTURES]] * n, dtype=np.int64)
+
+        self.deck = list(self.rng.permutation([DEV_CARD_ORDER.index(c) for c in facts.DEV_CARDS]))
+        self.dev_cards = np.zeros((n, len(DEV_CARD_ORDER)), dtype=np.int64)
+        self.new_dev_cards = np.zeros((n, len(DEV_CARD_ORDER)), dtype=np.int64)
+        self.dev_played = False
+        self.deck_bought = False
+        self.knights = np.zeros(n, dtype=np.int64)
+        self.longest_roads = [LongestRoad(topology=TOPOLOGY) for _ in range(n)]
+        self.road_lengths = np.zeros(n, dtype=np.int64)
+        self.building_vp = np.zeros(n, dtype=np.int64)
+        self.longest_road_holder = -1
+        self.largest_army_holder = -1
+
+        self.setup_order = list(range(n)) + list(reversed(range(n)))
+        self.player = 0
+        self.phase = SETUP_SETTLEMENT
+        self.last_settlement = -1
+        self.free_roads = 0
+        self.turn = 0
+        self.steps = 0
+        self.roll = 0
+        self.winner = -1
+        self._encode_board()
+        self._update_vp()
+        return self.observation()
+
+    def _encode_board(self):
+        """
+        Resets the board features of the encoder to the dealt board.
+        """
+        self.encoder.vector[:] = 0
+        views = self.encoder.views
+        views["hex_resources"][:] = self.hex_resource[LAND_HEXES, np.newaxis] == np.arange(N_RESOURCES)
+        views["hex_pips"][:] = [facts.DICE_PIPS.get(n, 0) / 5 for n in self.hex_number[LAND_HEXES].tolist()]
+        views["bank_rates"][:] = 1 / self.rates
+
+    def _update_vp(self):
+        """
+        Recounts the victory points of each player including hidden victory point cards.
+        """
+        vp = self.building_vp + self.dev_cards[:, VP] + self.new_dev_cards[:, VP]
+        if self.longest_road_holder >= 0:
+            vp[self.longest_road_holder] += 2
+        if self.largest_army_holder >= 0:
+            vp[self.largest_army_holder] += 2
+        self.vp = vp
+        views = self.encoder.views
+        views["vp"][:] = vp
+        views["longest_road"][:] = self.player_ids == self.longest_road_holder
+        views["largest_army"][:] = self.player_ids == self.largest_army_holder
+
+    def _update_dev_cards(self, p):
+        self.encoder.views["dev_cards"][p] = self.dev_cards[p] + self.new_dev_cards[p]
+
+    @property
+    def done(self):
+        return self.winner >= 0 or self.turn >= self.max_turns
+
+    def copy(self):
+        """
+        Copies the game, sharing nothing mutable with it so either can be stepped independently.
+        :return: A CatanSimulator.
+        """
+        other = copy.copy(self)
+        for name in ("vertex_owner", "vertex_level", "edge_owner", "hands", "bank", "rates", "income", "hex_weight",
+                     "pieces", "dev_cards", "new_dev_cards", "knights", "road_lengths", "building_vp", "vp"):
+            setattr(other, name, getattr(self, name).copy())
+        other.moves = self.moves.copy()
+        other.deck, other.setup_order = list(self.deck), list(self.setup_order)
+        other.longest_roads = [copy.copy(r) for r in self.longest_roads]
+        for r in other.longest_roads:
+            r._components = dict(r._components)
+        other.rng = copy.deepcopy(self.rng)
+        other.encoder = StateEncoder(range(self.n_players))
+        other.encoder.vector[:] = self.encoder.vector
+        return other
+
+    def legal_actions(self):
+        """
+        Enumerates the actions the current player can take.
+        :return: A list of action ids.
+        """
+        p, phase, moves = self.player, self.phase, self.moves
+        if phase == SETUP_SETTLEMENT:
+            return [SETTLEMENT + v for v in bits(moves.setup_settlement_moves())]
+        if phase == SETUP_ROAD:
+            return [ROAD + e for e in bits(moves.setup_road_moves(self.last_settlement))]
+        if phase == MOVE_ROBBER:
+            return [ROBBER + i for i, h in enumerate(LAND_HEXES) if h != self.robber]
+        if phase == FREE_ROAD:
+            return [ROAD + e for e in bits(moves.road_moves(p))] or [END_TURN]
+
+        hand = self.hands[p].tolist()
+        lumber, brick, wool, grain, ore = hand
+        roads, settlements, cities = self.pieces[p].tolist()
+        actions = [END_TURN]
+        if lumber and brick and roads:
+            actions += [ROAD + e for e in bits(moves.road_moves(p))]
+        if lumber and brick and wool and grain and settlements:
+            actions += [SETTLEMENT + v for v in bits(moves.settlement_moves(p))]
+        if grain >= 2 and ore >= 3 and cities:
+            actions += [CITY + v for v in bits(moves.city_moves(p))]
+        if wool and grain and ore and self.deck:
+            actions.append(BUY_DEV_CARD)
+
+        if not self.dev_played:
+            owned = self.dev_cards[p].tolist()
+            if owned[KNIGHT_CARD]:
+                actions.append(KNIGHT)
+            if owned[RB] and roads:
+                actions.append(ROAD_BUILDING)
+            if owned[YOP]:
+                bank = self.bank.tolist()
+                actions += [YEAR_OF_PLENTY + i for i, (a, b) in enumerate(YEAR_OF_PLENTY_PAIRS)
+                            if bank[a] > (a == b) and bank[b]]
+            if owned[MONO]:
+                actions += [MONOPOLY + r for r in range(N_RESOURCES)]
+
+        bank = self.bank.tolist()
+        for give, (n, rate) in enumerate(zip(hand, self.rates[p].tolist())):
+            if n >= rate:
+                actions += [BANK_TRADE + give * N_RESOURCES + take for take in range(N_RESOURCES)
+                            if take != give and bank[take]]
+        return actions
+
+    def legal_mask(self):
+        """
+        The legal actions of the current player as a mask, e.g. for Agent.choose_action.
+        :return: A bool array over the action space.
+        """
+        mask = np.zeros(N_ACTIONS, dtype=bool)
+        mask[self.legal_actions()] = True
+        return mask
+
+    def step(self, action, roll=None):
+        """
+        Takes an action for the current player.
+        :param action: A legal action id.
+        :param roll: The dice total if the action ends the turn, rolled with the random generator if None.
+        :return: The observation of the player to act next, the reward of the player that acted, if the game is
+            done and an info dictionary.
+        """
+        action, p = int(action), self.player
+        vp_before = int(self.vp[p])
+        self.steps += 1
+
+        if action == END_TURN:
+            if self.phase == FREE_ROAD:
+                self.phase, self.free_roads = MAIN, 0
+            else:
+                self._next_turn(roll)
+        elif action < SETTLEMENT:
+            self._build_road(p, action - ROAD)
+        elif action < CITY:
+            self._build_settlement(p, action - SETTLEMENT)
+        elif action < BUY_DEV_CARD:
+            self._build_city(p, action - CITY)
+        elif action == BUY_DEV_CARD:
+            self._pay(p, COSTS[facts.PURCHASABLE.DEV_CARD])
+            self.new_dev_cards[p, self.deck.pop()] += 1
+            self.deck_bought = True
+            self._update_dev_cards(p)
+            self._update_vp()
+        elif action < KNIGHT:
+            self._move_robber(p, LAND_HEXES[action - ROBBER])
+        elif action == KNIGHT:
+            self._play_knight(p)
+        elif action == ROAD_BUILDING:
+            self._play_dev_card(p, RB)
+            self.phase, self.free_roads = FREE_ROAD, 2
+        elif action < MONOPOLY:
+            a, b = YEAR_OF_PLENTY_PAIRS[action - YEAR_OF_PLENTY]
+            self._play_dev_card(p, YOP)
+            self._take_from_bank(p, a)
+            self._take_from_bank(p, b)
+        elif action < BANK_TRADE:
+            r = action - MONOPOLY
+            self._play_dev_card(p, MONO)
+            self.hands[p, r] += self.hands[:, r].sum() - self.hands[p, r]
+            self.hands[np.arange(self.n_players) != p, r] = 0
+        else:
+            give, take = divmod(action - BANK_TRADE, N_RESOURCES)
+            rate = self.rates[p, give]
+            self.hands[p, give] -= rate
+            self.bank[give] += rate
+            self._take_from_bank(p, take)
+
+        if self.vp[p] >= WINNING_VP:
+            self.winner = p
+        reward = sum(hook(self, p, vp_before) for hook in self.rewards)
+        return self.observation(), reward, self.done, {"player": p, "turn": self.turn}
+
+    def _pay(self, p, cost):
+        self.hands[p] -= cost
+        self.bank += cost
+
+    def _take_from_bank(self, p, r):
+        self.hands[p, r] += 1
+        self.bank[r] -= 1
+
+    def _next_turn(self, roll=None):
+        """
+        Passes the turn to the next player and rolls the dice for them.
+        :param roll: The dice total, rolled with the random generator if None.
+        """
+        if self.deck_bought:
+            self.dev_cards += self.new_dev_cards
+            self.new_dev_cards[:] = 0
+            self.deck_bought = False
+        self.dev_played = False
+        self.player = (self.player + 1) % self.n_players
+        self.turn += 1
+        self._roll(roll)
+
+    def _roll(self, roll=None):
+        """
+        Rolls the dice, handing out resources or discarding and moving the robber on a seven.
+        :param roll: The dice total, rolled with the random generator if None.
+        """
+        self.roll = int(self.rng.integers(1, 7) + self.rng.integers(1, 7)) if roll is None else roll
+        if self.roll == 7:
+            for p, n in enumerate(self.hands.sum(axis=1).tolist()):
+                if n > 7:
+                    self._discard(p, n // 2)
+            self.phase = MOVE_ROBBER
+            return
+
+        production = self.income[self.roll]
+        if self.hex_number[self.robber] == self.roll:
+            production = production.copy()
+            production[:, self.hex_resource[self.robber]] -= self.hex_weight[self.robber]
+        demand = production.sum(axis=0)
+        short = demand > self.bank
+        if short.any():
+            # A resource the bank cannot cover is given to nobody unless only one player is owed it.
+            production = production.copy()
+            for r in np.flatnonzero(short):
+                owed = np.flatnonzero(production[:, r])
+                production[:, r] = 0
+                if len(owed) == 1:
+                    production[owed[0], r] = self.bank[r]
+            demand = production.sum(axis=0)
+        self.hands += production
+        self.bank -= demand
+        self.phase = MAIN
+
+    def _discard(self, p, n):
+        """
+        Discards random cards from a player's hand.
+        :param p: The player.
+        :param n: The number of cards discarded.
+        """
+        cards = np.repeat(np.arange(N_RESOURCES), self.hands[p])
+        discarded = np.bincount(self.rng.choice(cards, n, replace=False), minlength=N_RESOURCES)
+        self.hands[p] -= discarded
+        self.bank += discarded
+
+    def _move_robber(self, p, h):
+        """
+        Moves the robber and steals a random card from a random player with a building on the hex.
+        :param p: The player moving the robber.
+        :param h: The hex id.
+        """
+        self.robber = h
+        victims = {int(self.vertex_owner[v]) for v in TOPOLOGY.hex_vertices[h] if v >= 0} - {-1, p}
+        victims = [o for o in sorted(victims) if self.hands[o].sum()]
+        if victims:
+            o = victims[self.rng.integers(len(victims))]
+            r = self.rng.choice(N_RESOURCES, p=self.hands[o] / self.hands[o].sum())
+            self.hands[o, r] -= 1
+            self.hands[p, r] += 1
+        self.phase = MAIN
+
+    def _play_dev_card(self, p, card):
+        """
+        Plays a development card, a player playing at most one a turn.
+        :param p: The player.
+        :param card: The index of the card in DEV_CARD_ORDER.
+        """
+        self.dev_cards[p, card] -= 1
+        self.dev_played = True
+        self._update_dev_cards(p)
+
+    def _play_knight(self, p):
+        """
+        Plays a knight, moving the largest army to the player if they now have the most knights.
+        :param p: The player.
+        """
+        self._play_dev_card(p, KNIGHT_CARD)
+        self.knights[p] += 1
+        self.encoder.views["knights"][p] = self.knights[p]
+        self.phase = MOVE_ROBBER
+        holder = self.largest_army_holder
+        if self.knights[p] >= 3 and (holder < 0 or self.knights[p] > self.knights[holder]):
+            self.largest_army_holder = p
+            self._update_vp()
+
+    def _build_road(self, p, e):
+        """
+        Builds a road, paid for unless in the setup or from road building.
+        :param p: The player.
+        :param e: The edge id.
+        """
+        if self.phase == MAIN:
+            self._pay(p, COSTS[facts.PURCHASABLE.ROAD])
+        self.edge_owner[e] = p
+        self.encoder.views["roads"][e, p] = 1
+        self.moves.place_road(p, e)
+        self.pieces[p, 0] -= 1
+        self.road_lengths[p] = self.longest_roads[p].add_road(TOPOLOGY.edges[e])
+        self._update_longest_road()
+
+        if self.phase == SETUP_ROAD:
+            self._next_setup()
+        elif self.phase == FREE_ROAD:
+            self.free_roads -= 1
+            if self.free_roads == 0 or not self.pieces[p, 0]:
+                self.phase = MAIN
+
+    def _next_setup(self):
+        """
+        Passes to the next player to place in the setup, starting the first turn after the last placement.
+        """
+        self.setup_order.pop(0)
+        if self.setup_order:
+            self.player, self.phase = self.setup_order[0], SETUP_SETTLEMENT
+        else:
+            self.player = 0
+            self._roll()
+
+    def _build_settlement(self, p, v):
+        """
+        Builds a settlement, paid for unless in the setup, handing out the starting resources of the second.
+        :param p: The player.
+        :param v: The vertex id.
+        """
+        if self.phase == SETUP_SETTLEMENT:
+            if len(self.setup_order) <= self.n_players:
+                for h in TOPOLOGY.vertex_hexes[v]:
+                    if self.hex_resource[h] >= 0:
+                        self._take_from_bank(p, self.hex_resource[h])
+            self.last_settlement = v
+            self.phase = SETUP_ROAD
+        else:
+            self._pay(p, COSTS[facts.PURCHASABLE.SETTLEMENT])
+
+        self.vertex_owner[v], self.vertex_level[v] = p, 1
+        self.encoder.views["settlements"][v, p] = 1
+        self.moves.place_settlement(p, v)
+        self.pieces[p, 1] -= 1
+        self.building_vp[p] += 1
+        self._add_income(p, v)
+        self._update_vp()
+        if v in self.port_rates:
+            self.rates[p] = np.minimum(self.rates[p], self.port_rates[v])
+            self.encoder.views["bank_rates"][p] = 1 / self.rates[p]
+
+        for o, road in enumerate(self.longest_roads):
+            if o != p:
+                self.road_lengths[o] = road.block(TOPOLOGY.vertices[v])
+        self._update_longest_road()
+
+    def _build_city(self, p, v):
+        """
+        Upgrades a settlement to a city.
+        :param p: The player.
+        :param v: The vertex id.
+        """
+        self._pay(p, COSTS[facts.PURCHASABLE.CITY])
+        self.vertex_level[v] = 2
+        self.encoder.views["settlements"][v, p] = 0
+        self.encoder.views["cities"][v, p] = 1
+        self.moves.place_city(p, v)
+        self.pieces[p, 1] += 1
+        self.pieces[p, 2] -= 1
+        self.building_vp[p] += 1
+        self._add_income(p, v)
+        self._update_vp()
+
+    def _add_income(self, p, v):
+        """
+        Adds one of each resource the hexes around a vertex produce to a player's dice income.
+        :param p: The player.
+        :param v: The vertex id.
+        """
+        for h in TOPOLOGY.vertex_hexes[v]:
+            if self.hex_resource[h] >= 0:
+                self.income[self.hex_number[h], p, self.hex_resource[h]] += 1
+                self.hex_weight[h, p] += 1
+
+    def _update_longest_road(self):
+        """
+        Gives the longest road to the player with the unique longest road of at least five, the holder keeping it on
+        a tie.
+        """
+        holder, lengths = self.longest_road_holder, self.road_lengths
+        best = lengths.max()
+        if holder >= 0 and lengths[holder] == best and best >= 5:
+            return
+        leaders = np.flatnonzero(lengths == best)
+        self.longest_road_holder = int(leaders[0]) if best >= 5 and len(leaders) == 1 else -1
+        self._update_vp()
+
+    def observation(self):
+        """
+        Encodes the game with the StateEncoder layout, the player slots rotated so the current player is the first.
+        Features are kept up to date as they change, apart from the hands and robber which change on most steps.
+        :return: The feature vector.
+        """
+        views = self.encoder.views
+        views["robber"][:] = LAND_HEXES == self.robber
+        views["hands"][:] = self.hands
+        return self.encoder.vector[self.rotations[self.player]]
@@ -0,0 +1,590 @@
+import numpy as np
+import colonist_ql.facts as facts
+import colonist_ql.model.cube_coord as cc
+from colonist_ql.model.longest_road import LongestRoad
+from colonist_ql.ql.game_state import StateEncoder, RESOURCE_ORDER, DEV_CARD_ORDER
+from colonist_ql.ql.simulator import TOPOLOGY, N_RESOURCES, N_VERTICES, N_EDGES, LAND_HEXES, SETUP_SETTLEMENT, \
+    SETUP_ROAD, MAIN, MOVE_ROBBER, FREE_ROAD, END_TURN, ROAD, SETTLEMENT, CITY, BUY_DEV_CARD, ROBBER, KNIGHT, \
+    ROAD_BUILDING, YEAR_OF_PLENTY, YEAR_OF_PLENTY_PAIRS, MONOPOLY, BANK_TRADE, N_ACTIONS, COSTS, PIECES, BANK_SIZE, \
+    WINNING_VP, VP, KNIGHT_CARD, MONO, YOP, RB
+
+# Incidence tables of the board as bool matrices, so neighbourhoods of many games are one matrix product.
+VERTEX_VERTICES = np.zeros((N_VERTICES, N_VERTICES), dtype=bool)
+for _v in range(N_VERTICES):
+    VERTEX_VERTICES[_v, TOPOLOGY.vertex_neighbours(_v)] = True
+EDGE_VERTICES = np.zeros((N_EDGES, N_VERTICES), dtype=bool)
+EDGE_VERTICES[np.arange(N_EDGES)[:, np.newaxis], TOPOLOGY.edge_vertices] = True
+VERTEX_EDGES = EDGE_VERTICES.T.copy()
+HEX_VERTICES = np.where(TOPOLOGY.hex_vertices >= 0, TOPOLOGY.hex_vertices, N_VERTICES)
+
+YOP_A, YOP_B = (np.array(x) for x in zip(*YEAR_OF_PLENTY_PAIRS))
+PIPS = np.array([facts.DICE_PIPS.get(n, 0) / 5 for n in range(13)])
+ROAD_COST, SETTLEMENT_COST, CITY_COST, DEV_CARD_COST = \
+    (COSTS[p] for p in (facts.PURCHASABLE.ROAD, facts.PURCHASABLE.SETTLEMENT, facts.PURCHASABLE.CITY,
+                        facts.PURCHASABLE.DEV_CARD))
+DECK = np.array([DEV_CARD_ORDER.index(c) for c in facts.DEV_CARDS])
+
+# The board layout deal_board fills: the land hexes in spiral order, the resource of each tile (-1 for the desert),
+# the dice values in the order they are laid, the two vertices of each port and the rates of each kind of port.
+SPIRAL_HEXES = np.array([TOPOLOGY.hex_id(c) for c in cc.spiral_order(cc.neighbours_from_centre(2))])
+TILE_RESOURCES = np.array([-1 if t == facts.TILES.DESERT else RESOURCE_ORDER.index(facts.RESOURCES(t.value))
+                           for t in facts.HEX_RESOURCES])
+DICE_ORDER = np.array(facts.DICE_VALUES)
+PORT_VERTICES = np.array([[TOPOLOGY.vertex_id(frozenset({sea, land, t})) for t in cc.triples_from_neighbours(sea, land)]
+                          for sea, land in facts.PORT_FRAMES_0.items()])
+PORT_KINDS = np.array([-1] * 4 + list(range(N_RESOURCES)))
+PORT_KIND_RATES = np.vstack([np.where(np.arange(N_RESOURCES) == r, 2, 4) for r in range(N_RESOURCES)] +
+                            [np.full(N_RESOURCES, 3)])
+
+# A player's longest road cannot reach the five roads of the longest road award with fewer roads, so their
+# LongestRoad is only built once they have this many.
+MIN_ROADS = 5
+
+
+def deal_boards(rng, n):
+    """
+    Deals random boards as simulator.deal_board does, every board at once.
+    :param rng: A numpy random generator.
+    :param n: The number of boards.
+    :return: The resource index of each hex id (-1 for the desert and sea) and the dice value of each hex id (0 for
+        none) of each board, the hex id of each desert and the bank rates each vertex's port gives (4 for none).
+    """
+    tiles = TILE_RESOURCES[rng.permuted(np.tile(np.arange(len(TILE_RESOURCES)), (n, 1)), axis=1)]
+    land = tiles >= 0
+    numbers = np.where(land, DICE_ORDER[np.cumsum(land, axis=1) - 1], 0)
+    hex_resource = np.full((n, TOPOLOGY.n_hexes), -1, dtype=np.int64)
+    hex_number = np.zeros((n, TOPOLOGY.n_hexes), dtype=np.int64)
+    hex_resource[:, SPIRAL_HEXES] = tiles
+    hex_number[:, SPIRAL_HEXES] = numbers
+    robber = SPIRAL_HEXES[np.argmin(land, axis=1)]
+
+    kinds = rng.permuted(np.tile(PORT_KINDS, (n, 1)), axis=1)
+    port_rates = np.full((n, N_VERTICES, N_RESOURCES), 4, dtype=np.int64)
+    port_rates[np.arange(n)[:, np.newaxis, np.newaxis], PORT_VERTICES] = PORT_KIND_RATES[kinds][:, :, np.newaxis]
+    return hex_resource, hex_number, robber, port_rates
+
+
+def _incident(mask, table):
+    """
+    The bool product of masks and an incidence table, taken in float32 as numpy has no BLAS path for bool.
+    :param mask: A (games, n) bool array.
+    :param table: A (n, m) bool incidence table.
+    :return: A (games, m) bool array of what each game's mask is incident to.
+    """
+    return (mask.astype(np.float32) @ table.astype(np.float32)) > 0
+
+
+def win_reward(env, players, vp_before):
+    """
+    Rewards winning the game.
+    :param env: The VectorCatanEnv after the step.
+    :param players: The player that acted in each game.
+    :param vp_before: The victory points of the players before the step.
+    :return: An array of 1 where the player won on the step otherwise 0.
+    """
+    return (env.winner == players).astype(np.float32)
+
+
+def vp_reward(env, players, vp_before, scale=0.1):
+    """
+    Shapes the reward with the victory points gained on a step.
+    :param env: The VectorCatanEnv after the step.
+    :param players: The player that acted in each game.
+    :param vp_before: The victory points of the players before the step.
+    :param scale: The reward per victory point.
+    :return: An array of the scaled victory point changes.
+    """
+    return scale * (env.vp[np.arange(env.n_games), players] - vp_before)
+
+
+class VectorCatanEnv:
+    """
+    K games of the CatanSimulator rules stepped in lockstep, with the state of every game stacked in arrays.
+    Dice, resource distribution, legal action masks and observations are computed for all games with array
+    operations over the board's incidence tables. Only the longest road search, discards and steals of a seven are
+    per game, the longest road only being searched for players with at least MIN_ROADS roads, and games are reset
+    automatically when they end.
+    Actions and observations are those of CatanSimulator, so an agent's choose_actions can act for every game at
+    once.
+    """
+    def __init__(self, n_games, n_players=4, seed=None, rewards=(win_reward,), max_turns=1000):
+        """
+        Init for VectorCatanEnv.
+        :param n_games: The number of games K.
+        :param n_players: The number of players in each game.
+        :param seed: The seed of the random generator.
+        :param rewards: Reward hooks of (env, players, vp_before) summed into the rewards of each step.
+        :param max_turns: The number of turns after which a game is truncated.
+        """
+        assert 2 <= n_players <= 4, "Catan is played by two to four players."
+        k, n = self.n_games, self.n_players = n_games, n_players
+        self.rewards = rewards
+        self.max_turns = max_turns
+        self.rng = np.random.default_rng(seed)
+        self.layout = StateEncoder(range(n_players)).layout
+        self.games = np.arange(k)
+        self.setup_order = np.array(list(range(n)) + list(reversed(range(n))))
+
+        self.hex_resource = np.full((k, TOPOLOGY.n_hexes), -1, dtype=np.int64)
+        self.hex_number = np.zeros((k, TOPOLOGY.n_hexes), dtype=np.int64)
+        self.robber = np.zeros(k, dtype=np.int64)
+        self.port_rates = np.full((k, N_VERTICES, N_RESOURCES), 4, dtype=np.int64)
+
+        self.vertex_owner = np.full((k, N_VERTICES), -1, dtype=np.int64)
+        self.vertex_level = np.zeros((k, N_VERTICES), dtype=np.int64)
+        self.edge_owner = np.full((k, N_EDGES), -1, dtype=np.int64)
+        self.hands = np.zeros((k, n, N_RESOURCES), dtype=np.int64)
+        self.bank = np.zeros((k, N_RESOURCES), dtype=np.int64)
+        self.rates = np.zeros((k, n, N_RESOURCES), dtype=np.int64)
+        self.pieces = np.zeros((k, n, len(PIECES)), dtype=np.int64)
+        self.deck = np.zeros((k, len(DECK)), dtype=np.int64)
+        self.deck_position = np.zeros(k, dtype=np.int64)
+        self.dev_cards = np.zeros((k, n, len(DEV_CARD_ORDER)), dtype=np.int64)
+        self.new_dev_cards = np.zeros((k, n, len(DEV_CARD_ORDER)), dtype=np.int64)
+        self.dev_played = np.zeros(k, dtype=bool)
+        self.knights = np.zeros((k, n), dtype=np.int64)
+        self.road_lengths = np.zeros((k, n), dtype=np.int64)
+        self.building_vp = np.zeros((k, n), dtype=np.int64)
+        self.longest_road_holder = np.full(k, -1, dtype=np.int64)
+        self.largest_army_holder = np.full(k, -1, dtype=np.int64)
+        self.longest_roads = [[] for _ in range(k)]
+
+        self.player = np.zeros(k, dtype=np.int64)
+        self.phase = np.zeros(k, dtype=np.int64)
+        self.setup_step = np.zeros(k, dtype=np.int64)
+        self.last_settlement = np.zeros(k, dtype=np.int64)
+        self.free_roads = np.zeros(k, dtype=np.int64)
+        self.turn = np.zeros(k, dtype=np.int64)
+        self.roll = np.zeros(k, dtype=np.int64)
+        self.winner = np.full(k, -1, dtype=np.int64)
+        self.reset()
+
+    def reset(self, games=None):
+        """
+        Starts new games on random boards.
+        :param games: The indices of the games to reset, defaults to every game.
+        :return: The observations of every game.
+        """
+        games = self.games if games is None else np.asarray(games)
+        self.hex_resource[games], self.hex_number[games], self.robber[games], self.port_rates[games] = \
+            deal_boards(self.rng, len(games))
+        self.deck[games] = self.rng.permuted(np.tile(DECK, (len(games), 1)), axis=1)
+        for g in games.tolist():
+            self.longest_roads[g] = [None] * self.n_players
+
+        self.vertex_owner[games] = -1
+        self.vertex_level[games] = 0
+        self.edge_owner[games] = -1
+        self.hands[games] = 0
+        self.bank[games] = BANK_SIZE
+        self.rates[games] = 4
+        self.pieces[games] = [PIECES[s] for s in facts.STRUCTURES]
+        self.deck_position[games] = 0
+        for a in (self.dev_cards, self.new_dev_cards, self.knights, self.road_lengths, self.building_vp):
+            a[games] = 0
+        self.dev_played[games] = False
+        self.longest_road_holder[games] = -1
+        self.largest_army_holder[games] = -1
+        self.player[games] = 0
+        self.phase[games] = SETUP_SETTLEMENT
+        self.setup_step[games] = 0
+        self.free_roads[games] = 0
+        self.turn[games] = 0
+        self.roll[games] = 0
+        self.winner[games] = -1
+        return self.observation()
+
+    @property
+    def vp(self):
+        """
+        The victory points of each player of each game including hidden victory point cards.
+        """
+        players = np.arange(self.n_players)
+        return self.building_vp + self.dev_cards[..., VP] + self.new_dev_cards[..., VP] + \
+            2 * (players == self.longest_road_holder[:, np.newaxis]) + \
+            2 * (players == self.largest_army_holder[:, np.newaxis])
+
+    @property
+    def terminated(self):
+        return self.winner >= 0
+
+    @property
+    def truncated(self):
+        return (self.winner < 0) & (self.turn >= self.max_turns)
+
+    @property
+    def done(self):
+        return self.terminated | self.truncated
+
+    def _player_rows(self, array, games=None):
+        games = self.games if games is None else games
+        return array[games, self.player[games]]
+
+    def legal_mask(self):
+        """
+        The legal actions of the current player of every game.
+        :return: A (games, N_ACTIONS) bool array.
+        """
+        k, phase = self.n_games, self.phase
+        mask = np.zeros((k, N_ACTIONS), dtype=bool)
+        roads, settlements, cities = mask[:, ROAD:SETTLEMENT], mask[:, SETTLEMENT:CITY], mask[:, CITY:BUY_DEV_CARD]
+
+        occupied = self.vertex_owner >= 0
+        blocked = occupied | _incident(occupied, VERTEX_VERTICES)
+        own_vertices = self.vertex_owner == self.player[:, np.newaxis]
+        reach = _incident(self.edge_owner == self.player[:, np.newaxis], EDGE_VERTICES)
+        ends = (reach & ~(occupied & ~own_vertices)) | own_vertices
+        road_candidates = _incident(ends, VERTEX_EDGES) & (self.edge_owner < 0)
+
+        setup = phase == SETUP_SETTLEMENT
+        settlements[setup] = ~blocked[setup]
+        setup = phase == SETUP_ROAD
+        roads[setup] = VERTEX_EDGES[self.last_settlement[setup]] & (self.edge_owner[setup] < 0)
+        robbing = phase == MOVE_ROBBER
+        mask[robbing, ROBBER:KNIGHT] = LAND_HEXES != self.robber[robbing, np.newaxis]
+        free = phase == FREE_ROAD
+        roads[free] = road_candidates[free]
+        mask[free, END_TURN] = ~road_candidates[free].any(axis=1)
+
+        main = phase == MAIN
+        hand, pieces, bank = self._player_rows(self.hands), self._player_rows(self.pieces), self.bank
+        mask[main, END_TURN] = True
+        roads |= road_candidates & (main & (hand >= ROAD_COST).all(axis=1) & (pieces[:, 0] > 0))[:, np.newaxis]
+        settlements |= reach & ~blocked & \
+            (main & (hand >= SETTLEMENT_COST).all(axis=1) & (pieces[:, 1] > 0))[:, np.newaxis]
+        cities |= own_vertices & (self.vertex_level == 1) & \
+            (main & (hand >= CITY_COST).all(axis=1) & (pieces[:, 2] > 0))[:, np.newaxis]
+        mask[:, BUY_DEV_CARD] = main & (hand >= DEV_CARD_COST).all(axis=1) & (self.deck_position < len(DECK))
+
+        playable = main & ~self.dev_played
+        owned = self._player_rows(self.dev_cards) > 0
+        mask[:, KNIGHT] = playable & owned[:, KNIGHT_CARD]
+        mask[:, ROAD_BUILDING] = playable & owned[:, RB] & (pieces[:, 0] > 0)
+        mask[:, YEAR_OF_PLENTY:MONOPOLY] = (playable & owned[:, YOP])[:, np.newaxis] & \
+            (bank[:, YOP_A] > (YOP_A == YOP_B)) & (bank[:, YOP_B] > 0)
+        mask[:, MONOPOLY:BANK_TRADE] = (playable & owned[:, MONO])[:, np.newaxis]
+
+        gives = main[:, np.newaxis] & (hand >= self._player_rows(self.rates))
+        trades = gives[:, :, np.newaxis] & (bank > 0)[:, np.newaxis, :] & ~np.eye(N_RESOURCES, dtype=bool)
+        mask[:, BANK_TRADE:] = trades.reshape(k, -1)
+        return mask
+
+    def step(self, actions, rolls=None):
+        """
+        Takes an action for the current player of every game, resetting the games that end.
+        :param actions: An array of a legal action id for each game.
+        :param rolls: Optionally, an array of the dice total of each game, used by the games whose action ends the
+            turn.
+        :return: The observations of the players to act next, the rewards of the players that acted, which games
+            ended with a winner, which games were truncated at max_turns and an info dictionary. The info holds the
+            acting players, winners and turns of the games before any reset, the indices of the games reset and their
+            final observations from the view of each player, a (games reset, players, features) array.
+        """
+        actions = np.asarray(actions)
+        players = self.player.copy()
+        vp_before = self.vp[self.games, players]
+
+        def games(low, high=None):
+            return np.flatnonzero(actions == low if high is None else (actions >= low) & (actions < high))
+
+        ending = games(END_TURN)
+        free = self.phase[ending] == FREE_ROAD
+        self.phase[ending[free]], self.free_roads[ending[free]] = MAIN, 0
+        self._next_turn(ending[~free], None if rolls is None else np.asarray(rolls)[ending[~free]])
+
+        g = games(ROAD, SETTLEMENT)
+        self._build_roads(g, actions[g] - ROAD)
+        g = games(SETTLEMENT, CITY)
+        self._build_settlements(g, actions[g] - SETTLEMENT)
+        g = games(CITY, BUY_DEV_CARD)
+        self._build_cities(g, actions[g] - CITY)
+        self._buy_dev_cards(games(BUY_DEV_CARD))
+        g = games(ROBBER, KNIGHT)
+        self._move_robber(g, LAND_HEXES[actions[g] - ROBBER])
+        self._play_knights(games(KNIGHT))
+        g = games(ROAD_BUILDING)
+        self._play_dev_cards(g, RB)
+        self.phase[g], self.free_roads[g] = FREE_ROAD, 2
+        g = games(YEAR_OF_PLENTY, MONOPOLY)
+        self._play_dev_cards(g, YOP)
+        for column in (YOP_A, YOP_B):
+            self._take_from_bank(g, column[actions[g] - YEAR_OF_PLENTY])
+        g = games(MONOPOLY, BANK_TRADE)
+        self._play_monopolies(g, actions[g] - MONOPOLY)
+        g = games(BANK_TRADE, N_ACTIONS)
+        self._bank_trades(g, *divmod(actions[g] - BANK_TRADE, N_RESOURCES))
+
+        won = (self.vp[self.games, players] >= WINNING_VP) & (self.winner < 0)
+        self.winner[won] = players[won]
+        rewards = sum(hook(self, players, vp_before) for hook in self.rewards)
+        terminated, truncated = self.terminated, self.truncated
+        reset, n = np.flatnonzero(terminated | truncated), self.n_players
+        # The final positions are kept from every player's view, so each player's last transition can be completed
+        # and a truncated game bootstrapped from its own position rather than the next game's.
+        final = self.observation(np.repeat(reset, n), np.tile(np.arange(n), len(reset)))
+        info = {"player": players, "winner": self.winner.copy(), "turn": self.turn.copy(), "reset": reset,
+                "final_observation": final.reshape(len(reset), n, final.shape[1])}
+        if len(reset):
+            self.reset(reset)
+        return self.observation(), rewards, terminated, truncated, info
+
+    def _pay(self, g, cost):
+        p = self.player[g]
+        self.hands[g, p] -= cost
+        self.bank[g] += cost
+
+    def _take_from_bank(self, g, r):
+        self.hands[g, self.player[g], r] += 1
+        self.bank[g, r] -= 1
+
+    def _next_turn(self, g, rolls=None):
+        """
+        Passes the turn of games to their next player and rolls the dice for them.
+        :param g: The indices of the games.
+        :param rolls: The dice totals, rolled with the random generator if None.
+        """
+        self.dev_cards[g] += self.new_dev_cards[g]
+        self.new_dev_cards[g] = 0
+        self.dev_played[g] = False
+        self.player[g] = (self.player[g] + 1) % self.n_players
+        self.turn[g] += 1
+        self._roll(g, rolls)
+
+    def _roll(self, g, rolls=None):
+        """
+        Rolls the dice of games, handing out resources or discarding and moving the robber on a seven.
+        The resources of every game are summed with one bincount over (game, player, resource) of each building on a
+        producing hex, and a resource the bank cannot cover is given to nobody unless only one player is owed it.
+        :param g: The indices of the games.
+        :param rolls: The dice totals, rolled with the random generator if None.
+        """
+        if len(g) == 0:
+            return
+        rolls = self.rng.integers(1, 7, (len(g), 2)).sum(axis=1) if rolls is None else rolls
+        self.roll[g] = rolls
+
+        sevens = g[rolls == 7]
+        for i, p in zip(*np.nonzero(self.hands[sevens].sum(axis=2) > 7)):
+            self._discard(sevens[i], p, self.hands[sevens[i], p].sum() // 2)
+        self.phase[sevens] = MOVE_ROBBER
+
+        g, rolls = g[rolls != 7], rolls[rolls != 7]
+        n, players = len(g), self.n_players
+        producing = (self.hex_number[g] == rolls[:, np.newaxis]) & \
+            (np.arange(TOPOLOGY.n_hexes) != self.robber[g, np.newaxis])
+        vertex_hexes = TOPOLOGY.vertex_hexes
+        owners = self.vertex_owner[g]
+        weights = producing[:, vertex_hexes] * self.vertex_level[g][:, :, np.newaxis]
+        bins = ((np.arange(n)[:, np.newaxis, np.newaxis] * players + np.maximum(owners, 0)[:, :, np.newaxis])
+                * N_RESOURCES + np.maximum(self.hex_resource[g][:, vertex_hexes], 0))
+        production = np.bincount(bins.ravel(), weights.ravel(), n * players * N_RESOURCES)
+        production = production.reshape(n, players, N_RESOURCES).astype(np.int64)
+
+        bank = self.bank[g]
+        short = production.sum(axis=1) > bank
+        alone = (production > 0).sum(axis=1) == 1
+        production = np.where(short[:, np.newaxis], np.where(alone[:, np.newaxis], np.minimum(
+            production, bank[:, np.newaxis]), 0), production)
+        self.hands[g] += production
+        self.bank[g] -= production.sum(axis=1)
+        self.phase[g] = MAIN
+
+    def _discard(self, g, p, n):
+        """
+        Discards random cards from a player's hand.
+        :param g: The index of the game.
+        :param p: The player.
+        :param n: The number of cards discarded.
+        """
+        cards = np.repeat(np.arange(N_RESOURCES), self.hands[g, p])
+        discarded = np.bincount(self.rng.choice(cards, n, replace=False), minlength=N_RESOURCES)
+        self.hands[g, p] -= discarded
+        self.bank[g] += discarded
+
+    def _move_robber(self, g, hexes):
+        """
+        Moves the robbers of games, each stealing a random card from a random player with a building on the hex.
+        :param g: The indices of the games.
+        :param hexes: The hex ids.
+        """
+        self.robber[g] = hexes
+        self.phase[g] = MAIN
+        players = self.player[g]
+        owners = np.concatenate([self.vertex_owner[g], np.full((len(g), 1), -1)], axis=1)
+        owners = owners[np.arange(len(g))[:, np.newaxis], HEX_VERTICES[hexes]]
+        others = np.arange(self.n_players)
+        victims = (owners[:, :, np.newaxis] == others).any(axis=1) & (others != players[:, np.newaxis]) & \
+            (self.hands[g].sum(axis=2) > 0)
+
+        robbed = victims.any(axis=1)
+        g, players, victims = g[robbed], players[robbed], victims[robbed]
+        victims = np.argmax(self.rng.random(victims.shape) * victims, axis=1)
+        hands = self.hands[g, victims]
+        cumulative = hands.cumsum(axis=1)
+        r = np.argmax(cumulative > self.rng.random(len(g))[:, np.newaxis] * cumulative[:, -1:], axis=1)
+        self.hands[g, victims, r] -= 1
+        self.hands[g, players, r] += 1
+
+    def _play_dev_cards(self, g, card):
+        self.dev_cards[g, self.player[g], card] -= 1
+        self.dev_played[g] = True
+
+    def _play_knights(self, g):
+        """
+        Plays knights, moving the largest army to the players that now have the most knights.
+        :param g: The indices of the games.
+        """
+        self._play_dev_cards(g, KNIGHT_CARD)
+        p = self.player[g]
+        self.knights[g, p] += 1
+        self.phase[g] = MOVE_ROBBER
+        holder = self.largest_army_holder[g]
+        holder_knights = np.where(holder >= 0, self.knights[g, np.maximum(holder, 0)], 0)
+        takes = (self.knights[g, p] >= 3) & ((holder < 0) | (self.knights[g, p] > holder_knights))
+        self.largest_army_holder[g[takes]] = p[takes]
+
+    def _play_monopolies(self, g, r):
+        self._play_dev_cards(g, MONO)
+        total = self.hands[g, :, r].sum(axis=1)
+        self.hands[g, :, r] = 0
+        self.hands[g, self.player[g], r] = total
+
+    def _bank_trades(self, g, give, take):
+        p = self.player[g]
+        rate = self.rates[g, p, give]
+        self.hands[g, p, give] -= rate
+        self.bank[g, give] += rate
+        self._take_from_bank(g, take)
+
+    def _buy_dev_cards(self, g):
+        self._pay(g, DEV_CARD_COST)
+        self.new_dev_cards[g, self.player[g], self.deck[g, self.deck_position[g]]] += 1
+        self.deck_position[g] += 1
+
+    def _build_roads(self, g, e):
+        """
+        Builds roads, paid for unless in the setup or from road building.
+        :param g: The indices of the games.
+        :param e: The edge ids.
+        """
+        phase, p = self.phase[g], self.player[g]
+        main = phase == MAIN
+        self._pay(g[main], ROAD_COST)
+        self.edge_owner[g, e] = p
+        self.pieces[g, p, 0] -= 1
+        long = PIECES[facts.STRUCTURES.ROAD] - self.pieces[g, p, 0] >= MIN_ROADS
+        for i, j, edge in zip(g[long].tolist(), p[long].tolist(), e[long].tolist()):
+            road = self.longest_roads[i][j]
+            if road is None:
+                self.longest_roads[i][j] = road = LongestRoad(
+                    (TOPOLOGY.edges[f] for f in np.flatnonzero(self.edge_owner[i] == j)),
+                    (TOPOLOGY.vertices[u] for u in np.flatnonzero((self.vertex_owner[i] >= 0) &
+                                                                  (self.vertex_owner[i] != j))),
+                    TOPOLOGY,
+                )
+                self.road_lengths[i, j] = road.length
+            else:
+                self.road_lengths[i, j] = road.add_road(TOPOLOGY.edges[edge])
+        self._update_longest_road(g)
+
+        self._next_setup(g[phase == SETUP_ROAD])
+        free = g[phase == FREE_ROAD]
+        self.free_roads[free] -= 1
+        self.phase[free[(self.free_roads[free] == 0) | (self.pieces[free, self.player[free], 0] == 0)]] = MAIN
+
+    def _next_setup(self, g):
+        """
+        Passes games to the next player to place in the setup, starting the first turn after the last placement.
+        :param g: The indices of the games.
+        """
+        self.setup_step[g] += 1
+        placing = self.setup_step[g] < len(self.setup_order)
+        self.player[g[placing]] = self.setup_order[self.setup_step[g[placing]]]
+        self.phase[g[placing]] = SETUP_SETTLEMENT
+        self.player[g[~placing]] = 0
+        self._roll(g[~placing])
+
+    def _build_settlements(self, g, v):
+        """
+        Builds settlements, paid for unless in the setup, handing out the starting resources of the second.
+        :param g: The indices of the games.
+        :param v: The vertex ids.
+        """
+        p = self.player[g]
+        setup = self.phase[g] == SETUP_SETTLEMENT
+        second = setup & (self.setup_step[g] >= self.n_players)
+        for h in TOPOLOGY.vertex_hexes[v[second]].T:
+            r = self.hex_resource[g[second], h]
+            self._take_from_bank(g[second][r >= 0], r[r >= 0])
+        self.last_settlement[g[setup]] = v[setup]
+        self.phase[g[setup]] = SETUP_ROAD
+        self._pay(g[~setup], SETTLEMENT_COST)
+
+        self.vertex_owner[g, v], self.vertex_level[g, v] = p, 1
+        self.pieces[g, p, 1] -= 1
+        self.building_vp[g, p] += 1
+        self.rates[g, p] = np.minimum(self.rates[g, p], self.port_rates[g, v])
+        for i, j, vertex in zip(g.tolist(), p.tolist(), v.tolist()):
+            for o, road in enumerate(self.longest_roads[i]):
+                if o != j and road is not None:
+                    self.road_lengths[i, o] = road.block(TOPOLOGY.vertices[vertex])
+        self._update_longest_road(g)
+
+    def _build_cities(self, g, v):
+        p = self.player[g]
+        self._pay(g, CITY_COST)
+        self.vertex_level[g, v] = 2
+        self.pieces[g, p, 1] += 1
+        self.pieces[g, p, 2] -= 1
+        self.building_vp[g, p] += 1
+
+    def _update_longest_road(self, g):
+        """
+        Gives the longest road of games to the player with the unique longest road of at least five, the holder
+        keeping it on a tie.
+        :param g: The indices of the games.
+        """
+        lengths, holder = self.road_lengths[g], self.longest_road_holder[g]
+        best = lengths.max(axis=1)
+        keeps = (holder >= 0) & (lengths[np.arange(len(g)), np.maximum(holder, 0)] == best) & (best >= 5)
+        unique = (lengths == best[:, np.newaxis]).sum(axis=1) == 1
+        leader = np.where((best >= 5) & unique, lengths.argmax(axis=1), -1)
+        self.longest_road_holder[g] = np.where(keeps, holder, leader)
+
+    def observation(self, games=None, players=None):
+        """
+        Encodes games with the StateEncoder layout of CatanSimulator.observation, the player slots rotated so the
+        viewing player of each game is the first.
+        :param games: Optionally, the indices of the games to encode, a game can be repeated, defaults to every game.
+        :param players: Optionally, the player each game is viewed by, defaults to the current players.
+        :return: A (games, features) float32 array.
+        """
+        index = slice(None) if games is None else np.asarray(games)
+        rows = self.games[index, np.newaxis]
+        viewers = self.player[index] if players is None else np.asarray(players)
+        k, n = len(rows), self.n_players
+        order = (viewers[:, np.newaxis] + np.arange(n)) % n
+        slots = np.arange(n)
+        vertex_owner, edge_owner = self.vertex_owner[index], self.edge_owner[index]
+        vertex_level = self.vertex_level[index]
+        owner_slot = np.where(vertex_owner >= 0, (vertex_owner - viewers[:, np.newaxis]) % n, -1)
+        edge_slot = np.where(edge_owner >= 0, (edge_owner - viewers[:, np.newaxis]) % n, -1)
+        features = {
+            "hex_resources": self.hex_resource[index][:, LAND_HEXES, np.newaxis] == np.arange(N_RESOURCES),
+            "hex_pips": PIPS[self.hex_number[index][:, LAND_HEXES]],
+            "robber": LAND_HEXES == self.robber[index, np.newaxis],
+            "settlements": (owner_slot[..., np.newaxis] == slots) & (vertex_level == 1)[..., np.newaxis],
+            "cities": (owner_slot[..., np.newaxis] == slots) & (vertex_level == 2)[..., np.newaxis],
+            "roads": edge_slot[..., np.newaxis] == slots,
+            "hands": self.hands[rows, order],
+            "dev_cards": (self.dev_cards + self.new_dev_cards)[rows, order],
+            "knights": self.knights[rows, order],
+            "bank_rates": 1 / self.rates[rows, order],
+            "vp": self.vp[rows, order],
+            "longest_road": order == self.longest_road_holder[index, np.newaxis],
+            "largest_army": order == self.largest_army_holder[index, np.newaxis],
+        }
+        observations = np.empty((k, self.layout["largest_army"].stop), dtype=np.float32)
+        for name, sl in self.layout.items():
+            observations[:, sl] = features[name].reshape(k, sl.stop - sl.start)
+        return observations